@@ -1,5 +1,4 @@
 from flask import Flask, request, jsonify
-import json
 import logging
 import sys
 import os
@@ -10,8 +9,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
 from openai_service import OpenAIService
 from whatsapp_service import WhatsAppService
-import psycopg2
-from datetime import datetime
+from database import db_pool
+from appointment_repository import appointment_repo
+from appointment_tools import appointment_tools
+from datetime_parser import datetime_parser
+from structured_logging import configure_logging, log_event
+from rate_limiter import rate_limiter
+from thread_registry import ThreadRegistry
+from message_dedup import MessageDeduplicator
 import threading
 import time
 from dotenv import load_dotenv
@@ -19,193 +24,35 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Database Configuration
-class DatabaseConfig:
-    # PostgreSQL Configuration
-    DB_HOST = os.getenv('DB_HOST', 'ep-broad-firefly-ad4k1jpt-pooler.c-2.us-east-1.aws.neon.tech')
-    DB_PORT = os.getenv('DB_PORT', '5432')
-    DB_NAME = os.getenv('DB_NAME', 'neondb')
-    DB_USER = os.getenv('DB_USER', 'neondb_owner')
-    DB_PASSWORD = os.getenv('DB_PASSWORD', 'npg_6bemGOwox1uR')
-    
-    @classmethod
-    def get_connection_params(cls):
-        """Get connection parameters as dictionary"""
-        return {
-            'host': cls.DB_HOST,
-            'port': cls.DB_PORT,
-            'database': cls.DB_NAME,
-            'user': cls.DB_USER,
-            'password': cls.DB_PASSWORD
-        }
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Written inline: a serverless function may be frozen before a background log thread flushes
+configure_logging(background=False)
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
 
 # Initialize services
-openai_service = OpenAIService()
+# Serverless functions cannot keep a background refill thread running
+openai_service = OpenAIService(warm_threads=False)
 whatsapp_service = WhatsAppService()
 
-# Store conversation threads (in production, use a proper database)
-conversation_threads = {}
-
-# Database functions for OpenAI Assistant
-def get_appointment_details(whatsapp_number):
-    """Get appointment details for a WhatsApp number"""
-    try:
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT patient_name, booking_time, clinic_name, status, created_at
-            FROM book_an_appointment 
-            WHERE whatsapp_number = %s 
-            ORDER BY created_at DESC
-        """, (whatsapp_number,))
-        
-        appointments = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        if appointments:
-            formatted_appointments = []
-            for apt in appointments:
-                formatted_appointments.append({
-                    "patient_name": apt[0],
-                    "booking_time": apt[1].strftime("%B %d, %Y at %I:%M %p") if apt[1] else "Not set",
-                    "clinic_name": apt[2],
-                    "status": apt[3],
-                    "created_at": apt[4].strftime("%Y-%m-%d %H:%M:%S") if apt[4] else "Not set"
-                })
-            return {"success": True, "appointments": formatted_appointments}
-        else:
-            return {"success": False, "message": "No appointments found for this number"}
-            
-    except Exception as e:
-        logger.error(f"Database error getting appointments: {str(e)}")
-        return {"success": False, "message": f"Database error: {str(e)}"}
-
-def update_appointment_name(whatsapp_number, new_name):
-    """Update patient name for appointments"""
-    try:
-        logger.info(f"Attempting to update name for {whatsapp_number} to '{new_name}'")
-        
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        # First check if the appointment exists
-        cursor.execute("""
-            SELECT COUNT(*) FROM book_an_appointment 
-            WHERE whatsapp_number = %s
-        """, (whatsapp_number,))
-        
-        count = cursor.fetchone()[0]
-        logger.info(f"Found {count} appointments for number {whatsapp_number}")
-        
-        cursor.execute("""
-            UPDATE book_an_appointment 
-            SET patient_name = %s 
-            WHERE whatsapp_number = %s
-        """, (new_name, whatsapp_number))
-        
-        updated_count = cursor.rowcount
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        logger.info(f"Updated {updated_count} rows for name change")
-        
-        if updated_count > 0:
-            return {"success": True, "message": f"Updated name to '{new_name}' for {updated_count} appointment(s)"}
-        else:
-            return {"success": False, "message": "No appointments found to update"}
-            
-    except Exception as e:
-        logger.error(f"Database error updating name: {str(e)}")
-        return {"success": False, "message": f"Database error: {str(e)}"}
+# OpenAI thread per WhatsApp number, shared across workers through the database
+conversation_threads = ThreadRegistry()
 
-def update_appointment_datetime_db(whatsapp_number, new_datetime_str):
-    """Update appointment date and time"""
-    try:
-        from datetime import datetime
-        import re
-        
-        # Try manual parsing for common formats
-        datetime_str = None
-        
-        # Format: "August 24, 2025 at 2:00 PM"
-        if " at " in new_datetime_str and "," in new_datetime_str:
-            try:
-                date_part = new_datetime_str.split(" at ")[0].strip()
-                time_part = new_datetime_str.split(" at ")[1].strip()
-                parsed_date = datetime.strptime(date_part, "%B %d, %Y")
-                parsed_time = datetime.strptime(time_part, "%I:%M %p")
-                combined_datetime = parsed_date.replace(hour=parsed_time.hour, minute=parsed_time.minute)
-                datetime_str = combined_datetime.strftime("%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                pass
-        
-        # Format: "2025-08-24 14:00:00" (already in ISO format)
-        elif re.match(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', new_datetime_str):
-            datetime_str = new_datetime_str
-        
-        # If parsing failed, return error
-        if not datetime_str:
-            return {"success": False, "message": "Invalid date/time format. Please use format: 'Month Day, Year at Hour:Minute AM/PM' (e.g., 'August 24, 2025 at 2:00 PM')"}
-        
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE book_an_appointment 
-            SET booking_time = %s 
-            WHERE whatsapp_number = %s
-        """, (datetime_str, whatsapp_number))
-        
-        updated_count = cursor.rowcount
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        if updated_count > 0:
-            return {"success": True, "message": f"Updated appointment time to {new_datetime_str} for {updated_count} appointment(s)"}
-        else:
-            return {"success": False, "message": "No appointments found to update"}
-            
-    except Exception as e:
-        logger.error(f"Database error updating datetime: {str(e)}")
-        return {"success": False, "message": f"Database error: {str(e)}"}
+# WhatsApp message IDs already handled, so redelivered webhooks are ignored
+processed_messages = MessageDeduplicator()
 
 def check_appointment_in_database(whatsapp_number):
     """Check if WhatsApp number exists in book_an_appointment table"""
     try:
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        # Query for appointments with this WhatsApp number
-        cursor.execute("""
-            SELECT patient_name, booking_time, clinic_name, status, created_at
-            FROM book_an_appointment 
-            WHERE whatsapp_number = %s 
-            ORDER BY created_at DESC
-        """, (whatsapp_number,))
+        rows = appointment_repo.find_by_number(whatsapp_number)
         
-        appointments = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
-        if appointments:
-            return True, appointments
+        if rows:
+            return True, rows
         else:
             return False, []
             
@@ -251,13 +98,16 @@ def process_message(message):
         message_type = message.get('type')
         timestamp = message.get('timestamp')
         
-        logger.info(f"Processing message from {from_number}: {message_type}")
+        # Meta redelivers webhooks it thinks timed out; answer each message only once
+        if processed_messages.is_duplicate(message_id):
+            logger.info(f"Skipping duplicate delivery of message {message_id} from {from_number}")
+            return
         
-        # Mark message as read
-        whatsapp_service.mark_message_as_read(message_id)
+        logger.info(f"Processing message from {from_number}: {message_type}")
         
         # Only process text messages
         if message_type != 'text':
+            whatsapp_service.mark_message_as_read(message_id)
             response_text = "I can only process text messages at the moment. Please send me a text message!"
             whatsapp_service.send_message(from_number, response_text)
             return
@@ -266,21 +116,33 @@ def process_message(message):
         text_content = message.get('text', {}).get('body', '')
         
         if not text_content.strip():
+            whatsapp_service.mark_message_as_read(message_id)
             response_text = "I didn't receive any text. Please send me a message!"
             whatsapp_service.send_message(from_number, response_text)
             return
         
-        # Send typing indicator
-        whatsapp_service.send_typing_indicator(from_number, True)
+        # Mark the message read with the typing indicator alongside the OpenAI call
+        typing_indicator = threading.Thread(target=whatsapp_service.send_typing_indicator, args=(message_id,))
+        typing_indicator.start()
+        
+        # Use the configured OpenAI engine with function calling capabilities for all messages
+        logger.info(f"Using OpenAI {openai_service.engine} engine with function calling for {from_number}")
         
-        # Use OpenAI Assistant API with function calling capabilities for all messages
-        logger.info(f"Using OpenAI Assistant with function calling for {from_number}")
+        # Continue the sender's existing thread when there is one (the chat engine keeps its own history)
+        thread_id = conversation_threads.get(from_number) if openai_service.engine == "assistants" else None
         
-        response_text, thread_id = openai_service.create_assistant_response_with_functions(
+        response_text, thread_id = openai_service.create_response(
             text_content, 
-            from_number
+            from_number,
+            thread_id
         )
         
+        if thread_id:
+            conversation_threads.set(from_number, thread_id)
+        
+        # The indicator must not arrive after the answer
+        typing_indicator.join(timeout=Config.WHATSAPP_READ_TIMEOUT)
+        
         # Send the AI response directly to the user
         success, result = whatsapp_service.send_message(from_number, response_text)
         
@@ -321,6 +183,16 @@ def health():
     return jsonify({
         "status": "healthy",
         "timestamp": time.time(),
+        "database_pool": db_pool.stats(),
+        "openai_engine": openai_service.engine,
+        "faq_cache": openai_service.faq.stats(),
+        "chat_history": openai_service.conversation_history.stats(),
+        "thread_cache": conversation_threads.stats(),
+        "appointment_cache": appointment_repo.cache.stats(),
+        "datetime_parser": datetime_parser.stats(),
+        "tools": appointment_tools.stats(),
+        "message_dedup": processed_messages.stats(),
+        "rate_limits": rate_limiter.stats(),
         "platform": "vercel"
     })
 
@@ -350,7 +222,7 @@ def webhook():
     """Handle incoming WhatsApp messages"""
     try:
         data = request.get_json()
-        logger.info(f"Received webhook data: {json.dumps(data, indent=2)}")
+        log_event(logger, "webhook.received", payload=data)
         
         # Extract the message data
         if 'object' in data and data['object'] == 'whatsapp_business_account':
@@ -1,43 +1,39 @@
-from flask import Flask, request, jsonify
-import json
+from flask import Flask, request, jsonify, Response
 import logging
 from config import Config
 from openai_service import OpenAIService
 from whatsapp_service import WhatsAppService
-import psycopg2
+from database import db_pool
+from appointment_repository import appointment_repo
+from appointment_tools import appointment_tools, resolve_appointment_datetime
+from datetime_parser import datetime_parser
+from rate_limiter import rate_limiter
+from thread_registry import ThreadRegistry
+from message_dedup import MessageDeduplicator
+from campaigns import ReminderCampaigns, day_window
+from job_queue import JobQueue
+from webhook_batch import WebhookBatch
+from conversation_serializer import ConversationSerializer
+from read_receipts import ReadReceipts
+import metrics
+from metrics import span
+from structured_logging import configure_logging, log_event
+import structured_logging
 from datetime import datetime
-import threading
 import time
-import os
+from functools import partial
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Database Configuration
-class DatabaseConfig:
-    # PostgreSQL Configuration
-    DB_HOST = os.getenv('DB_HOST', 'ep-broad-firefly-ad4k1jpt-pooler.c-2.us-east-1.aws.neon.tech')
-    DB_PORT = os.getenv('DB_PORT', '5432')
-    DB_NAME = os.getenv('DB_NAME', 'neondb')
-    DB_USER = os.getenv('DB_USER', 'neondb_owner')
-    DB_PASSWORD = os.getenv('DB_PASSWORD', 'npg_6bemGOwox1uR')
-    
-    @classmethod
-    def get_connection_params(cls):
-        """Get connection parameters as dictionary"""
-        return {
-            'host': cls.DB_HOST,
-            'port': cls.DB_PORT,
-            'database': cls.DB_NAME,
-            'user': cls.DB_USER,
-            'password': cls.DB_PASSWORD
-        }
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Compact, redacted log lines tagged with the webhook's trace ID, written off the request thread
+configure_logging()
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -46,188 +42,25 @@ app.config.from_object(Config)
 openai_service = OpenAIService()
 whatsapp_service = WhatsAppService()
 
-# Store conversation threads (in production, use a proper database)
-conversation_threads = {}
+# Read receipts and typing indicators, sent in the background
+read_receipts = ReadReceipts(whatsapp_service)
 
-# Database functions for OpenAI Assistant
-def get_appointment_details(whatsapp_number):
-    """Get appointment details for a WhatsApp number"""
-    try:
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT patient_name, booking_time, clinic_name, status, created_at
-            FROM book_an_appointment 
-            WHERE whatsapp_number = %s 
-            ORDER BY created_at DESC
-        """, (whatsapp_number,))
-        
-        appointments = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        if appointments:
-            formatted_appointments = []
-            for apt in appointments:
-                formatted_appointments.append({
-                    "patient_name": apt[0],
-                    "booking_time": apt[1].strftime("%B %d, %Y at %I:%M %p") if apt[1] else "Not set",
-                    "clinic_name": apt[2],
-                    "status": apt[3],
-                    "created_at": apt[4].strftime("%Y-%m-%d %H:%M:%S") if apt[4] else "Not set"
-                })
-            return {"success": True, "appointments": formatted_appointments}
-        else:
-            return {"success": False, "message": "No appointments found for this number"}
-            
-    except Exception as e:
-        logger.error(f"Database error getting appointments: {str(e)}")
-        return {"success": False, "message": f"Database error: {str(e)}"}
+# OpenAI thread per WhatsApp number, shared across workers through the database
+conversation_threads = ThreadRegistry()
 
-def update_appointment_name(whatsapp_number, new_name):
-    """Update patient name for appointments"""
-    try:
-        logger.info(f"Attempting to update name for {whatsapp_number} to '{new_name}'")
-        
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        # First check if the appointment exists
-        cursor.execute("""
-            SELECT COUNT(*) FROM book_an_appointment 
-            WHERE whatsapp_number = %s
-        """, (whatsapp_number,))
-        
-        count = cursor.fetchone()[0]
-        logger.info(f"Found {count} appointments for number {whatsapp_number}")
-        
-        cursor.execute("""
-            UPDATE book_an_appointment 
-            SET patient_name = %s 
-            WHERE whatsapp_number = %s
-        """, (new_name, whatsapp_number))
-        
-        updated_count = cursor.rowcount
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        logger.info(f"Updated {updated_count} rows for name change")
-        
-        if updated_count > 0:
-            return {"success": True, "message": f"Updated name to '{new_name}' for {updated_count} appointment(s)"}
-        else:
-            return {"success": False, "message": "No appointments found to update"}
-            
-    except Exception as e:
-        logger.error(f"Database error updating name: {str(e)}")
-        return {"success": False, "message": f"Database error: {str(e)}"}
-
-def update_appointment_datetime_db(whatsapp_number, new_datetime_str):
-    """Update appointment date and time"""
-    try:
-        from datetime import datetime
-        import re
-        
-        # Try manual parsing for common formats
-        datetime_str = None
-        
-        # Format: "August 24, 2025 at 2:00 PM"
-        if " at " in new_datetime_str and "," in new_datetime_str:
-            try:
-                date_part = new_datetime_str.split(" at ")[0].strip()
-                time_part = new_datetime_str.split(" at ")[1].strip()
-                parsed_date = datetime.strptime(date_part, "%B %d, %Y")
-                parsed_time = datetime.strptime(time_part, "%I:%M %p")
-                combined_datetime = parsed_date.replace(hour=parsed_time.hour, minute=parsed_time.minute)
-                datetime_str = combined_datetime.strftime("%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                pass
-        
-        # Format: "2025-08-24 14:00:00" (already in ISO format)
-        elif re.match(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', new_datetime_str):
-            datetime_str = new_datetime_str
-        
-        # If parsing failed, return error
-        if not datetime_str:
-            return {"success": False, "message": "Invalid date/time format. Please use format: 'Month Day, Year at Hour:Minute AM/PM' (e.g., 'August 24, 2025 at 2:00 PM')"}
-        
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE book_an_appointment 
-            SET booking_time = %s 
-            WHERE whatsapp_number = %s
-        """, (datetime_str, whatsapp_number))
-        
-        updated_count = cursor.rowcount
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        if updated_count > 0:
-            return {"success": True, "message": f"Updated appointment time to {new_datetime_str} for {updated_count} appointment(s)"}
-        else:
-            return {"success": False, "message": "No appointments found to update"}
-            
-    except Exception as e:
-        logger.error(f"Database error updating datetime: {str(e)}")
-        return {"success": False, "message": f"Database error: {str(e)}"}
+# WhatsApp message IDs already handled, so redelivered webhooks are ignored
+processed_messages = MessageDeduplicator()
 
-def update_appointment_clinic(whatsapp_number, new_clinic):
-    """Update clinic name for appointments"""
-    try:
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE book_an_appointment 
-            SET clinic_name = %s 
-            WHERE whatsapp_number = %s
-        """, (new_clinic, whatsapp_number))
-        
-        updated_count = cursor.rowcount
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        if updated_count > 0:
-            return {"success": True, "message": f"Updated clinic to '{new_clinic}' for {updated_count} appointment(s)"}
-        else:
-            return {"success": False, "message": "No appointments found to update"}
-            
-    except Exception as e:
-        logger.error(f"Database error updating clinic: {str(e)}")
-        return {"success": False, "message": f"Database error: {str(e)}"}
+# Bulk appointment reminders
+reminder_campaigns = ReminderCampaigns(whatsapp_service)
 
 def check_appointment_in_database(whatsapp_number):
     """Check if WhatsApp number exists in book_an_appointment table"""
     try:
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        # Query for appointments with this WhatsApp number
-        cursor.execute("""
-            SELECT patient_name, booking_time, clinic_name, status, created_at
-            FROM book_an_appointment 
-            WHERE whatsapp_number = %s 
-            ORDER BY created_at DESC
-        """, (whatsapp_number,))
-        
-        appointments = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        rows = appointment_repo.find_by_number(whatsapp_number)
         
-        if appointments:
-            return True, appointments
+        if rows:
+            return True, rows
         else:
             return False, []
             
@@ -267,25 +100,9 @@ def format_appointment_message(appointments):
 def update_patient_name(whatsapp_number, new_name):
     """Update patient name in the database for a WhatsApp number"""
     try:
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
+        updated_count = len(appointment_repo.update_name(whatsapp_number, new_name))
         
-        # Update all appointments for this WhatsApp number
-        cursor.execute("""
-            UPDATE book_an_appointment 
-            SET patient_name = %s 
-            WHERE whatsapp_number = %s
-        """, (new_name, whatsapp_number))
-        
-        # Commit the changes
-        conn.commit()
-        updated_count = cursor.rowcount
-        
-        cursor.close()
-        conn.close()
-        
-        logger.info(f"Updated {updated_count} appointments for {whatsapp_number} with new name: {new_name}")
+        log_event(logger, "appointment.name_updated", whatsapp_number=whatsapp_number, new_name=new_name, updated=updated_count)
         return True, updated_count
         
     except Exception as e:
@@ -295,105 +112,16 @@ def update_patient_name(whatsapp_number, new_name):
 def update_appointment_datetime(whatsapp_number, new_datetime_str):
     """Update appointment date and time in the database"""
     try:
-        from datetime import datetime
-        import re
-        
-        # Try manual parsing first for common formats
-        try:
-            # Common format: "August 24, 2025 at 2:00 PM"
-            if " at " in new_datetime_str and "," in new_datetime_str:
-                # Parse the date part
-                date_part = new_datetime_str.split(" at ")[0].strip()
-                time_part = new_datetime_str.split(" at ")[1].strip()
-                
-                # Parse date
-                parsed_date = datetime.strptime(date_part, "%B %d, %Y")
-                
-                # Parse time
-                parsed_time = datetime.strptime(time_part, "%I:%M %p")
-                
-                # Combine date and time
-                combined_datetime = parsed_date.replace(
-                    hour=parsed_time.hour,
-                    minute=parsed_time.minute
-                )
-                
-                datetime_str = combined_datetime.strftime("%Y-%m-%d %H:%M:%S")
-                logger.info(f"Manual parsing successful: {datetime_str}")
-                
-                # Update the database
-                params = DatabaseConfig.get_connection_params()
-                conn = psycopg2.connect(**params)
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    UPDATE book_an_appointment 
-                    SET booking_time = %s 
-                    WHERE whatsapp_number = %s
-                """, (datetime_str, whatsapp_number))
-                
-                conn.commit()
-                updated_count = cursor.rowcount
-                cursor.close()
-                conn.close()
-                
-                logger.info(f"Updated {updated_count} appointments for {whatsapp_number} with new datetime: {datetime_str}")
-                return True, updated_count, datetime_str
-                
-        except Exception as manual_error:
-            logger.info(f"Manual parsing failed, trying AI: {str(manual_error)}")
-        
-        # Use AI to parse the datetime string if manual parsing fails
-        context = f"""
-        You are a helpful medical appointment assistant at Assana Clinic. Parse this date/time string into a proper datetime format for appointment scheduling.
-        
-        User input: "{new_datetime_str}"
-        
-        Your task is to:
-        1. Extract the date and time from the input
-        2. Convert it to ISO format: YYYY-MM-DD HH:MM:SS
-        3. If you can parse it, respond with "VALID_DATETIME: YYYY-MM-DD HH:MM:SS"
-        4. If you cannot parse it, respond with "INVALID_DATETIME: Please provide date and time in format 'Month Day, Year at Hour:Minute AM/PM' for your Assana Clinic appointment"
-        
-        Examples:
-        - "August 20, 2025 at 3:00 PM" → "VALID_DATETIME: 2025-08-20 15:00:00"
-        - "August 24, 2025 at 2:00 PM" → "VALID_DATETIME: 2025-08-24 14:00:00"
-        - "tomorrow at 2pm" → "VALID_DATETIME: [calculated date] 14:00:00"
-        
-        IMPORTANT: Respond with EXACTLY "VALID_DATETIME: [iso_format]" or "INVALID_DATETIME: [message]" - no other text.
-        
-        Respond with either "VALID_DATETIME: [iso_format]" or "INVALID_DATETIME: [message]"
-        """
+        # Parse locally first; the LLM is only asked about phrases the parser does not understand
+        datetime_str, error_msg = resolve_appointment_datetime(new_datetime_str)
+        if not datetime_str:
+            return False, 0, error_msg
         
-        ai_response = openai_service.create_chat_completion(context)
-        logger.info(f"AI response for datetime parsing: '{ai_response}'")
+        # Update the database
+        updated_count = len(appointment_repo.update_booking_time(whatsapp_number, datetime_str))
         
-        if "VALID_DATETIME:" in ai_response:
-            # Extract the datetime
-            datetime_str = ai_response.split("VALID_DATETIME:")[1].strip()
-            
-            # Update the database
-            params = DatabaseConfig.get_connection_params()
-            conn = psycopg2.connect(**params)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE book_an_appointment 
-                SET booking_time = %s 
-                WHERE whatsapp_number = %s
-            """, (datetime_str, whatsapp_number))
-            
-            conn.commit()
-            updated_count = cursor.rowcount
-            cursor.close()
-            conn.close()
-            
-            logger.info(f"Updated {updated_count} appointments for {whatsapp_number} with new datetime: {datetime_str}")
-            return True, updated_count, datetime_str
-            
-        else:
-            error_msg = ai_response.split("INVALID_DATETIME:")[1].strip() if "INVALID_DATETIME:" in ai_response else "Invalid date/time format"
-            return False, 0, error_msg
+        logger.info(f"Updated {updated_count} appointments for {whatsapp_number} with new datetime: {datetime_str}")
+        return True, updated_count, datetime_str
             
     except Exception as e:
         logger.error(f"Database error updating appointment datetime: {str(e)}")
@@ -402,23 +130,7 @@ def update_appointment_datetime(whatsapp_number, new_datetime_str):
 def update_clinic_name(whatsapp_number, new_clinic):
     """Update clinic name in the database"""
     try:
-        params = DatabaseConfig.get_connection_params()
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        
-        # Update all appointments for this WhatsApp number
-        cursor.execute("""
-            UPDATE book_an_appointment 
-            SET clinic_name = %s 
-            WHERE whatsapp_number = %s
-        """, (new_clinic, whatsapp_number))
-        
-        # Commit the changes
-        conn.commit()
-        updated_count = cursor.rowcount
-        
-        cursor.close()
-        conn.close()
+        updated_count = len(appointment_repo.update_clinic(whatsapp_number, new_clinic))
         
         logger.info(f"Updated {updated_count} appointments for {whatsapp_number} with new clinic: {new_clinic}")
         return True, updated_count
@@ -442,7 +154,10 @@ def home():
             "test_openai": "/test-openai",
             "check_appointment": "/check-appointment/<whatsapp_number>",
             "send_appointment": "/send-appointment/<whatsapp_number>",
-            "update_name": "/update-name/<whatsapp_number>"
+            "update_name": "/update-name/<whatsapp_number>",
+            "metrics": "/metrics",
+            "reminder_campaigns": "/campaigns/reminders",
+            "campaign_progress": "/campaigns/<campaign_id>"
         }
     })
 
@@ -451,9 +166,33 @@ def health():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "timestamp": time.time()
+        "timestamp": time.time(),
+        "database_pool": db_pool.stats(),
+        "openai_engine": openai_service.engine,
+        "faq_cache": openai_service.faq.stats(),
+        "chat_history": openai_service.conversation_history.stats(),
+        "thread_cache": conversation_threads.stats(),
+        "warm_threads": openai_service.warm_threads.stats() if openai_service.warm_threads else None,
+        "appointment_cache": appointment_repo.cache.stats(),
+        "datetime_parser": datetime_parser.stats(),
+        "tools": appointment_tools.stats(),
+        "message_dedup": processed_messages.stats(),
+        "read_receipts": read_receipts.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "logging": structured_logging.stats(),
+        "webhook_queue": message_queue.stats(),
+        "conversations": conversation_serializer.stats()
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this process"""
+    if not Config.METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    if Config.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {Config.METRICS_TOKEN}":
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/webhook', methods=['GET'])
 def verify_webhook():
     """Verify WhatsApp webhook"""
@@ -478,27 +217,74 @@ def verify_webhook():
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Handle incoming WhatsApp messages"""
+    # Every message in this delivery is traced under one ID, taken from the caller when it sends one
+    trace = metrics.start_trace(request.headers.get('X-Request-Id'))
     try:
         data = request.get_json()
-        logger.info(f"Received webhook data: {json.dumps(data, indent=2)}")
+        log_event(logger, "webhook.received", payload=data)
+        
+        # Extract every message in the delivery, across all entries and changes
+        batch = WebhookBatch.from_payload(data)
+        for message in batch.messages:
+            metrics.webhook_messages.inc(type=message.get('type'))
         
-        # Extract the message data
-        if 'object' in data and data['object'] == 'whatsapp_business_account':
-            for entry in data.get('entry', []):
-                for change in entry.get('changes', []):
-                    if change.get('value', {}).get('messages'):
-                        for message in change['value']['messages']:
-                            # Process the message
-                            process_message(message)
+        if Config.WEBHOOK_BATCH_MODE:
+            # One job per sender: a sender's messages stay in order and share a turn, senders run in parallel
+            jobs = [partial(process_sender_messages, messages) for messages in batch.by_sender.values()]
+            
+            # Load every sender's appointments with one query, ahead of their tool calls.
+            # Best effort: skipped when the queue is busy rather than run inside the request
+            senders = batch.senders
+            if Config.WEBHOOK_ASYNC and len(senders) >= Config.WEBHOOK_PREFETCH_MIN_SENDERS and appointment_repo.cache.enabled:
+                message_queue.submit(partial(prefetch_appointments, senders))
+        else:
+            jobs = [partial(process_message, message) for message in batch.messages]
         
-        return jsonify({"status": "success"}), 200
+        for job in jobs:
+            # Hand the job to the worker pool so Meta gets its 200 right away
+            if Config.WEBHOOK_ASYNC and message_queue.submit(job):
+                continue
+            # Queue disabled or full: process inline rather than drop the messages
+            job()
+        
+        return jsonify({"status": "success"}), 200, {"X-Trace-Id": trace.id}
         
     except Exception as e:
         logger.error(f"Error processing webhook: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+def run_webhook_job(job):
+    """Run a job queued by the webhook handler"""
+    job()
+
 def process_message(message):
     """Process incoming WhatsApp message and generate AI response"""
+    text_content = accept_message(message)
+    if text_content:
+        # One Assistant run per sender at a time; bursts are merged into a single turn
+        conversation_serializer.submit(message.get('from'), text_content)
+
+def process_sender_messages(messages):
+    """Process one sender's messages from a webhook delivery, in order, as a single burst"""
+    texts = [text for text in (accept_message(message) for message in messages) if text]
+    if texts:
+        conversation_serializer.submit_many(messages[0].get('from'), texts)
+
+def prefetch_appointments(senders):
+    """Warm the appointment cache for every sender in a delivery with one query"""
+    try:
+        with span("webhook.prefetch"):
+            appointment_repo.find_by_numbers(senders)
+        logger.info(f"Prefetched appointments for {len(senders)} senders")
+    except Exception as e:
+        logger.warning(f"Could not prefetch appointments: {str(e)}")
+
+def accept_message(message):
+    """
+    Deduplicate, mark read and validate an incoming message, replying
+    directly to ones that cannot be answered. Returns the message text when
+    it needs an AI response, otherwise None.
+    """
     try:
         # Extract message details
         message_id = message.get('id')
@@ -506,16 +292,23 @@ def process_message(message):
         message_type = message.get('type')
         timestamp = message.get('timestamp')
         
+        # Meta redelivers webhooks it thinks timed out; answer each message only once
+        with span("webhook.dedup"):
+            duplicate = processed_messages.is_duplicate(message_id)
+        if duplicate:
+            logger.info(f"Skipping duplicate delivery of message {message_id} from {from_number}")
+            return None
+        
         logger.info(f"Processing message from {from_number}: {message_type}")
         
-        # Mark message as read
-        whatsapp_service.mark_message_as_read(message_id)
+        # Mark message as read (queued, so a burst of messages costs one call)
+        read_receipts.mark_read(from_number, message_id)
         
         # Only process text messages
         if message_type != 'text':
             response_text = "I can only process text messages at the moment. Please send me a text message!"
             whatsapp_service.send_message(from_number, response_text)
-            return
+            return None
         
         # Extract text content
         text_content = message.get('text', {}).get('body', '')
@@ -523,29 +316,68 @@ def process_message(message):
         if not text_content.strip():
             response_text = "I didn't receive any text. Please send me a message!"
             whatsapp_service.send_message(from_number, response_text)
-            return
+            return None
         
-        # Send typing indicator
-        whatsapp_service.send_typing_indicator(from_number, True)
+        return text_content
+            
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+        # Send error message to user
+        try:
+            error_message = "I'm sorry, but I encountered an error processing your message. Please try again later."
+            whatsapp_service.send_message(from_number, error_message)
+        except:
+            logger.error("Failed to send error message to user")
+        return None
+
+def respond_to_messages(from_number, messages):
+    """Generate and send one AI response for queued text messages from a sender"""
+    try:
+        text_content = "\n".join(messages)
         
-        # Use OpenAI Assistant API with function calling capabilities for all messages
-        logger.info(f"Using OpenAI Assistant with function calling for {from_number}")
+        if len(messages) > 1:
+            logger.info(f"Combined {len(messages)} messages from {from_number} into one turn")
         
-        response_text, thread_id = openai_service.create_assistant_response_with_functions(
-            text_content, 
-            from_number
-        )
+        # Show the typing indicator while the response is generated
+        read_receipts.typing(from_number)
+        
+        # Use the configured OpenAI engine with function calling capabilities for all messages
+        logger.info(f"Using OpenAI {openai_service.engine} engine with function calling for {from_number}")
+        
+        # Continue the sender's existing thread when there is one (the chat engine keeps its own history)
+        thread_id = None
+        if openai_service.engine == "assistants":
+            with span("thread_registry.get"):
+                thread_id = conversation_threads.get(from_number)
+        
+        with span("openai.create_response"):
+            response_text, thread_id = openai_service.create_response(
+                text_content, 
+                from_number,
+                thread_id
+            )
+        
+        if thread_id:
+            with span("thread_registry.set"):
+                conversation_threads.set(from_number, thread_id)
+        
+        # Make sure a late typing indicator cannot show up after the answer
+        with span("read_receipts.before_reply"):
+            read_receipts.before_reply(from_number)
         
         # Send the AI response directly to the user
         success, result = whatsapp_service.send_message(from_number, response_text)
         
         if success:
             logger.info(f"AI response with functions sent successfully to {from_number}")
+            metrics.finish_reply("sent")
         else:
             logger.error(f"Failed to send AI response to {from_number}: {result}")
+            metrics.finish_reply("send_failed")
             
     except Exception as e:
-        logger.error(f"Error processing message: {str(e)}")
+        logger.error(f"Error responding to messages: {str(e)}")
+        metrics.finish_reply("error")
         # Send error message to user
         try:
             error_message = "I'm sorry, but I encountered an error processing your message. Please try again later."
@@ -553,6 +385,59 @@ def process_message(message):
         except:
             logger.error("Failed to send error message to user")
 
+# Keeps one Assistant run in flight per sender and merges messages sent in quick succession
+conversation_serializer = ConversationSerializer(
+    respond_to_messages,
+    debounce=Config.CONVERSATION_DEBOUNCE,
+    max_wait=Config.CONVERSATION_MAX_WAIT,
+    max_batch=Config.CONVERSATION_MAX_BATCH
+)
+
+# Background workers that drain webhook messages after the request is acknowledged
+message_queue = JobQueue(
+    run_webhook_job,
+    workers=Config.WEBHOOK_WORKERS,
+    max_size=Config.WEBHOOK_QUEUE_SIZE,
+    enqueue_timeout=Config.WEBHOOK_ENQUEUE_TIMEOUT,
+    name="webhook"
+)
+message_queue.register_shutdown(Config.WEBHOOK_DRAIN_TIMEOUT)
+
+# Point-in-time values read from the components' own stats on each scrape
+metrics.registry.gauge(
+    "assana_webhook_queue_depth", "Webhook messages waiting for a worker",
+    lambda: message_queue.stats()["depth"]
+)
+metrics.registry.gauge(
+    "assana_webhook_busy_workers", "Webhook workers processing a message",
+    lambda: message_queue.stats()["busy_workers"]
+)
+metrics.registry.gauge(
+    "assana_db_pool_connections", "Pooled database connections by state",
+    lambda: {state: db_pool.stats()[state] for state in ("open", "in_use", "idle")},
+    label="state"
+)
+metrics.registry.gauge(
+    "assana_active_conversations", "Senders with a turn pending or in progress",
+    lambda: conversation_serializer.stats()["active_conversations"]
+)
+
+def _rate_limit_metric(field):
+    return lambda: {name: stats[field] for name, stats in rate_limiter.stats().items()}
+
+# Token bucket state per upstream API, for sizing rates and bursts against real traffic
+metrics.registry.gauge(
+    "assana_rate_limit_available", "Tokens left in each rate limit bucket (negative while callers are queued)",
+    _rate_limit_metric("available"), label="bucket"
+)
+for field, name, documentation in (
+    ("acquired", "assana_rate_limit_acquired_total", "Calls that took a token from each rate limit bucket"),
+    ("waited", "assana_rate_limit_waited_total", "Calls that had to wait for a token"),
+    ("rejected", "assana_rate_limit_rejected_total", "Calls rejected because no token was available in time"),
+    ("wait_time_total", "assana_rate_limit_wait_seconds_total", "Seconds callers spent waiting for a token")
+):
+    metrics.registry.gauge(name, documentation, _rate_limit_metric(field), label="bucket", metric_type="counter")
+
 @app.route('/send-message', methods=['POST'])
 def send_message():
     """Manual endpoint to send a message (for testing)"""
@@ -776,6 +661,85 @@ def send_appointment_endpoint(whatsapp_number):
         logger.error(f"Error sending appointment: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+def campaign_auth_error():
+    """Error response unless the request carries the CAMPAIGN_API_TOKEN bearer token"""
+    if not Config.CAMPAIGN_API_TOKEN:
+        return jsonify({"error": "Campaign endpoints are disabled"}), 403
+    if request.headers.get('Authorization') != f"Bearer {Config.CAMPAIGN_API_TOKEN}":
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+@app.route('/campaigns/reminders', methods=['POST'])
+def create_reminder_campaign_endpoint():
+    """Create an appointment reminder campaign and start sending it in the background"""
+    auth_error = campaign_auth_error()
+    if auth_error:
+        return auth_error
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        if data.get('window_start') and data.get('window_end'):
+            window_start = datetime.fromisoformat(data['window_start'])
+            window_end = datetime.fromisoformat(data['window_end'])
+        else:
+            window_start, window_end = day_window(int(data.get('days_ahead', 1)))
+        
+        if window_end <= window_start:
+            return jsonify({"error": "'window_end' must be after 'window_start'"}), 400
+        
+        campaign_id, recipient_count = reminder_campaigns.create(window_start, window_end, data.get('name'))
+        reminder_campaigns.run_in_background(campaign_id)
+        
+        return jsonify({
+            "status": "success",
+            "campaign_id": campaign_id,
+            "recipient_count": recipient_count,
+            "window_start": window_start.isoformat(),
+            "window_end": window_end.isoformat()
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({"error": f"Invalid campaign window: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Error creating reminder campaign: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/campaigns/<int:campaign_id>', methods=['GET'])
+def campaign_progress_endpoint(campaign_id):
+    """Get the progress of a reminder campaign"""
+    auth_error = campaign_auth_error()
+    if auth_error:
+        return auth_error
+    try:
+        progress = reminder_campaigns.progress(campaign_id)
+        
+        if progress is None:
+            return jsonify({"error": f"Campaign {campaign_id} not found"}), 404
+        
+        return jsonify({"status": "success", "campaign": progress})
+        
+    except Exception as e:
+        logger.error(f"Error getting campaign progress: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/campaigns/<int:campaign_id>/resume', methods=['POST'])
+def resume_campaign_endpoint(campaign_id):
+    """Resume an interrupted reminder campaign, skipping patients already reminded"""
+    auth_error = campaign_auth_error()
+    if auth_error:
+        return auth_error
+    try:
+        if reminder_campaigns.progress(campaign_id) is None:
+            return jsonify({"error": f"Campaign {campaign_id} not found"}), 404
+        
+        reminder_campaigns.run_in_background(campaign_id)
+        
+        return jsonify({"status": "success", "message": f"Campaign {campaign_id} resumed"}), 202
+        
+    except Exception as e:
+        logger.error(f"Error resuming campaign: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @app.route('/update-name/<whatsapp_number>', methods=['POST'])
 def update_name_endpoint(whatsapp_number):
     """Manual endpoint to update patient name for testing"""
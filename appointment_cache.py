@@ -0,0 +1,176 @@
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import psycopg2
+import psycopg2.extensions
+from config import Config, DatabaseConfig
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Postgres channel used to broadcast invalidations between workers
+NOTIFY_CHANNEL = "appointment_cache"
+
+class AppointmentCache:
+    """
+    TTL- and size-bounded cache of appointment rows keyed by WhatsApp number.
+
+    With the shared backend enabled, every invalidation is also published
+    with Postgres NOTIFY and each process runs a LISTEN thread that evicts
+    the same key, so writes in one gunicorn worker are seen by all of them.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, shared=None):
+        self.ttl = Config.APPOINTMENT_CACHE_TTL if ttl is None else ttl
+        self.max_entries = Config.APPOINTMENT_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.shared = Config.APPOINTMENT_CACHE_SHARED if shared is None else shared
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # whatsapp_number -> (rows, stored_at)
+        self._generation = 0
+        self._listener_pid = None
+        # Identifies this process's own notifications so it can skip them
+        self._origin = uuid.uuid4().hex
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "remote_invalidations": 0,
+            "stale_writes_skipped": 0
+        }
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, whatsapp_number):
+        """Get cached rows for a WhatsApp number, or None on a miss"""
+        if not self.enabled:
+            return None
+        self._ensure_listener()
+
+        with self._lock:
+            entry = self._entries.get(whatsapp_number)
+            if entry is not None:
+                rows, stored_at = entry
+                if time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(whatsapp_number)
+                    self._stats["hits"] += 1
+                    return rows
+                del self._entries[whatsapp_number]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def generation(self):
+        """Token to pass to set() so a load that raced an invalidation is not cached"""
+        with self._lock:
+            return self._generation
+
+    def set(self, whatsapp_number, rows, generation=None):
+        """Store rows for a WhatsApp number unless an invalidation happened since `generation`"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._stats["stale_writes_skipped"] += 1
+                return
+            self._entries[whatsapp_number] = (tuple(rows), time.monotonic())
+            self._entries.move_to_end(whatsapp_number)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, whatsapp_number, conn=None):
+        """
+        Drop a WhatsApp number from the cache.
+
+        When the shared backend is enabled and a connection is given, the
+        invalidation is published on it; NOTIFY is delivered when that
+        connection's transaction commits. Returns the new generation token,
+        for a writer that wants to cache the rows it just wrote.
+        """
+        generation = self._evict(whatsapp_number)
+        with self._lock:
+            self._stats["invalidations"] += 1
+        if self.shared and conn is not None:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, f"{self._origin}:{whatsapp_number}"))
+            cursor.close()
+        return generation
+
+    def _evict(self, whatsapp_number):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(whatsapp_number, None)
+            return self._generation
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _ensure_listener(self):
+        """Start the LISTEN thread in the current process if the shared backend is on"""
+        if not self.shared or self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        thread = threading.Thread(target=self._listen, name="appointment-cache-listener", daemon=True)
+        thread.start()
+
+    def _listen(self):
+        """Evict keys invalidated by other workers, reconnecting after failures"""
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(connect_timeout=DatabaseConfig.DB_CONNECT_TIMEOUT, **DatabaseConfig.get_connection_params())
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # Anything cached while we were not listening may have missed an invalidation
+                self.clear()
+                logger.info("Listening for appointment cache invalidations")
+
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        origin, _, whatsapp_number = notify.payload.partition(":")
+                        if origin != self._origin:
+                            self._evict(whatsapp_number)
+                            with self._lock:
+                                self._stats["remote_invalidations"] += 1
+            except Exception as e:
+                logger.error(f"Appointment cache listener error: {str(e)}")
+                self.clear()
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def stats(self):
+        """Get hit/miss counters and the cache size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+            stats["ttl"] = self.ttl
+            stats["shared"] = self.shared
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
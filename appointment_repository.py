@@ -0,0 +1,156 @@
+import logging
+from appointment_cache import AppointmentCache
+from database import db_pool
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columns returned for every appointment row, in this order
+APPOINTMENT_COLUMNS = "patient_name, booking_time, clinic_name, status, created_at"
+
+# Columns the update methods are allowed to change
+UPDATABLE_FIELDS = ("patient_name", "booking_time", "clinic_name")
+
+class AppointmentRepository:
+    """
+    Data access for the book_an_appointment table.
+
+    Mutations are single UPDATE ... RETURNING statements, so callers get the
+    updated rows back in the same round trip instead of re-reading them.
+    Lookups are read through a per-number cache that every update
+    invalidates, then refills with the rows it returned.
+    """
+
+    def __init__(self, pool=None, cache=None):
+        self.pool = pool or db_pool
+        self.cache = cache or AppointmentCache()
+
+    def find_by_number(self, whatsapp_number):
+        """Get all appointment rows for a WhatsApp number, newest first"""
+        cached = self.cache.get(whatsapp_number)
+        if cached is not None:
+            return list(cached)
+
+        generation = self.cache.generation()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {APPOINTMENT_COLUMNS}
+                FROM book_an_appointment
+                WHERE whatsapp_number = %s
+                ORDER BY created_at DESC
+            """, (whatsapp_number,))
+            appointments = cursor.fetchall()
+            cursor.close()
+
+        self.cache.set(whatsapp_number, appointments, generation)
+        return appointments
+
+    def find_by_numbers(self, whatsapp_numbers):
+        """
+        Get appointment rows for several WhatsApp numbers, newest first per
+        number, with one query for all the numbers not already cached.
+
+        Returns {whatsapp_number: rows}; numbers without appointments map
+        to an empty list and are cached as such.
+        """
+        results = {}
+        missing = []
+        for whatsapp_number in dict.fromkeys(whatsapp_numbers):
+            cached = self.cache.get(whatsapp_number)
+            if cached is not None:
+                results[whatsapp_number] = list(cached)
+            else:
+                missing.append(whatsapp_number)
+        if not missing:
+            return results
+
+        generation = self.cache.generation()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT whatsapp_number, {APPOINTMENT_COLUMNS}
+                FROM book_an_appointment
+                WHERE whatsapp_number = ANY(%s)
+                ORDER BY created_at DESC
+            """, (missing,))
+            rows = cursor.fetchall()
+            cursor.close()
+
+        for whatsapp_number in missing:
+            results[whatsapp_number] = []
+        for row in rows:
+            results[row[0]].append(row[1:])
+        for whatsapp_number in missing:
+            self.cache.set(whatsapp_number, results[whatsapp_number], generation)
+        return results
+
+    def update_fields(self, whatsapp_number, **fields):
+        """
+        Update one or more fields on every appointment for a WhatsApp number
+        in a single statement.
+
+        Returns the updated rows, newest first (empty if none matched).
+        """
+        unknown = set(fields) - set(UPDATABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot update appointment field(s): {', '.join(sorted(unknown))}")
+        if not fields:
+            raise ValueError("No appointment fields to update")
+
+        columns = [name for name in UPDATABLE_FIELDS if name in fields]
+        assignments = ", ".join(f"{name} = %s" for name in columns)
+        values = [fields[name] for name in columns]
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                UPDATE book_an_appointment
+                SET {assignments}
+                WHERE whatsapp_number = %s
+                RETURNING {APPOINTMENT_COLUMNS}
+            """, values + [whatsapp_number])
+            updated = cursor.fetchall()
+            # Published to other workers when the UPDATE commits
+            generation = self.cache.invalidate(whatsapp_number, conn)
+            conn.commit()
+            cursor.close()
+
+        updated = sorted(updated, key=lambda row: (row[4] is not None, row[4]), reverse=True)
+        # The UPDATE matched every row for the number, so RETURNING is the full, fresh lookup result,
+        # unless another write invalidated the number after ours
+        self.cache.set(whatsapp_number, updated, generation)
+        return updated
+
+    def invalidate(self, whatsapp_number):
+        """Drop a number from the cache after book_an_appointment is changed elsewhere"""
+        if self.cache.shared:
+            with self.pool.connection() as conn:
+                self.cache.invalidate(whatsapp_number, conn)
+                conn.commit()
+        else:
+            self.cache.invalidate(whatsapp_number)
+
+    def update_name(self, whatsapp_number, new_name):
+        return self.update_fields(whatsapp_number, patient_name=new_name)
+
+    def update_booking_time(self, whatsapp_number, booking_time):
+        return self.update_fields(whatsapp_number, booking_time=booking_time)
+
+    def update_clinic(self, whatsapp_number, new_clinic):
+        return self.update_fields(whatsapp_number, clinic_name=new_clinic)
+
+    @staticmethod
+    def to_dict(row):
+        """Format an appointment row for Assistant tool output"""
+        return {
+            "patient_name": row[0],
+            "booking_time": row[1].strftime("%B %d, %Y at %I:%M %p") if row[1] else "Not set",
+            "clinic_name": row[2],
+            "status": row[3],
+            "created_at": row[4].strftime("%Y-%m-%d %H:%M:%S") if row[4] else "Not set"
+        }
+
+# Shared repository used by the Flask app and the Assistant tool functions
+appointment_repo = AppointmentRepository()
@@ -0,0 +1,204 @@
+import logging
+from appointment_repository import appointment_repo
+from datetime_parser import datetime_parser
+from tool_registry import ToolRegistry
+from structured_logging import log_event
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Appointment functions the OpenAI Assistant can call, with their schemas
+appointment_tools = ToolRegistry()
+
+@appointment_tools.tool(
+    description="Get appointment details for the current user"
+)
+def get_appointment_details(whatsapp_number):
+    """Get appointment details for a WhatsApp number"""
+    try:
+        rows = appointment_repo.find_by_number(whatsapp_number)
+        
+        if rows:
+            formatted_appointments = [appointment_repo.to_dict(apt) for apt in rows]
+            return {"success": True, "appointments": formatted_appointments}
+        else:
+            return {"success": False, "message": "No appointments found for this number"}
+            
+    except Exception as e:
+        logger.error(f"Database error getting appointments: {str(e)}")
+        return {"success": False, "message": f"Database error: {str(e)}"}
+
+INVALID_DATETIME_MESSAGE = "Invalid date/time format. Please use format: 'Month Day, Year at Hour:Minute AM/PM' (e.g., 'August 24, 2025 at 2:00 PM')"
+
+def resolve_appointment_datetime(new_datetime_str):
+    """Parse a date/time string, falling back to the LLM; returns (datetime_str, error message)"""
+    datetime_str, error = datetime_parser.resolve(new_datetime_str)
+    return datetime_str, None if datetime_str else (error or INVALID_DATETIME_MESSAGE)
+
+@appointment_tools.tool(
+    description="Update patient name for appointments",
+    parameters={
+        "type": "object",
+        "properties": {
+            "new_name": {
+                "type": "string",
+                "description": "The new patient name"
+            }
+        },
+        "required": ["new_name"]
+    },
+    writes=True
+)
+def update_appointment_name(whatsapp_number, new_name):
+    """Update patient name for appointments"""
+    try:
+        log_event(logger, "appointment.name_update", whatsapp_number=whatsapp_number, new_name=new_name)
+        
+        updated = appointment_repo.update_name(whatsapp_number, new_name)
+        
+        logger.info(f"Updated {len(updated)} rows for name change")
+        
+        if updated:
+            return {
+                "success": True,
+                "message": f"Updated name to '{new_name}' for {len(updated)} appointment(s)",
+                "appointments": [appointment_repo.to_dict(apt) for apt in updated]
+            }
+        else:
+            return {"success": False, "message": "No appointments found to update"}
+            
+    except Exception as e:
+        logger.error(f"Database error updating name: {str(e)}")
+        return {"success": False, "message": f"Database error: {str(e)}"}
+
+@appointment_tools.tool(
+    description="Update appointment date and time",
+    parameters={
+        "type": "object",
+        "properties": {
+            "new_datetime_str": {
+                "type": "string",
+                "description": "The new date and time in format 'Month Day, Year at Hour:Minute AM/PM'"
+            }
+        },
+        "required": ["new_datetime_str"]
+    },
+    writes=True
+)
+def update_appointment_datetime_db(whatsapp_number, new_datetime_str):
+    """Update appointment date and time"""
+    try:
+        datetime_str, error = resolve_appointment_datetime(new_datetime_str)
+        
+        # If parsing failed, return error
+        if not datetime_str:
+            return {"success": False, "message": error}
+        
+        updated = appointment_repo.update_booking_time(whatsapp_number, datetime_str)
+        
+        if updated:
+            return {
+                "success": True,
+                "message": f"Updated appointment time to {new_datetime_str} for {len(updated)} appointment(s)",
+                "appointments": [appointment_repo.to_dict(apt) for apt in updated]
+            }
+        else:
+            return {"success": False, "message": "No appointments found to update"}
+            
+    except Exception as e:
+        logger.error(f"Database error updating datetime: {str(e)}")
+        return {"success": False, "message": f"Database error: {str(e)}"}
+
+@appointment_tools.tool(
+    description="Update clinic name for appointments",
+    parameters={
+        "type": "object",
+        "properties": {
+            "new_clinic": {
+                "type": "string",
+                "description": "The new clinic name"
+            }
+        },
+        "required": ["new_clinic"]
+    },
+    writes=True
+)
+def update_appointment_clinic(whatsapp_number, new_clinic):
+    """Update clinic name for appointments"""
+    try:
+        updated = appointment_repo.update_clinic(whatsapp_number, new_clinic)
+        
+        if updated:
+            return {
+                "success": True,
+                "message": f"Updated clinic to '{new_clinic}' for {len(updated)} appointment(s)",
+                "appointments": [appointment_repo.to_dict(apt) for apt in updated]
+            }
+        else:
+            return {"success": False, "message": "No appointments found to update"}
+            
+    except Exception as e:
+        logger.error(f"Database error updating clinic: {str(e)}")
+        return {"success": False, "message": f"Database error: {str(e)}"}
+
+@appointment_tools.tool(
+    description="Update several appointment details at once (any combination of patient name, date/time and clinic). Prefer this when the user asks to change more than one detail.",
+    parameters={
+        "type": "object",
+        "properties": {
+            "new_name": {
+                "type": "string",
+                "description": "The new patient name"
+            },
+            "new_datetime_str": {
+                "type": "string",
+                "description": "The new date and time in format 'Month Day, Year at Hour:Minute AM/PM'"
+            },
+            "new_clinic": {
+                "type": "string",
+                "description": "The new clinic name"
+            }
+        },
+        "required": []
+    },
+    writes=True
+)
+def update_appointment_details(whatsapp_number, new_name=None, new_datetime_str=None, new_clinic=None):
+    """Update several appointment fields at once in a single statement"""
+    try:
+        fields = {}
+        changes = []
+        
+        if new_name:
+            fields["patient_name"] = new_name
+            changes.append(f"name to '{new_name}'")
+        
+        if new_datetime_str:
+            datetime_str, error = resolve_appointment_datetime(new_datetime_str)
+            if not datetime_str:
+                return {"success": False, "message": error}
+            fields["booking_time"] = datetime_str
+            changes.append(f"appointment time to {new_datetime_str}")
+        
+        if new_clinic:
+            fields["clinic_name"] = new_clinic
+            changes.append(f"clinic to '{new_clinic}'")
+        
+        if not fields:
+            return {"success": False, "message": "No changes were provided"}
+        
+        updated = appointment_repo.update_fields(whatsapp_number, **fields)
+        
+        if updated:
+            return {
+                "success": True,
+                "message": f"Updated {', '.join(changes)} for {len(updated)} appointment(s)",
+                "appointments": [appointment_repo.to_dict(apt) for apt in updated]
+            }
+        else:
+            return {"success": False, "message": "No appointments found to update"}
+            
+    except Exception as e:
+        logger.error(f"Database error updating appointment details: {str(e)}")
+        return {"success": False, "message": f"Database error: {str(e)}"}
@@ -0,0 +1,207 @@
+"""
+ASGI entry point: one event loop handles the webhook traffic.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker -w 2
+
+POST /webhook is served natively. Each message becomes a task that waits on
+OpenAI and the Graph API with AsyncOpenAIService and AsyncWhatsAppService,
+so a process can hold hundreds of conversations in flight without a thread
+each. Every other route is the Flask app from app.py, run through asgiref.
+"""
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.wsgi import WsgiToAsgi
+from config import Config
+from app import app as flask_app, openai_service, conversation_threads, processed_messages, prefetch_appointments
+from appointment_repository import appointment_repo
+from async_openai_service import AsyncOpenAIService
+from async_whatsapp_service import AsyncWhatsAppService
+from conversation_serializer import AsyncConversationSerializer
+from webhook_batch import WebhookBatch
+import metrics
+from metrics import span
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Async services sharing the Flask app's tools, caches and warm thread pool
+async_openai_service = AsyncOpenAIService(openai_service)
+async_whatsapp_service = AsyncWhatsAppService()
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+# Message tasks still running; held so they are not garbage collected mid-flight
+_tasks = set()
+
+ERROR_REPLY = "I'm sorry, but I encountered an error processing your message. Please try again later."
+
+async def respond_to_messages(from_number, batch):
+    """Generate and send one AI response for queued (message_id, text) pairs from a sender"""
+    try:
+        text_content = "\n".join(text for _, text in batch)
+        if len(batch) > 1:
+            logger.info(f"Combined {len(batch)} messages from {from_number} into one turn")
+
+        # Marking the newest message read covers the whole burst; the typing indicator rides along
+        typing_indicator = asyncio.create_task(async_whatsapp_service.send_typing_indicator(batch[-1][0]))
+
+        thread_id = None
+        if async_openai_service.engine == "assistants":
+            with span("thread_registry.get"):
+                thread_id = await asyncio.to_thread(conversation_threads.get, from_number)
+
+        with span("openai.create_response"):
+            response_text, thread_id = await async_openai_service.create_response(text_content, from_number, thread_id)
+
+        if thread_id:
+            with span("thread_registry.set"):
+                await asyncio.to_thread(conversation_threads.set, from_number, thread_id)
+
+        # The indicator must not arrive after the answer
+        await typing_indicator
+
+        success, result = await async_whatsapp_service.send_message(from_number, response_text)
+        if success:
+            logger.info(f"AI response with functions sent successfully to {from_number}")
+            metrics.finish_reply("sent")
+        else:
+            logger.error(f"Failed to send AI response to {from_number}: {result}")
+            metrics.finish_reply("send_failed")
+
+    except Exception as e:
+        logger.error(f"Error responding to messages: {str(e)}")
+        metrics.finish_reply("error")
+        await async_whatsapp_service.send_message(from_number, ERROR_REPLY)
+
+# One response in flight per sender; bursts are merged into a single turn
+conversation_serializer = AsyncConversationSerializer(
+    respond_to_messages,
+    debounce=Config.CONVERSATION_DEBOUNCE,
+    max_wait=Config.CONVERSATION_MAX_WAIT,
+    max_batch=Config.CONVERSATION_MAX_BATCH
+)
+
+async def process_message(message):
+    """Process incoming WhatsApp message and generate AI response"""
+    item = await accept_message(message)
+    if item:
+        await conversation_serializer.submit(message.get('from'), item)
+
+async def process_sender_messages(messages):
+    """Process one sender's messages from a webhook delivery, in order, as a single burst"""
+    items = [item for item in [await accept_message(message) for message in messages] if item]
+    if items:
+        await conversation_serializer.submit_many(messages[0].get('from'), items)
+
+async def accept_message(message):
+    """
+    Deduplicate and validate an incoming message, replying directly to ones
+    that cannot be answered. Returns (message_id, text) when it needs an AI
+    response, otherwise None.
+    """
+    message_id = message.get('id')
+    from_number = message.get('from')
+    try:
+        # Meta redelivers webhooks it thinks timed out; answer each message only once
+        with span("webhook.dedup"):
+            duplicate = await asyncio.to_thread(processed_messages.is_duplicate, message_id)
+        if duplicate:
+            logger.info(f"Skipping duplicate delivery of message {message_id} from {from_number}")
+            return None
+
+        message_type = message.get('type')
+        logger.info(f"Processing message from {from_number}: {message_type}")
+
+        text_content = message.get('text', {}).get('body', '') if message_type == 'text' else ''
+        if not text_content.strip():
+            await async_whatsapp_service.mark_message_as_read(message_id)
+            if message_type != 'text':
+                response_text = "I can only process text messages at the moment. Please send me a text message!"
+            else:
+                response_text = "I didn't receive any text. Please send me a message!"
+            await async_whatsapp_service.send_message(from_number, response_text)
+            return None
+
+        return message_id, text_content
+
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+        await async_whatsapp_service.send_message(from_number, ERROR_REPLY)
+        return None
+
+def _spawn(coroutine):
+    task = asyncio.get_running_loop().create_task(coroutine)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        event = await receive()
+        body += event.get("body", b"")
+        if not event.get("more_body"):
+            return body
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + list(headers)
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def webhook(scope, receive, send):
+    """Handle incoming WhatsApp messages; Meta gets its 200 before any processing"""
+    # Message tasks inherit this context, so the whole delivery is traced under one ID
+    request_id = dict(scope.get("headers") or []).get(b"x-request-id")
+    trace = metrics.start_trace(request_id.decode("latin-1") if request_id else None)
+    try:
+        data = json.loads(await _read_body(receive) or b"{}")
+        batch = WebhookBatch.from_payload(data)
+        for message in batch.messages:
+            metrics.webhook_messages.inc(type=message.get('type'))
+
+        if Config.WEBHOOK_BATCH_MODE:
+            senders = batch.senders
+            if len(senders) >= Config.WEBHOOK_PREFETCH_MIN_SENDERS and appointment_repo.cache.enabled:
+                _spawn(asyncio.to_thread(prefetch_appointments, senders))
+            for messages in batch.by_sender.values():
+                _spawn(process_sender_messages(messages))
+        else:
+            for message in batch.messages:
+                _spawn(process_message(message))
+        await _send_json(send, 200, {"status": "success"}, [(b"x-trace-id", trace.id.encode())])
+    except Exception as e:
+        logger.error(f"Error processing webhook: {str(e)}")
+        await _send_json(send, 500, {"error": "Internal server error"})
+
+async def lifespan(receive, send):
+    while True:
+        event = await receive()
+        if event["type"] == "lifespan.startup":
+            # Threads for the blocking work left: database lookups, appointment tools, the chat engine
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=Config.ASYNC_BLOCKING_WORKERS, thread_name_prefix="asgi-blocking")
+            )
+            await send({"type": "lifespan.startup.complete"})
+        elif event["type"] == "lifespan.shutdown":
+            if _tasks:
+                logger.info(f"Waiting for {len(_tasks)} message task(s) before shutdown")
+                await asyncio.wait(list(_tasks), timeout=Config.WEBHOOK_DRAIN_TIMEOUT)
+            await async_whatsapp_service.aclose()
+            await async_openai_service.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/webhook" and scope["method"] == "POST":
+        await webhook(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+import openai
+from config import Config
+from openai_service import OpenAIService, RUN_TIMEOUT_MESSAGE, ERROR_MESSAGE
+from run_waiter import AsyncRunWaiter
+from rate_limiter import rate_limiter
+from metrics import span
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AsyncOpenAIService:
+    """
+    asyncio counterpart of OpenAIService with the same methods and return
+    values, built on openai.AsyncOpenAI.
+
+    Shares the tool registry, FAQ cache, warm thread pool and chat engine
+    of a synchronous OpenAIService (pass the app's to avoid a second warm
+    pool). Assistant runs, polling and message calls are awaited on the
+    event loop; the appointment tools and the chat engine still do blocking
+    database and HTTP work, so they run on the loop's default executor.
+    """
+
+    def __init__(self, sync_service=None):
+        self.sync_service = sync_service or OpenAIService()
+        if not self.sync_service.client:
+            self.client = None
+        else:
+            self.client = openai.AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
+        self.assistant_id = Config.OPENAI_ASSISTANT_ID
+        self.engine = self.sync_service.engine
+        self.run_waiter = AsyncRunWaiter(self.client) if self.client else None
+        self.tools = self.sync_service.tools
+        self.faq = self.sync_service.faq
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self.client:
+            await self.client.close()
+
+    async def create_response(self, message, whatsapp_number, thread_id=None):
+        """
+        Respond to a WhatsApp message with the configured engine.
+        Returns (response_text, thread_id); thread_id is unchanged in chat mode
+        and for questions answered from the FAQ cache.
+        """
+        with span("faq.answer"):
+            faq_answer = self.faq.answer(message)
+        if faq_answer:
+            logger.info(f"Answered FAQ from {whatsapp_number} without a model call")
+            if self.engine == "chat" and self.sync_service.chat_engine:
+                await asyncio.to_thread(
+                    self.sync_service.conversation_history.append_turn, whatsapp_number, message, faq_answer
+                )
+            elif thread_id:
+                await self._record_faq_turn(thread_id, message, faq_answer)
+            return faq_answer, thread_id
+
+        started = time.perf_counter()
+        if self.engine == "chat" and self.sync_service.chat_engine:
+            response_text, thread_id = await asyncio.to_thread(
+                self.sync_service._generate_response, message, whatsapp_number, thread_id
+            )
+        else:
+            response_text, thread_id = await self.create_assistant_response_with_functions(message, whatsapp_number, thread_id)
+        self.faq.observe_response(time.perf_counter() - started)
+        return response_text, thread_id
+
+    async def _record_faq_turn(self, thread_id, message, answer):
+        """Add an FAQ question and its answer to the thread so later runs see them"""
+        if not self.client:
+            return
+        try:
+            with span("openai.messages.create"):
+                await self.client.beta.threads.messages.create(thread_id=thread_id, role="user", content=message)
+                await self.client.beta.threads.messages.create(thread_id=thread_id, role="assistant", content=answer)
+        except Exception as e:
+            logger.warning(f"Could not add FAQ answer to thread {thread_id}: {str(e)}")
+
+    async def create_chat_completion(self, message, conversation_history=None):
+        """
+        Create a chat completion using OpenAI's API
+        """
+        if not self.client:
+            return "OpenAI API is not configured. Please set your OPENAI_API_KEY in the .env file to enable AI responses."
+
+        try:
+            messages = []
+            if conversation_history:
+                for msg in conversation_history:
+                    messages.append({
+                        "role": msg.get("role", "user"),
+                        "content": msg.get("content", "")
+                    })
+            messages.append({
+                "role": "user",
+                "content": message
+            })
+
+            await rate_limiter.acquire_async("openai_chat")
+            with span("openai.chat_completion"):
+                response = await self.client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    max_tokens=1000,
+                    temperature=0.7
+                )
+
+            ai_response = response.choices[0].message.content
+
+            logger.info("OpenAI response generated successfully")
+            return ai_response
+
+        except Exception as e:
+            logger.error(f"Error in OpenAI API call: {str(e)}")
+            return "I apologize, but I'm having trouble processing your request right now. Please try again later."
+
+    async def create_assistant_response_with_functions(self, message, whatsapp_number, thread_id=None):
+        """
+        Create a response using OpenAI Assistant API with function calling capabilities
+        """
+        if not self.client:
+            return await self.create_chat_completion(message), thread_id
+
+        try:
+            # Create a new thread if none exists
+            if not thread_id:
+                thread_id = await self._new_thread_id()
+
+            enhanced_message = f"User message: {message}\nWhatsApp number: {whatsapp_number}"
+
+            try:
+                with span("openai.messages.create"):
+                    await self.client.beta.threads.messages.create(
+                        thread_id=thread_id,
+                        role="user",
+                        content=enhanced_message
+                    )
+            except openai.NotFoundError:
+                # A cached thread was deleted on OpenAI's side; start a fresh one
+                logger.warning(f"Thread {thread_id} no longer exists, creating a new one")
+                thread_id = await self._new_thread_id()
+                with span("openai.messages.create"):
+                    await self.client.beta.threads.messages.create(
+                        thread_id=thread_id,
+                        role="user",
+                        content=enhanced_message
+                    )
+
+            # Tool calls do blocking database work, so each round is dispatched off the event loop
+            async def handle_tool_calls(tool_calls):
+                return await asyncio.to_thread(self.tools.dispatch, tool_calls, whatsapp_number)
+
+            await rate_limiter.acquire_async("openai_runs")
+            with span("openai.run"):
+                result = await self.run_waiter.run_to_completion(
+                    thread_id,
+                    handle_tool_calls,
+                    assistant_id=self.assistant_id,
+                    tools=self.tools.definitions()
+                )
+            if result.tool_rounds:
+                logger.info(f"Assistant run finished after {result.tool_rounds} tool round(s) in {result.elapsed:.2f}s")
+
+            if result.timed_out:
+                logger.warning(f"Assistant run timed out after {result.elapsed:.1f}s for {whatsapp_number}")
+                return RUN_TIMEOUT_MESSAGE, thread_id
+
+            if result.completed:
+                response_text = result.message_text or await self._latest_message_text(thread_id)
+                if response_text:
+                    return response_text, thread_id
+
+            return ERROR_MESSAGE, thread_id
+
+        except Exception as e:
+            logger.error(f"Error in OpenAI Assistant API call: {str(e)}")
+            return ERROR_MESSAGE, thread_id
+
+    async def _new_thread_id(self):
+        """
+        Get an empty thread, from the warm pool when one is available
+        """
+        warm_threads = self.sync_service.warm_threads
+        thread_id = warm_threads.claim() if warm_threads else None
+        if thread_id:
+            return thread_id
+        with span("openai.threads.create"):
+            thread = await self.client.beta.threads.create()
+        return thread.id
+
+    async def _latest_message_text(self, thread_id):
+        """
+        Get the text of the newest message on a thread
+        """
+        with span("openai.messages.list"):
+            messages = await self.client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+        latest_message = messages.data[0]
+
+        if latest_message.content:
+            return latest_message.content[0].text.value
+        return None
@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import random
+import httpx
+from config import Config
+from rate_limiter import rate_limiter, FAIL_FAST
+from metrics import span, graph_responses
+from structured_logging import log_event
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Responses retried with jittered backoff, as in create_graph_session(); POSTs only on 429
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POST_RETRY_STATUSES = (429,)
+
+class AsyncWhatsAppService:
+    """
+    asyncio counterpart of WhatsAppService with the same methods and return
+    values, built on a pooled httpx.AsyncClient.
+
+    Retries follow the synchronous session: connection failures, 429s and
+    (for GETs) 5xx responses are retried with full-jitter exponential
+    backoff, honoring Retry-After. A read timeout or a 5xx on a POST is
+    never replayed because the message may already have been sent.
+    """
+
+    def __init__(self):
+        self.access_token = Config.ACCESS_TOKEN
+        self.phone_number_id = Config.PHONE_NUMBER_ID
+        self.api_url = Config.WHATSAPP_API_URL
+        self.max_retries = Config.WHATSAPP_MAX_RETRIES
+        self.backoff_factor = Config.WHATSAPP_RETRY_BACKOFF
+        self._client = None
+
+        if not self.access_token or self.access_token == 'your_whatsapp_access_token_here':
+            logger.warning("WhatsApp credentials not configured. WhatsApp features will be disabled.")
+            self.headers = None
+        else:
+            self.headers = {
+                'Authorization': f'Bearer {self.access_token}',
+                'Content-Type': 'application/json'
+            }
+
+    @property
+    def client(self):
+        """Keep-alive client, created on first use inside the running event loop"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(Config.WHATSAPP_READ_TIMEOUT, connect=Config.WHATSAPP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=Config.ASYNC_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.ASYNC_HTTP_MAX_CONNECTIONS
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, self.backoff_factor * (2 ** attempt))
+
+    async def _request(self, operation, method, url, **kwargs):
+        """Send a Graph API request, timed and counted per operation"""
+        with span(f"whatsapp.{operation}"):
+            response = await self._send_with_retries(method, url, **kwargs)
+        graph_responses.inc(operation=operation, status=response.status_code)
+        return response
+
+    async def _send_with_retries(self, method, url, **kwargs):
+        """Send a Graph API request, retrying connection failures and 429 (and, for GETs, 5xx) responses"""
+        retry_statuses = POST_RETRY_STATUSES if method.upper() == "POST" else RETRY_STATUSES
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.request(method, url, headers=self.headers, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+            if response.status_code not in retry_statuses or attempt == self.max_retries:
+                return response
+            await asyncio.sleep(self._retry_delay(attempt, response))
+        return response
+
+    async def send_message(self, to_number, message):
+        """
+        Send a text message via WhatsApp Business API
+        """
+        if not self.headers:
+            logger.warning("WhatsApp not configured. Message not sent.")
+            return False, "WhatsApp API is not configured. Please set your WhatsApp credentials in the .env file."
+
+        try:
+            url = f"{self.api_url}/{self.phone_number_id}/messages"
+
+            payload = {
+                "messaging_product": "whatsapp",
+                "to": to_number,
+                "type": "text",
+                "text": {
+                    "body": message
+                }
+            }
+
+            await rate_limiter.acquire_async("graph_messages")
+
+            response = await self._request("send_message", "POST", url, json=payload)
+
+            if response.status_code == 200:
+                logger.info(f"Message sent successfully to {to_number}")
+                return True, response.json()
+            else:
+                logger.error(f"Failed to send message: {response.status_code} - {response.text}")
+                return False, response.text
+
+        except Exception as e:
+            logger.error(f"Error sending WhatsApp message: {str(e)}")
+            return False, str(e)
+
+    async def send_typing_indicator(self, message_id):
+        """
+        Show the typing indicator in reply to a message (also marks it as read)
+        """
+        return await self.mark_message_as_read(message_id, typing=True)
+
+    async def mark_message_as_read(self, message_id, typing=False):
+        """
+        Mark a message (and the ones before it) as read, optionally with the typing indicator
+        """
+        if not self.headers:
+            return False
+
+        try:
+            url = f"{self.api_url}/{self.phone_number_id}/messages"
+
+            payload = {
+                "messaging_product": "whatsapp",
+                "status": "read",
+                "message_id": message_id
+            }
+            if typing:
+                payload["typing_indicator"] = {"type": "text"}
+
+            # Best-effort call: skip it rather than delay the reply when over the limit
+            await rate_limiter.acquire_async("graph_messages", mode=FAIL_FAST)
+
+            response = await self._request("typing_indicator" if typing else "mark_read", "POST", url, json=payload)
+
+            if response.status_code == 200:
+                logger.info(f"Message {message_id} marked as read{' with typing indicator' if typing else ''}")
+                return True
+            else:
+                logger.error(f"Failed to mark message as read: {response.status_code}")
+                return False
+
+        except Exception as e:
+            logger.error(f"Error marking message as read: {str(e)}")
+            return False
+
+    def verify_webhook(self, mode, token, challenge):
+        """
+        Verify WhatsApp webhook
+        """
+        if mode == "subscribe" and token == Config.VERIFY_TOKEN:
+            logger.info("Webhook verified successfully")
+            return True, challenge
+        else:
+            logger.error("Webhook verification failed")
+            return False, None
+
+    async def send_template_message(self, to_number, template_name, language_code="en_US", components=None):
+        """
+        Send a template message via WhatsApp Business API
+        """
+        if not self.headers:
+            logger.warning("WhatsApp not configured. Template message not sent.")
+            return False, "WhatsApp API is not configured. Please set your WhatsApp credentials in the .env file."
+
+        try:
+            url = f"{self.api_url}/{self.phone_number_id}/messages"
+
+            payload = {
+                "messaging_product": "whatsapp",
+                "to": to_number,
+                "type": "template",
+                "template": {
+                    "name": template_name,
+                    "language": {
+                        "code": language_code
+                    }
+                }
+            }
+
+            # Add components if provided
+            if components:
+                payload["template"]["components"] = components
+
+            await rate_limiter.acquire_async("graph_templates")
+
+            response = await self._request("send_template", "POST", url, json=payload)
+
+            if response.status_code == 200:
+                logger.info(f"Template message '{template_name}' sent successfully to {to_number}")
+                return True, response.json()
+            else:
+                logger.error(f"Failed to send template message: {response.status_code} - {response.text}")
+                return False, response.text
+
+        except Exception as e:
+            logger.error(f"Error sending WhatsApp template message: {str(e)}")
+            return False, str(e)
+
+    async def get_available_templates(self):
+        """
+        Get list of available templates from WhatsApp Business API
+        """
+        if not self.headers:
+            logger.warning("WhatsApp not configured. Cannot fetch templates.")
+            return False, "WhatsApp API is not configured."
+
+        try:
+            url = f"{self.api_url}/{self.phone_number_id}/message_templates"
+
+            response = await self._request("get_templates", "GET", url)
+
+            if response.status_code == 200:
+                templates = response.json()
+                log_event(logger, "whatsapp.templates", templates=[t.get("name") for t in templates.get("data", [])])
+                return True, templates
+            else:
+                logger.error(f"Failed to get templates: {response.status_code} - {response.text}")
+                return False, response.text
+
+        except Exception as e:
+            logger.error(f"Error getting templates: {str(e)}")
+            return False, str(e)
+
+    async def send_appointment_template(self, to_number, patient_name, appointment_time, template_name="assanatest"):
+        """
+        Send appointment details using the specified template with parameters
+        """
+        try:
+            # Format appointment time
+            if appointment_time:
+                booking_str = appointment_time.strftime("%B %d, %Y at %I:%M %p")
+            else:
+                booking_str = "Not specified"
+
+            components = [
+                {
+                    "type": "body",
+                    "parameters": [
+                        {
+                            "type": "text",
+                            "text": patient_name
+                        },
+                        {
+                            "type": "text",
+                            "text": booking_str
+                        }
+                    ]
+                }
+            ]
+
+            return await self.send_template_message(to_number, template_name, "en", components)
+
+        except Exception as e:
+            logger.error(f"Error sending appointment template: {str(e)}")
+            return False, str(e)
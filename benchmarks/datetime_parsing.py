@@ -0,0 +1,152 @@
+"""
+Compare the local date/time parser with the previous strict-format + LLM path.
+
+    python benchmarks/datetime_parsing.py            # local parser only
+    python benchmarks/datetime_parsing.py --llm      # also time the LLM fallback (uses OPENAI_API_KEY)
+
+Reports how many sample phrases each path resolves without the LLM and the
+per-phrase latency (p50/p95) for cold and cached lookups.
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime_parser import DateTimeParser, datetime_fallback_prompt
+
+# Phrases in the shapes patients actually send when rescheduling
+SAMPLES = [
+    "August 24, 2025 at 2:00 PM",
+    "2025-08-24 14:00:00",
+    "2025-08-24T09:30",
+    "tomorrow at 2pm",
+    "Tomorrow 10:30 am",
+    "today at 5 PM",
+    "day after tomorrow at 11am",
+    "next friday 10:30",
+    "next wednesday at 4pm",
+    "coming friday at 10am",
+    "Monday at 9am",
+    "on saturday at noon",
+    "in 3 days at 4pm",
+    "in a week at 10am",
+    "24/08/2025 14:00",
+    "08/24/2025 2pm",
+    "24.08.2025 at 3pm",
+    "Aug 24 at 3 PM",
+    "24th of August at 3pm",
+    "September 2nd 11:15 am",
+    "3pm",
+    "at 10:00",
+    "sometime tomorrow afternoon",
+    "next week please",
+    "the monday after next at 9",
+    "same time as before"
+]
+
+# (phrase, clinic time it is sent at, expected booking_time), checked before timing
+EXPECTED = [
+    # Sent on Monday 2025-08-18: "next" skips the rest of this week, "coming" does not
+    ("next friday 10:30", datetime(2025, 8, 18, 9, 0), "2025-08-29 10:30:00"),
+    ("coming friday at 10am", datetime(2025, 8, 18, 9, 0), "2025-08-22 10:00:00"),
+    # Sent on Saturday 2025-08-23: next week's Wednesday is already the next one
+    ("next wednesday at 4pm", datetime(2025, 8, 23, 9, 0), "2025-08-27 16:00:00"),
+    ("next monday at 9am", datetime(2025, 8, 18, 9, 0), "2025-08-25 09:00:00"),
+    ("tomorrow at 2pm", datetime(2025, 8, 18, 9, 0), "2025-08-19 14:00:00")
+]
+
+def legacy_parse(new_datetime_str):
+    """The strict parser that ran before the LLM fallback previously"""
+    if " at " in new_datetime_str and "," in new_datetime_str:
+        try:
+            date_part = new_datetime_str.split(" at ")[0].strip()
+            time_part = new_datetime_str.split(" at ")[1].strip()
+            parsed_date = datetime.strptime(date_part, "%B %d, %Y")
+            parsed_time = datetime.strptime(time_part, "%I:%M %p")
+            return parsed_date.replace(hour=parsed_time.hour, minute=parsed_time.minute).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return None
+    if re.match(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', new_datetime_str):
+        return new_datetime_str
+    return None
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def report(label, resolved, timings):
+    print(f"{label:<28} resolved {resolved:>2}/{len(SAMPLES)}  "
+          f"p50 {percentile(timings, 50) * 1000:9.3f} ms  "
+          f"p95 {percentile(timings, 95) * 1000:9.3f} ms  "
+          f"mean {statistics.mean(timings) * 1000:9.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark appointment date/time parsing")
+    parser.add_argument("--rounds", type=int, default=200, help="Passes over the sample phrases for local timings (default: 200)")
+    parser.add_argument("--llm", action="store_true", help="Also time the LLM fallback for phrases the strict parser rejects")
+    parser.add_argument("--verbose", action="store_true", help="Print each phrase and its result")
+    args = parser.parse_args()
+
+    checker = DateTimeParser(cache_size=0)
+    wrong = [(phrase, expected, checker.parse(phrase, now)) for phrase, now, expected in EXPECTED]
+    wrong = [item for item in wrong if item[1] != item[2]]
+    for phrase, expected, result in wrong:
+        print(f"WRONG {phrase!r}: expected {expected}, got {result}")
+    print(f"Expected results: {len(EXPECTED) - len(wrong)}/{len(EXPECTED)} correct")
+    print()
+
+    legacy_timings, cold_timings, warm_timings = [], [], []
+    for _ in range(args.rounds):
+        for phrase in SAMPLES:
+            legacy_timings.append(timed(legacy_parse, phrase)[1])
+        local = DateTimeParser(cache_size=len(SAMPLES))
+        for phrase in SAMPLES:
+            cold_timings.append(timed(local.parse, phrase)[1])
+        for phrase in SAMPLES:
+            warm_timings.append(timed(local.parse, phrase)[1])
+
+    local = DateTimeParser()
+    legacy_results = {phrase: legacy_parse(phrase) for phrase in SAMPLES}
+    local_results = {phrase: local.parse(phrase) for phrase in SAMPLES}
+
+    if args.verbose:
+        for phrase in SAMPLES:
+            print(f"{phrase!r:<36} legacy={legacy_results[phrase]!s:<20} local={local_results[phrase]}")
+        print()
+
+    legacy_resolved = sum(1 for value in legacy_results.values() if value)
+    local_resolved = sum(1 for value in local_results.values() if value)
+    report("strict parser (previous)", legacy_resolved, legacy_timings)
+    report("local parser, cold", local_resolved, cold_timings)
+    report("local parser, cached", local_resolved, warm_timings)
+    print(f"LLM calls avoided: {local_resolved - legacy_resolved} of {len(SAMPLES) - legacy_resolved} "
+          f"that previously needed one")
+
+    if args.llm:
+        from openai_service import OpenAIService
+        openai_service = OpenAIService(warm_threads=False)
+        llm_timings = []
+        llm_resolved = legacy_resolved
+        for phrase in SAMPLES:
+            if legacy_results[phrase]:
+                continue
+            response, elapsed = timed(openai_service.create_chat_completion, datetime_fallback_prompt(phrase, local.now()))
+            llm_timings.append(elapsed)
+            llm_resolved += "VALID_DATETIME:" in response
+            if args.verbose:
+                print(f"{phrase!r:<36} llm={response.strip()!r} ({elapsed:.2f}s)")
+        if llm_timings:
+            report("strict + LLM fallback", llm_resolved, llm_timings)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare end-to-end reply latency of the Assistants and Chat Completions engines.
+
+    python benchmarks/engine_latency.py --number 15551234567
+    python benchmarks/engine_latency.py --number 15551234567 --engines chat --rounds 5
+
+Each round plays the same short conversation through every selected engine,
+using real OpenAI calls (OPENAI_API_KEY, OPENAI_ASSISTANT_ID) and the real
+appointment tools, so pick a test WhatsApp number. Reports p50/p95 per
+engine, overall and for turns that called tools.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai_service import OpenAIService
+
+# A conversation mixing plain questions and turns that need appointment tools
+CONVERSATION = [
+    ("Hi, what are your OPD hours?", False),
+    ("Can you show me my appointments?", True),
+    ("Which services do you offer for gut health?", False),
+    ("What is the clinic address?", False)
+]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(label, timings):
+    if not timings:
+        return
+    print(f"{label:<28} n={len(timings):<4} "
+          f"p50 {percentile(timings, 50):6.2f}s  "
+          f"p95 {percentile(timings, 95):6.2f}s  "
+          f"mean {statistics.mean(timings):6.2f}s")
+
+def run_engine(engine, whatsapp_number, rounds, verbose):
+    service = OpenAIService(warm_threads=engine == "assistants", engine=engine)
+    if not service.client:
+        sys.exit("OPENAI_API_KEY is not configured")
+    # Measure the engines themselves, not replies served from the FAQ cache
+    service.faq.enabled = False
+
+    all_timings, tool_timings = [], []
+    for round_number in range(rounds):
+        thread_id = None
+        service.conversation_history.forget(whatsapp_number)
+        for message, uses_tools in CONVERSATION:
+            started = time.perf_counter()
+            reply, thread_id = service.create_response(message, whatsapp_number, thread_id)
+            elapsed = time.perf_counter() - started
+            all_timings.append(elapsed)
+            if uses_tools:
+                tool_timings.append(elapsed)
+            if verbose:
+                print(f"[{engine} #{round_number + 1}] {elapsed:5.2f}s  {message!r} -> {reply[:80]!r}")
+    return all_timings, tool_timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Assistants vs Chat Completions reply latency")
+    parser.add_argument("--number", required=True, help="WhatsApp number used for the tool calls")
+    parser.add_argument("--rounds", type=int, default=3, help="Times the conversation is replayed per engine (default: 3)")
+    parser.add_argument("--engines", default="assistants,chat", help="Comma-separated engines to compare (default: assistants,chat)")
+    parser.add_argument("--verbose", action="store_true", help="Print every reply and its latency")
+    args = parser.parse_args()
+
+    results = {}
+    for engine in [name.strip() for name in args.engines.split(",") if name.strip()]:
+        results[engine] = run_engine(engine, args.number, args.rounds, args.verbose)
+
+    print()
+    for engine, (all_timings, tool_timings) in results.items():
+        summarize(f"{engine}: all turns", all_timings)
+        summarize(f"{engine}: tool turns", tool_timings)
+
+if __name__ == '__main__':
+    main()
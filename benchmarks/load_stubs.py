@@ -0,0 +1,340 @@
+"""
+Local stand-ins for the Graph API and the OpenAI API, used by load_test.py.
+
+GraphStub accepts POST /<version>/<phone_number_id>/messages (text, template
+and read-status payloads) and GET .../message_templates, and records every
+text reply so the load generator can time it.
+
+OpenAIStub emulates the parts of the OpenAI API the bot uses: assistants,
+threads, messages, runs (polled or streamed, with a get_appointment_details
+tool round when a message mentions an appointment) and chat completions
+(streamed or not, with the same tool round). Each model step takes
+`delay` seconds, +/- `jitter`.
+"""
+import json
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Messages that make the stub model call a tool first
+TOOL_KEYWORDS = ("appointment", "booking", "reschedule")
+
+def _new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _event(self, data, event=None):
+        chunk = (f"event: {event}\n" if event else "") + f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n"
+        self.wfile.write(chunk.encode())
+        self.wfile.flush()
+
+    def do_GET(self):
+        self.server.stub.handle(self, "GET")
+
+    def do_POST(self):
+        self.server.stub.handle(self, "POST")
+
+    def do_DELETE(self):
+        self.server.stub.handle(self, "DELETE")
+
+class _StubServer:
+    """Threaded HTTP server on a free local port"""
+
+    def __init__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, handler, method):
+        try:
+            self.route(handler, method, handler.path.split("?")[0])
+        except Exception as e:
+            handler._json({"error": {"message": str(e), "type": "stub_error"}}, status=500)
+
+class GraphStub(_StubServer):
+    """Fake WhatsApp Cloud API; `delay` seconds per call"""
+
+    version = "v18.0"
+
+    def __init__(self, delay=0.05):
+        super().__init__()
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._replies = defaultdict(queue.Queue)  # to number -> (received_at, body)
+        self.counts = defaultdict(int)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/{self.version}"
+
+    def replies(self, to_number):
+        """Queue of (received_at, body) for text messages sent to a number"""
+        with self._lock:
+            return self._replies[to_number]
+
+    def route(self, handler, method, path):
+        if self.delay:
+            time.sleep(self.delay)
+        if method == "GET" and path.endswith("/message_templates"):
+            self._count("templates_listed")
+            return handler._json({"data": [{"name": "assanatest", "language": "en", "status": "APPROVED"}]})
+        if method != "POST" or not path.endswith("/messages"):
+            return handler._json({"error": {"message": f"Unsupported {method} {path}"}}, status=404)
+
+        payload = handler._body()
+        if payload.get("status") == "read":
+            self._count("typing_indicators" if payload.get("typing_indicator") else "read_receipts")
+            return handler._json({"success": True})
+
+        to_number = payload.get("to")
+        if payload.get("type") == "text":
+            self._count("text_messages")
+            self.replies(to_number).put((time.monotonic(), payload["text"]["body"]))
+        else:
+            self._count(f"{payload.get('type')}_messages")
+        handler._json({
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to_number, "wa_id": to_number}],
+            "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]
+        })
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+class OpenAIStub(_StubServer):
+    """Fake OpenAI API for Assistants runs and Chat Completions"""
+
+    def __init__(self, delay=1.0, jitter=0.2, tool_rounds=1):
+        super().__init__()
+        self.delay = delay
+        self.jitter = jitter
+        self.tool_rounds = tool_rounds
+        self._lock = threading.RLock()
+        self._threads = {}  # thread_id -> list of message dicts
+        self._runs = {}  # run_id -> run state
+        self.counts = defaultdict(int)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def _think(self):
+        time.sleep(max(0.0, self.delay * random.uniform(1 - self.jitter, 1 + self.jitter)))
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def route(self, handler, method, path):
+        parts = path.strip("/").split("/")[1:]  # drop "v1"
+        self._count(f"{method} /{'/'.join('{id}' if re.match(r'(thread|run|msg|asst|call)_', p) else p for p in parts)}")
+
+        if parts[:1] == ["assistants"] and method == "GET":
+            return handler._json({
+                "id": parts[1], "object": "assistant", "created_at": int(time.time()), "model": "gpt-4o-mini",
+                "name": "Stub assistant", "instructions": "You are a clinic assistant (load-test stub).", "tools": []
+            })
+        if parts == ["chat", "completions"]:
+            return self._chat_completion(handler, handler._body())
+        if parts[:1] != ["threads"]:
+            return handler._json({"error": {"message": f"Unsupported {method} {path}"}}, status=404)
+
+        if len(parts) == 1:
+            return handler._json(self._create_thread())
+        thread_id = parts[1]
+        if len(parts) == 2:
+            if method == "DELETE":
+                with self._lock:
+                    self._threads.pop(thread_id, None)
+                return handler._json({"id": thread_id, "object": "thread.deleted", "deleted": True})
+            return handler._json({"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}})
+        if parts[2] == "messages":
+            if method == "POST":
+                body = handler._body()
+                return handler._json(self._add_message(thread_id, "user", body.get("content", "")))
+            with self._lock:
+                messages = list(reversed(self._threads.get(thread_id, [])))[:1]
+            return handler._json({"object": "list", "data": messages, "has_more": False,
+                                  "first_id": messages[0]["id"] if messages else None,
+                                  "last_id": messages[-1]["id"] if messages else None})
+        if parts[2] == "runs":
+            if len(parts) == 3:
+                body = handler._body()
+                run = self._create_run(thread_id, body)
+                return self._advance(handler, run, body.get("stream"))
+            run_id = parts[3]
+            with self._lock:
+                run = self._runs[run_id]
+            if len(parts) == 4:
+                return handler._json(self._poll_run(run))
+            if parts[4] == "submit_tool_outputs":
+                body = handler._body()
+                with self._lock:
+                    run["tool_rounds_done"] += 1
+                    run["status"] = "queued"
+                    run["required_action"] = None
+                    run["ready_at"] = time.monotonic() + self.delay
+                return self._advance(handler, run, body.get("stream"))
+            if parts[4] == "cancel":
+                with self._lock:
+                    run["status"] = "cancelled"
+                return handler._json(self._run_object(run))
+        handler._json({"error": {"message": f"Unsupported {method} {path}"}}, status=404)
+
+    def _create_thread(self):
+        thread_id = _new_id("thread")
+        with self._lock:
+            self._threads[thread_id] = []
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}}
+
+    def _add_message(self, thread_id, role, text):
+        message = {
+            "id": _new_id("msg"), "object": "thread.message", "created_at": int(time.time()),
+            "thread_id": thread_id, "role": role, "status": "completed",
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}]
+        }
+        with self._lock:
+            self._threads.setdefault(thread_id, []).append(message)
+        return message
+
+    def _create_run(self, thread_id, body):
+        with self._lock:
+            messages = self._threads.get(thread_id, [])
+            last_text = messages[-1]["content"][0]["text"]["value"] if messages else ""
+            run = {
+                "id": _new_id("run"), "thread_id": thread_id, "assistant_id": body.get("assistant_id"),
+                "status": "queued", "required_action": None, "tool_rounds_done": 0,
+                "wants_tools": any(word in last_text.lower() for word in TOOL_KEYWORDS),
+                "prompt": last_text, "ready_at": time.monotonic() + self.delay
+            }
+            self._runs[run["id"]] = run
+        return run
+
+    def _run_object(self, run):
+        return {
+            "id": run["id"], "object": "thread.run", "created_at": int(time.time()),
+            "thread_id": run["thread_id"], "assistant_id": run["assistant_id"],
+            "status": run["status"], "required_action": run["required_action"], "model": "gpt-4o-mini",
+            "instructions": "", "tools": [], "last_error": None
+        }
+
+    def _settle(self, run):
+        """Move a run whose think time has passed to requires_action or completed"""
+        if run["wants_tools"] and run["tool_rounds_done"] < self.tool_rounds:
+            run["status"] = "requires_action"
+            run["required_action"] = {
+                "type": "submit_tool_outputs",
+                "submit_tool_outputs": {"tool_calls": [{
+                    "id": _new_id("call"), "type": "function",
+                    "function": {"name": "get_appointment_details", "arguments": "{}"}
+                }]}
+            }
+            return None
+        run["status"] = "completed"
+        return self._add_message(run["thread_id"], "assistant", f"Stub reply to: {run['prompt'][:60]}")
+
+    def _poll_run(self, run):
+        with self._lock:
+            if run["status"] in ("queued", "in_progress"):
+                if time.monotonic() >= run["ready_at"]:
+                    self._settle(run)
+                else:
+                    run["status"] = "in_progress"
+            return self._run_object(run)
+
+    def _advance(self, handler, run, stream):
+        """Answer runs.create / submit_tool_outputs, streaming events until the run settles"""
+        if not stream:
+            return handler._json(self._run_object(run))
+        handler._start_events()
+        handler._event(self._run_object(run), "thread.run.queued" if run["tool_rounds_done"] == 0 else "thread.run.in_progress")
+        self._think()
+        with self._lock:
+            message = self._settle(run)
+        if message:
+            handler._event(message, "thread.message.completed")
+        handler._event(self._run_object(run), f"thread.run.{run['status']}")
+        handler._event("[DONE]", "done")
+
+    def _chat_completion(self, handler, body):
+        messages = body.get("messages", [])
+        last = messages[-1] if messages else {"role": "user", "content": ""}
+        user_text = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        tool_round = (
+            body.get("tools") and last.get("role") == "user"
+            and any(word in user_text.lower() for word in TOOL_KEYWORDS)
+        )
+        completion_id = _new_id("chatcmpl")
+        tool_calls = [{
+            "index": 0, "id": _new_id("call"), "type": "function",
+            "function": {"name": "get_appointment_details", "arguments": "{}"}
+        }] if tool_round else None
+        content = None if tool_round else f"Stub reply to: {user_text[:60]}"
+        finish_reason = "tool_calls" if tool_round else "stop"
+        self._think()
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = [{k: v for k, v in call.items() if k != "index"} for call in tool_calls]
+            return handler._json({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            })
+
+        handler._start_events()
+        delta = {"role": "assistant", "tool_calls": tool_calls} if tool_calls else {"role": "assistant", "content": content}
+        for choice in ({"index": 0, "delta": delta, "finish_reason": None},
+                       {"index": 0, "delta": {}, "finish_reason": finish_reason}):
+            handler._event({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"), "choices": [choice]
+            })
+        handler._event("[DONE]")
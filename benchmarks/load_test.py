@@ -0,0 +1,300 @@
+"""
+Load-test the webhook -> OpenAI -> WhatsApp pipeline against local stubs.
+
+    python benchmarks/load_test.py                                  # every configuration
+    python benchmarks/load_test.py --configs assistants,asgi --senders 100 --turns 5
+    python benchmarks/load_test.py --openai-delay 2 --env CONVERSATION_DEBOUNCE=0.5
+    python benchmarks/load_test.py --external-db                     # seed the DB_* database instead
+
+Starts a fake Graph API and a fake OpenAI API (load_stubs.py) and a disposable
+PostgreSQL seeded with appointments (pg_fixture.py). Then, for each
+configuration, runs the app in a subprocess pointed at them. Each simulated
+sender posts realistic webhook payloads and waits for its reply to reach the
+Graph stub before sending the next message. Reports webhook ack latency,
+end-to-end reply latency (p50/p95/p99), replies per second and error rates.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import queue
+import sys
+import threading
+import time
+import uuid
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_stubs import GraphStub, OpenAIStub
+from pg_fixture import LocalPostgres, ExternalPostgres, free_port
+
+# Server kind and environment for each configuration
+CONFIGS = {
+    "assistants": ("wsgi", {"OPENAI_ENGINE": "assistants", "OPENAI_RUN_STREAMING": "True"}),
+    "assistants-polling": ("wsgi", {"OPENAI_ENGINE": "assistants", "OPENAI_RUN_STREAMING": "False"}),
+    "chat": ("wsgi", {"OPENAI_ENGINE": "chat", "OPENAI_CHAT_STREAMING": "True"}),
+    "asgi": ("asgi", {"OPENAI_ENGINE": "assistants", "OPENAI_RUN_STREAMING": "True"})
+}
+
+# A patient conversation: small talk, an FAQ, and turns that need the appointment tools
+SCRIPT = [
+    "Hi",
+    "Can you show me my appointment details?",
+    "What are your OPD hours?",
+    "I want to reschedule my appointment to tomorrow at 3pm",
+    "Which doctors are available on Saturday?",
+    "Thank you!"
+]
+
+# Beginnings of the replies the app sends when something failed
+ERROR_REPLIES = (
+    "I apologize, but I'm having trouble",
+    "I'm sorry, but I encountered an error",
+    "I'm sorry, this is taking longer than expected"
+)
+
+PHONE_NUMBER_ID = "100000000000001"
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def webhook_payload(from_number, text):
+    """A WhatsApp Cloud API message webhook, as Meta sends it"""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "100000000000000",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550000000", "phone_number_id": PHONE_NUMBER_ID},
+                    "contacts": [{"profile": {"name": f"Patient {from_number[-4:]}"}, "wa_id": from_number}],
+                    "messages": [{
+                        "from": from_number,
+                        "id": f"wamid.{uuid.uuid4().hex}",
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": text}
+                    }]
+                }
+            }]
+        }]
+    }
+
+def serve(kind, port):
+    """Run the app (in a load-test subprocess)"""
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    if kind == "asgi":
+        import uvicorn
+        uvicorn.run("asgi:application", host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    else:
+        from werkzeug.serving import make_server
+        from app import app
+        make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+def wait_ready(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            requests.get(f"{base_url}/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+class Sender(threading.Thread):
+    """One patient: sends a message, waits for the reply, thinks, repeats"""
+
+    def __init__(self, number, webhook_url, replies, turns, think, reply_timeout, start_delay, offset):
+        super().__init__(daemon=True)
+        self.number = number
+        self.webhook_url = webhook_url
+        self.replies = replies
+        self.turns = turns
+        self.think = think
+        self.reply_timeout = reply_timeout
+        self.start_delay = start_delay
+        self.offset = offset
+        self.acks, self.latencies = [], []
+        self.webhook_errors = self.error_replies = self.timeouts = 0
+
+    def run(self):
+        session = requests.Session()
+        # Late replies left over from a previous configuration
+        while not self.replies.empty():
+            self.replies.get_nowait()
+        time.sleep(self.start_delay)
+        for turn in range(self.turns):
+            text = SCRIPT[(self.offset + turn) % len(SCRIPT)]
+            sent_at = time.monotonic()
+            try:
+                response = session.post(self.webhook_url, json=webhook_payload(self.number, text), timeout=30)
+                self.acks.append(time.monotonic() - sent_at)
+                if response.status_code != 200:
+                    self.webhook_errors += 1
+                    continue
+            except requests.RequestException:
+                self.webhook_errors += 1
+                continue
+            try:
+                received_at, body = self.replies.get(timeout=self.reply_timeout)
+            except queue.Empty:
+                self.timeouts += 1
+                continue
+            self.latencies.append(received_at - sent_at)
+            if body.startswith(ERROR_REPLIES):
+                self.error_replies += 1
+            if self.think:
+                time.sleep(self.think)
+
+def run_config(name, kind, env, args, graph, openai_stub):
+    """Start the app for one configuration, drive the load and collect the results"""
+    port = free_port()
+    base_url = args.url or f"http://127.0.0.1:{port}"
+    process = None
+    if not args.url:
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", kind, "--port", str(port)],
+            env=env,
+            stdout=None if args.verbose else subprocess.DEVNULL,
+            stderr=None if args.verbose else subprocess.DEVNULL
+        )
+    try:
+        if process:
+            wait_ready(base_url, process)
+        graph_before, openai_before = dict(graph.counts), dict(openai_stub.counts)
+        senders = [
+            Sender(number, f"{base_url}/webhook", graph.replies(number), args.turns, args.think,
+                   args.reply_timeout, args.ramp * i / max(1, args.senders), i)
+            for i, number in enumerate(args.numbers)
+        ]
+        started = time.monotonic()
+        for sender in senders:
+            sender.start()
+        for sender in senders:
+            sender.join()
+        elapsed = time.monotonic() - started
+    finally:
+        if process:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    acks = [value for sender in senders for value in sender.acks]
+    latencies = [value for sender in senders for value in sender.latencies]
+    sent = args.senders * args.turns
+    graph_calls = sum(graph.counts.values()) - sum(graph_before.values())
+    openai_calls = sum(openai_stub.counts.values()) - sum(openai_before.values())
+    return {
+        "config": name,
+        "server": kind,
+        "sent": sent,
+        "replies": len(latencies),
+        "elapsed": round(elapsed, 2),
+        "replies_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "ack_ms": {pct: round(percentile(acks, pct) * 1000, 1) for pct in (50, 95, 99)} if acks else None,
+        "reply_s": {pct: round(percentile(latencies, pct), 3) for pct in (50, 95, 99)} if latencies else None,
+        "reply_mean_s": round(statistics.mean(latencies), 3) if latencies else None,
+        "webhook_errors": sum(sender.webhook_errors for sender in senders),
+        "error_replies": sum(sender.error_replies for sender in senders),
+        "timeouts": sum(sender.timeouts for sender in senders),
+        "error_rate": round(sum(s.webhook_errors + s.error_replies + s.timeouts for s in senders) / sent, 4) if sent else 0.0,
+        "graph_calls_per_message": round(graph_calls / sent, 2) if sent else 0.0,
+        "openai_calls_per_message": round(openai_calls / sent, 2) if sent else 0.0
+    }
+
+def report(results):
+    print()
+    print(f"{'config':<20} {'sent':>5} {'replies':>7} {'msg/s':>7} {'ack p50/p95/p99 ms':>22} "
+          f"{'reply p50/p95/p99 s':>22} {'errors':>7} {'graph/msg':>9} {'openai/msg':>10}")
+    for result in results:
+        ack = "/".join(f"{result['ack_ms'][p]:.0f}" for p in (50, 95, 99)) if result["ack_ms"] else "-"
+        reply = "/".join(f"{result['reply_s'][p]:.2f}" for p in (50, 95, 99)) if result["reply_s"] else "-"
+        print(f"{result['config']:<20} {result['sent']:>5} {result['replies']:>7} {result['replies_per_second']:>7.2f} "
+              f"{ack:>22} {reply:>22} {result['error_rate'] * 100:>6.1f}% "
+              f"{result['graph_calls_per_message']:>9.2f} {result['openai_calls_per_message']:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the WhatsApp bot against local Graph/OpenAI/Postgres stubs")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help=f"Comma-separated configurations (default: {','.join(CONFIGS)})")
+    parser.add_argument("--senders", type=int, default=50, help="Concurrent simulated patients (default: 50)")
+    parser.add_argument("--turns", type=int, default=4, help="Messages each patient sends (default: 4)")
+    parser.add_argument("--think", type=float, default=0.5, help="Seconds a patient waits after a reply (default: 0.5)")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which patients start (default: 5)")
+    parser.add_argument("--reply-timeout", type=float, default=90.0, help="Seconds to wait for a reply before counting a timeout (default: 90)")
+    parser.add_argument("--openai-delay", type=float, default=1.0, help="Seconds per stub model step (default: 1.0)")
+    parser.add_argument("--graph-delay", type=float, default=0.05, help="Seconds per stub Graph API call (default: 0.05)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra app setting for every configuration")
+    parser.add_argument("--external-db", action="store_true", help="Seed the database from the DB_* settings instead of starting one")
+    parser.add_argument("--url", help="Drive an already running app (configured with --print-env) instead of starting one")
+    parser.add_argument("--print-env", action="store_true", help="Start the stubs, print the app settings for them and wait")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's logs")
+    parser.add_argument("--serve", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.port)
+
+    args.numbers = [f"1555{i:07d}" for i in range(args.senders)]
+    graph = GraphStub(delay=args.graph_delay).start()
+    openai_stub = OpenAIStub(delay=args.openai_delay).start()
+    database = (ExternalPostgres if args.external_db else LocalPostgres)(args.numbers)
+    try:
+        database.start()
+        base_env = dict(os.environ)
+        base_env.update(database.env())
+        base_env.update({
+            "OPENAI_API_KEY": "sk-loadtest",
+            "OPENAI_BASE_URL": openai_stub.url,
+            "OPENAI_ASSISTANT_ID": "asst_loadtest",
+            "ACCESS_TOKEN": "loadtest-token",
+            "VERIFY_TOKEN": "loadtest-verify",
+            "PHONE_NUMBER_ID": PHONE_NUMBER_ID,
+            "WHATSAPP_API_URL": graph.url,
+            "FLASK_DEBUG": "False"
+        })
+        base_env.update(setting.split("=", 1) for setting in args.env)
+
+        if args.print_env:
+            for key in ("OPENAI_API_KEY", "OPENAI_BASE_URL", "OPENAI_ASSISTANT_ID", "ACCESS_TOKEN", "PHONE_NUMBER_ID",
+                        "WHATSAPP_API_URL", "DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD"):
+                if key in base_env:
+                    print(f"export {key}={base_env[key]!r}")
+            print("Stubs running; press Ctrl+C to stop.")
+            while True:
+                time.sleep(3600)
+
+        results = []
+        for name in [name.strip() for name in args.configs.split(",") if name.strip()]:
+            kind, overrides = CONFIGS[name]
+            env = dict(base_env)
+            env.update(overrides)
+            env.update(setting.split("=", 1) for setting in args.env)
+            print(f"Running {name} ({args.senders} senders x {args.turns} turns)...")
+            results.append(run_config(name, kind, env, args, graph, openai_stub))
+        report(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        database.stop()
+        graph.stop()
+        openai_stub.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Disposable PostgreSQL for load_test.py.
+
+LocalPostgres runs initdb into a temporary directory, starts the server on a
+free port (TCP on 127.0.0.1 only), creates a database and seeds
+book_an_appointment for the load-test numbers. Everything is removed on
+stop(). It needs the PostgreSQL server binaries (initdb, pg_ctl) on PATH or
+under /usr/lib/postgresql/*/bin, and must not run as root.
+
+ExternalPostgres seeds an existing, disposable database described by the DB_*
+environment variables instead, and deletes the seeded rows afterwards.
+"""
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+import psycopg2
+
+CREATE_APPOINTMENTS = """
+    CREATE TABLE IF NOT EXISTS book_an_appointment (
+        id SERIAL PRIMARY KEY,
+        whatsapp_number TEXT NOT NULL,
+        patient_name TEXT,
+        booking_time TIMESTAMP,
+        clinic_name TEXT,
+        status TEXT DEFAULT 'confirmed',
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+"""
+
+CLINICS = ["Assana Clinic - Main", "Assana Clinic - North", "Assana Clinic - Riverside"]
+
+def _find_binary(name):
+    path = shutil.which(name)
+    if path:
+        return path
+    candidates = sorted(glob.glob(f"/usr/lib/postgresql/*/bin/{name}")) + sorted(glob.glob(f"/usr/local/opt/postgresql*/bin/{name}"))
+    return candidates[-1] if candidates else None
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def seed_appointments(conn, numbers, per_number=2):
+    """Create book_an_appointment if needed and give each number a few bookings"""
+    cursor = conn.cursor()
+    cursor.execute(CREATE_APPOINTMENTS)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_book_an_appointment_number_created ON book_an_appointment (whatsapp_number, created_at DESC)")
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    rows = []
+    for i, number in enumerate(numbers):
+        for j in range(per_number):
+            rows.append((number, f"Load Test Patient {i}", start + timedelta(hours=i % 48, days=j * 7), CLINICS[(i + j) % len(CLINICS)]))
+    cursor.executemany(
+        "INSERT INTO book_an_appointment (whatsapp_number, patient_name, booking_time, clinic_name) VALUES (%s, %s, %s, %s)",
+        rows
+    )
+    conn.commit()
+    cursor.close()
+
+def _remove_appointments(conn, numbers):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM book_an_appointment WHERE whatsapp_number = ANY(%s)", (list(numbers),))
+    conn.commit()
+    cursor.close()
+
+class LocalPostgres:
+    """A throwaway PostgreSQL server seeded with appointments"""
+
+    def __init__(self, numbers, dbname="loadtest"):
+        self.numbers = list(numbers)
+        self.dbname = dbname
+        self.port = None
+        self._dir = None
+        self._pg_ctl = None
+
+    def start(self):
+        initdb, pg_ctl = _find_binary("initdb"), _find_binary("pg_ctl")
+        if not initdb or not pg_ctl:
+            raise RuntimeError("PostgreSQL server binaries (initdb, pg_ctl) not found; install PostgreSQL or use --external-db")
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            raise RuntimeError("PostgreSQL refuses to run as root; run the load test as a regular user or use --external-db")
+
+        self._dir = tempfile.mkdtemp(prefix="loadtest-pg-")
+        self._pg_ctl = pg_ctl
+        self.port = free_port()
+        data_dir = os.path.join(self._dir, "data")
+        subprocess.run([initdb, "-D", data_dir, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        options = f"-p {self.port} -c listen_addresses=127.0.0.1 -k {self._dir} -c fsync=off -c max_connections=200"
+        subprocess.run([pg_ctl, "-D", data_dir, "-o", options, "-l", os.path.join(self._dir, "server.log"), "-w", "start"],
+                       check=True, stdout=subprocess.DEVNULL)
+
+        conn = psycopg2.connect(host="127.0.0.1", port=self.port, user="postgres", dbname="postgres")
+        conn.autocommit = True
+        conn.cursor().execute(f"CREATE DATABASE {self.dbname}")
+        conn.close()
+
+        conn = psycopg2.connect(**self._params())
+        seed_appointments(conn, self.numbers)
+        conn.close()
+        return self
+
+    def _params(self):
+        return {"host": "127.0.0.1", "port": self.port, "user": "postgres", "dbname": self.dbname}
+
+    def env(self):
+        """DB_* settings pointing the app at this server"""
+        return {"DB_HOST": "127.0.0.1", "DB_PORT": str(self.port), "DB_NAME": self.dbname, "DB_USER": "postgres", "DB_PASSWORD": ""}
+
+    def stop(self):
+        if self._dir is None:
+            return
+        subprocess.run([self._pg_ctl, "-D", os.path.join(self._dir, "data"), "-m", "immediate", "stop"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self._dir, ignore_errors=True)
+        self._dir = None
+
+class ExternalPostgres:
+    """An existing disposable database from the DB_* environment variables"""
+
+    def __init__(self, numbers):
+        self.numbers = list(numbers)
+
+    def _connect(self):
+        from config import DatabaseConfig
+        return psycopg2.connect(connect_timeout=DatabaseConfig.DB_CONNECT_TIMEOUT, **DatabaseConfig.get_connection_params())
+
+    def start(self):
+        conn = self._connect()
+        if self._table_exists(conn):
+            _remove_appointments(conn, self.numbers)
+        seed_appointments(conn, self.numbers)
+        conn.close()
+        return self
+
+    @staticmethod
+    def _table_exists(conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('book_an_appointment') IS NOT NULL")
+        exists = cursor.fetchone()[0]
+        cursor.close()
+        return exists
+
+    def env(self):
+        return {}
+
+    def stop(self):
+        conn = self._connect()
+        _remove_appointments(conn, self.numbers)
+        conn.close()
@@ -0,0 +1,318 @@
+import argparse
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from config import Config
+from database import db_pool
+from datetime_parser import datetime_parser
+from rate_limiter import TokenBucket, QUEUE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ReminderCampaigns:
+    """
+    Sends appointment reminder templates to every patient with an upcoming
+    booking.
+
+    Creating a campaign snapshots the recipients from book_an_appointment
+    with a single INSERT ... SELECT. Running it fans the template sends out
+    over a thread pool behind a rate limiter and records each outcome as it
+    happens, so an interrupted run can be resumed without re-sending to
+    patients who already got their reminder.
+    """
+
+    # First key of the advisory lock taken while a campaign is running
+    LOCK_NAMESPACE = 7301
+
+    # Tries at storing a send outcome before the run is stopped
+    RECORD_ATTEMPTS = 3
+
+    def __init__(self, whatsapp_service, pool=None, rate_per_second=None, concurrency=None, template_name=None, max_attempts=None):
+        self.whatsapp_service = whatsapp_service
+        self.pool = pool or db_pool
+        self.rate_per_second = Config.CAMPAIGN_RATE_PER_SECOND if rate_per_second is None else rate_per_second
+        self.concurrency = Config.CAMPAIGN_CONCURRENCY if concurrency is None else concurrency
+        self.template_name = template_name or Config.CAMPAIGN_TEMPLATE_NAME
+        self.max_attempts = Config.CAMPAIGN_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self._tables_ready = False
+
+    def _ensure_tables(self, conn):
+        """Create the campaign tables on first use"""
+        if self._tables_ready:
+            return
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reminder_campaigns (
+                id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL,
+                template_name TEXT NOT NULL,
+                window_start TIMESTAMP NOT NULL,
+                window_end TIMESTAMP NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                started_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reminder_campaign_recipients (
+                campaign_id INTEGER NOT NULL REFERENCES reminder_campaigns(id) ON DELETE CASCADE,
+                whatsapp_number TEXT NOT NULL,
+                patient_name TEXT,
+                booking_time TIMESTAMP,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                sent_at TIMESTAMPTZ,
+                PRIMARY KEY (campaign_id, whatsapp_number)
+            )
+        """)
+        conn.commit()
+        cursor.close()
+        self._tables_ready = True
+
+    def create(self, window_start, window_end, name=None):
+        """
+        Create a campaign for appointments booked in [window_start, window_end).
+
+        Returns (campaign_id, recipient_count). Each WhatsApp number gets one
+        reminder, for its most recently created appointment in the window.
+        """
+        name = name or f"Reminders {window_start:%Y-%m-%d %H:%M} - {window_end:%Y-%m-%d %H:%M}"
+        with self.pool.connection() as conn:
+            self._ensure_tables(conn)
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO reminder_campaigns (name, template_name, window_start, window_end)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id
+            """, (name, self.template_name, window_start, window_end))
+            campaign_id = cursor.fetchone()[0]
+
+            cursor.execute("""
+                INSERT INTO reminder_campaign_recipients (campaign_id, whatsapp_number, patient_name, booking_time)
+                SELECT DISTINCT ON (whatsapp_number) %s, whatsapp_number, patient_name, booking_time
+                FROM book_an_appointment
+                WHERE booking_time >= %s AND booking_time < %s
+                ORDER BY whatsapp_number, created_at DESC
+                ON CONFLICT DO NOTHING
+            """, (campaign_id, window_start, window_end))
+            recipient_count = cursor.rowcount
+
+            conn.commit()
+            cursor.close()
+
+        logger.info(f"Created reminder campaign {campaign_id} with {recipient_count} recipient(s)")
+        return campaign_id, recipient_count
+
+    def run(self, campaign_id):
+        """
+        Send every outstanding reminder for a campaign.
+
+        Recipients already marked sent are skipped, and failed ones are
+        retried until they reach max_attempts, so calling this again resumes
+        an interrupted run. Returns the campaign progress.
+        """
+        # Hold an advisory lock for the whole run so two workers never send the same campaign.
+        # The lock session lasts as long as the run, so it gets its own connection rather than a pool slot
+        with self.pool.dedicated_connection() as lock_conn:
+            self._ensure_tables(lock_conn)
+            cursor = lock_conn.cursor()
+            cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", (self.LOCK_NAMESPACE, campaign_id))
+            if not cursor.fetchone()[0]:
+                cursor.close()
+                lock_conn.rollback()
+                logger.warning(f"Reminder campaign {campaign_id} is already running elsewhere")
+                return self.progress(campaign_id)
+
+            try:
+                cursor.execute("""
+                    UPDATE reminder_campaigns
+                    SET status = 'running', started_at = COALESCE(started_at, NOW())
+                    WHERE id = %s
+                    RETURNING template_name
+                """, (campaign_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise ValueError(f"Reminder campaign {campaign_id} does not exist")
+                template_name = row[0]
+
+                cursor.execute("""
+                    SELECT whatsapp_number, patient_name, booking_time
+                    FROM reminder_campaign_recipients
+                    WHERE campaign_id = %s
+                    AND status IN ('pending', 'failed')
+                    AND attempts < %s
+                    ORDER BY whatsapp_number
+                """, (campaign_id, self.max_attempts))
+                recipients = cursor.fetchall()
+                lock_conn.commit()
+
+                logger.info(f"Sending {len(recipients)} reminder(s) for campaign {campaign_id}")
+                try:
+                    self._send_all(campaign_id, template_name, recipients)
+                except Exception:
+                    cursor.execute("UPDATE reminder_campaigns SET status = 'interrupted' WHERE id = %s", (campaign_id,))
+                    lock_conn.commit()
+                    raise
+
+                cursor.execute("""
+                    UPDATE reminder_campaigns
+                    SET status = CASE WHEN EXISTS (
+                            SELECT 1 FROM reminder_campaign_recipients
+                            WHERE campaign_id = %s AND status <> 'sent'
+                        ) THEN 'completed_with_failures' ELSE 'completed' END,
+                        finished_at = NOW()
+                    WHERE id = %s
+                """, (campaign_id, campaign_id))
+                lock_conn.commit()
+            finally:
+                # Session-level advisory locks survive the rollback of a failed transaction
+                lock_conn.rollback()
+                cursor.execute("SELECT pg_advisory_unlock(%s, %s)", (self.LOCK_NAMESPACE, campaign_id))
+                lock_conn.commit()
+                cursor.close()
+
+        return self.progress(campaign_id)
+
+    def _send_all(self, campaign_id, template_name, recipients):
+        """
+        Send reminders concurrently, throttled to the configured rate.
+
+        Each sender records its outcome through the pool, so concurrency is
+        capped at half the pool to leave connections for webhook traffic.
+        If an outcome cannot be stored, no further reminders are sent and
+        the error is raised: carrying on would re-send them on resume.
+        """
+        limiter = TokenBucket(f"campaign-{campaign_id}", self.rate_per_second, burst=1) if self.rate_per_second > 0 else None
+        workers = max(1, min(self.concurrency, self.pool.max_size // 2))
+        stopped = threading.Event()
+
+        def send(recipient):
+            if stopped.is_set():
+                return
+            whatsapp_number, patient_name, booking_time = recipient
+            if limiter:
+                limiter.acquire(mode=QUEUE)
+            if stopped.is_set():
+                return
+            try:
+                success, result = self.whatsapp_service.send_appointment_template(
+                    whatsapp_number,
+                    patient_name,
+                    booking_time,
+                    template_name=template_name
+                )
+            except Exception as e:
+                success, result = False, str(e)
+            try:
+                self._record(campaign_id, whatsapp_number, success, None if success else str(result))
+            except Exception:
+                stopped.set()
+                raise
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"campaign-{campaign_id}") as executor:
+            list(executor.map(send, recipients))
+
+    def _record(self, campaign_id, whatsapp_number, success, error):
+        """Store the outcome of one send as soon as it is known, retrying briefly before giving up"""
+        for attempt in range(1, self.RECORD_ATTEMPTS + 1):
+            try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        UPDATE reminder_campaign_recipients
+                        SET status = %s,
+                            attempts = attempts + 1,
+                            last_error = %s,
+                            sent_at = CASE WHEN %s THEN NOW() ELSE sent_at END
+                        WHERE campaign_id = %s AND whatsapp_number = %s
+                    """, ("sent" if success else "failed", error, success, campaign_id, whatsapp_number))
+                    conn.commit()
+                    cursor.close()
+                return
+            except Exception as e:
+                logger.error(f"Database error recording reminder for {whatsapp_number} (attempt {attempt}): {str(e)}")
+                if attempt == self.RECORD_ATTEMPTS:
+                    raise
+                time.sleep(0.5 * attempt)
+
+    def progress(self, campaign_id):
+        """Get the status of a campaign and counts of recipients per state"""
+        with self.pool.connection() as conn:
+            self._ensure_tables(conn)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT name, template_name, status, window_start, window_end, created_at, started_at, finished_at
+                FROM reminder_campaigns
+                WHERE id = %s
+            """, (campaign_id,))
+            campaign = cursor.fetchone()
+            if campaign is None:
+                cursor.close()
+                return None
+
+            cursor.execute("""
+                SELECT status, COUNT(*)
+                FROM reminder_campaign_recipients
+                WHERE campaign_id = %s
+                GROUP BY status
+            """, (campaign_id,))
+            counts = dict(cursor.fetchall())
+            cursor.close()
+
+        return {
+            "campaign_id": campaign_id,
+            "name": campaign[0],
+            "template_name": campaign[1],
+            "status": campaign[2],
+            "window_start": campaign[3].isoformat() if campaign[3] else None,
+            "window_end": campaign[4].isoformat() if campaign[4] else None,
+            "created_at": campaign[5].isoformat() if campaign[5] else None,
+            "started_at": campaign[6].isoformat() if campaign[6] else None,
+            "finished_at": campaign[7].isoformat() if campaign[7] else None,
+            "recipients": sum(counts.values()),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "pending": counts.get("pending", 0)
+        }
+
+    def run_in_background(self, campaign_id):
+        """Run a campaign on a background thread"""
+        def target():
+            try:
+                self.run(campaign_id)
+            except Exception as e:
+                logger.error(f"Reminder campaign {campaign_id} failed: {str(e)}")
+
+        thread = threading.Thread(target=target, name=f"campaign-{campaign_id}", daemon=True)
+        thread.start()
+        return thread
+
+def day_window(days_ahead=1):
+    """
+    Get the [start, end) window covering the day `days_ahead` days from
+    today, in the clinic's timezone like the booking times it is compared to
+    """
+    start = datetime.combine(datetime_parser.now().date() + timedelta(days=days_ahead), datetime.min.time())
+    return start, start + timedelta(days=1)
+
+if __name__ == '__main__':
+    from whatsapp_service import WhatsAppService
+
+    parser = argparse.ArgumentParser(description="Send appointment reminder templates")
+    parser.add_argument("--days-ahead", type=int, default=1, help="Remind patients booked this many days from today (default: 1)")
+    parser.add_argument("--resume", type=int, metavar="CAMPAIGN_ID", help="Resume an interrupted campaign instead of creating one")
+    args = parser.parse_args()
+
+    campaigns = ReminderCampaigns(WhatsAppService())
+    if args.resume:
+        campaign_id = args.resume
+    else:
+        window_start, window_end = day_window(args.days_ahead)
+        campaign_id, _ = campaigns.create(window_start, window_end)
+    logger.info(f"Campaign finished: {campaigns.run(campaign_id)}")
@@ -0,0 +1,189 @@
+import logging
+import os
+import time
+from types import SimpleNamespace
+from config import Config
+from rate_limiter import rate_limiter
+from metrics import span
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Used when the instructions cannot be loaded from a file or the configured Assistant
+DEFAULT_INSTRUCTIONS = f"You are the {Config.BUSINESS_NAME} virtual assistant on WhatsApp. Help patients with their appointments and questions about the clinic."
+
+class StreamedToolCall:
+    """A tool call assembled from streamed deltas, shaped like the SDK's tool call objects"""
+
+    def __init__(self, id, name, arguments):
+        self.id = id
+        self.type = "function"
+        self.function = SimpleNamespace(name=name, arguments=arguments)
+
+class ChatEngine:
+    """
+    Answers WhatsApp messages with Chat Completions and local tool calling.
+
+    The same appointment tools the Assistant uses are dispatched through the
+    tool registry, and the conversation comes from our own history store
+    instead of an OpenAI thread, so a turn is one request per tool-call
+    round rather than the Assistants create/poll/list cycle.
+
+    Instructions are read from CHAT_INSTRUCTIONS_FILE when set, otherwise
+    from the configured Assistant, so both engines behave the same.
+    """
+
+    def __init__(self, client, tools, history, model=None, streaming=None, max_tool_rounds=None, timeout=None, assistant_id=None):
+        self.client = client
+        self.tools = tools
+        self.history = history
+        self.model = model if model is not None else Config.OPENAI_CHAT_MODEL
+        self.streaming = Config.OPENAI_CHAT_STREAMING if streaming is None else streaming
+        self.max_tool_rounds = Config.OPENAI_MAX_TOOL_ROUNDS if max_tool_rounds is None else max_tool_rounds
+        self.timeout = Config.OPENAI_RUN_TIMEOUT if timeout is None else timeout
+        self.assistant_id = assistant_id if assistant_id is not None else Config.OPENAI_ASSISTANT_ID
+        self._instructions = None
+
+    def _load_instructions(self):
+        """Load the system instructions (and model, if not configured) once"""
+        if self._instructions is not None:
+            return self._instructions
+
+        instructions = None
+        if Config.CHAT_INSTRUCTIONS_FILE:
+            path = Config.CHAT_INSTRUCTIONS_FILE
+            if not os.path.isabs(path):
+                path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    instructions = f.read()
+            except OSError as e:
+                logger.warning(f"Could not read chat instructions from {path}: {str(e)}")
+
+        if (instructions is None or not self.model) and self.assistant_id:
+            try:
+                assistant = self.client.beta.assistants.retrieve(self.assistant_id)
+                instructions = instructions or assistant.instructions
+                self.model = self.model or assistant.model
+            except Exception as e:
+                logger.warning(f"Could not load instructions from Assistant {self.assistant_id}: {str(e)}")
+
+        self.model = self.model or "gpt-4o-mini"
+        self._instructions = instructions or DEFAULT_INSTRUCTIONS
+        return self._instructions
+
+    def respond(self, message, whatsapp_number, on_delta=None):
+        """
+        Generate a reply to a message, running any tool calls locally.
+
+        on_delta, if given, is called with each piece of reply text as it
+        streams in. Returns the reply text, or None if the model produced
+        none within the tool-round limit or the deadline.
+        """
+        deadline = time.monotonic() + self.timeout
+        instructions = self._load_instructions()
+
+        messages = [{"role": "system", "content": f"{instructions}\n\nWhatsApp number: {whatsapp_number}"}]
+        messages.extend(self.history.window(whatsapp_number))
+        messages.append({"role": "user", "content": message})
+
+        for round_number in range(self.max_tool_rounds + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"Chat completion for {whatsapp_number} ran out of time after {round_number} tool round(s)")
+                return None
+
+            content, tool_calls = self._complete(messages, remaining, on_delta)
+            if not tool_calls:
+                if content:
+                    self.history.append_turn(whatsapp_number, message, content)
+                return content
+
+            if round_number == self.max_tool_rounds:
+                break
+
+            messages.append({
+                "role": "assistant",
+                "content": content,
+                "tool_calls": [
+                    {
+                        "id": tool_call.id,
+                        "type": "function",
+                        "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments}
+                    }
+                    for tool_call in tool_calls
+                ]
+            })
+            for output in self.tools.dispatch(tool_calls, whatsapp_number):
+                messages.append({"role": "tool", "tool_call_id": output["tool_call_id"], "content": output["output"]})
+
+        logger.warning(f"Chat completion for {whatsapp_number} still calling tools after {self.max_tool_rounds} round(s)")
+        return None
+
+    @span("openai.chat.summary")
+    def summarize(self, summary, turns):
+        """Fold older (role, text) turns into a conversation's running summary"""
+        self._load_instructions()
+        transcript = "\n".join(f"{role.capitalize()}: {text}" for role, text in turns)
+        prompt = (
+            "Update the summary of a WhatsApp conversation between a clinic assistant and a patient. "
+            "Keep names, appointment details, requested changes and open questions; drop greetings and small talk. "
+            "Reply with the summary only, in a few short sentences.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            f"Newer messages:\n{transcript}"
+        )
+        rate_limiter.acquire("openai_chat")
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=Config.CHAT_SUMMARY_MAX_TOKENS,
+            timeout=self.timeout
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    @span("openai.chat.completion")
+    def _complete(self, messages, timeout, on_delta):
+        """Make one request; returns (content, tool_calls)"""
+        rate_limiter.acquire("openai_chat")
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "tools": self.tools.definitions(),
+            "timeout": timeout
+        }
+        if self.streaming:
+            return self._complete_streaming(params, on_delta)
+
+        response = self.client.chat.completions.create(**params)
+        reply = response.choices[0].message
+        return reply.content, list(reply.tool_calls or [])
+
+    def _complete_streaming(self, params, on_delta):
+        """Stream one request, assembling reply text and tool calls from the deltas"""
+        content = []
+        calls = {}  # index -> {"id", "name", "arguments"}
+        stream = self.client.chat.completions.create(stream=True, **params)
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content.append(delta.content)
+                    if on_delta:
+                        on_delta(delta.content)
+                for tool_call in delta.tool_calls or []:
+                    entry = calls.setdefault(tool_call.index, {"id": None, "name": "", "arguments": ""})
+                    if tool_call.id:
+                        entry["id"] = tool_call.id
+                    if tool_call.function:
+                        entry["name"] += tool_call.function.name or ""
+                        entry["arguments"] += tool_call.function.arguments or ""
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+        tool_calls = [StreamedToolCall(entry["id"], entry["name"], entry["arguments"]) for _, entry in sorted(calls.items())]
+        return "".join(content) or None, tool_calls
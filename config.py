@@ -9,6 +9,42 @@ class Config:
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     OPENAI_ASSISTANT_ID = os.getenv('OPENAI_ASSISTANT_ID')
     
+    # Response Engine: "assistants" (OpenAI threads and runs) or "chat" (Chat Completions with local history)
+    OPENAI_ENGINE = os.getenv('OPENAI_ENGINE', 'assistants')
+    # Chat engine model; empty uses the configured Assistant's model
+    OPENAI_CHAT_MODEL = os.getenv('OPENAI_CHAT_MODEL', '')
+    OPENAI_CHAT_STREAMING = os.getenv('OPENAI_CHAT_STREAMING', 'True').lower() == 'true'
+    # Chat engine system instructions; empty uses the configured Assistant's instructions
+    CHAT_INSTRUCTIONS_FILE = os.getenv('CHAT_INSTRUCTIONS_FILE', '')
+    # Chat engine history: prompt window budget, when older turns get summarized, and a hard cap on stored messages
+    CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', '1500'))
+    CHAT_HISTORY_SUMMARIZE_TOKENS = int(os.getenv('CHAT_HISTORY_SUMMARIZE_TOKENS', '3000'))
+    CHAT_HISTORY_MAX_MESSAGES = int(os.getenv('CHAT_HISTORY_MAX_MESSAGES', '40'))
+    CHAT_HISTORY_PERSISTENT = os.getenv('CHAT_HISTORY_PERSISTENT', 'False').lower() == 'true'
+    CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', '200'))
+    
+    # Assistant Run Waiting Configuration
+    OPENAI_RUN_STREAMING = os.getenv('OPENAI_RUN_STREAMING', 'True').lower() == 'true'
+    OPENAI_RUN_TIMEOUT = float(os.getenv('OPENAI_RUN_TIMEOUT', '60'))
+    OPENAI_POLL_INITIAL_INTERVAL = float(os.getenv('OPENAI_POLL_INITIAL_INTERVAL', '0.2'))
+    OPENAI_POLL_MAX_INTERVAL = float(os.getenv('OPENAI_POLL_MAX_INTERVAL', '2.0'))
+    OPENAI_POLL_BACKOFF = float(os.getenv('OPENAI_POLL_BACKOFF', '1.5'))
+    OPENAI_MAX_TOOL_ROUNDS = int(os.getenv('OPENAI_MAX_TOOL_ROUNDS', '5'))
+    
+    # Warm Thread Pool Configuration (a size of 0 disables the pool)
+    WARM_THREAD_POOL_SIZE = int(os.getenv('WARM_THREAD_POOL_SIZE', '3'))
+    WARM_THREAD_REFILL_RATE = float(os.getenv('WARM_THREAD_REFILL_RATE', '2'))
+    WARM_THREAD_MAX_AGE = float(os.getenv('WARM_THREAD_MAX_AGE', '3600'))
+    
+    # Assistant Tool Execution Configuration
+    TOOL_WORKERS = int(os.getenv('TOOL_WORKERS', '8'))
+    TOOL_TIMEOUT = float(os.getenv('TOOL_TIMEOUT', '15'))
+    
+    # Conversation Thread Cache Configuration
+    THREAD_CACHE_TTL = float(os.getenv('THREAD_CACHE_TTL', '86400'))
+    THREAD_CACHE_MAX_ENTRIES = int(os.getenv('THREAD_CACHE_MAX_ENTRIES', '10000'))
+    THREAD_CACHE_PERSISTENT = os.getenv('THREAD_CACHE_PERSISTENT', 'True').lower() == 'true'
+    
     # WhatsApp Business API Configuration
     ACCESS_TOKEN = os.getenv('ACCESS_TOKEN')
     VERIFY_TOKEN = os.getenv('VERIFY_TOKEN')
@@ -17,13 +53,111 @@ class Config:
     WHATSAPP_BUSINESS_APP_ID = os.getenv('WHATSAPP_BUSINESS_APP_ID')
     VERSION = os.getenv('VERSION', 'v18.0')
     
-    # WhatsApp API URLs
-    WHATSAPP_API_URL = f"https://graph.facebook.com/{VERSION}"
+    # WhatsApp API URLs (overridable to point at a local stub, e.g. for benchmarks/load_test.py)
+    WHATSAPP_API_URL = os.getenv('WHATSAPP_API_URL', f"https://graph.facebook.com/{VERSION}")
+    
+    # WhatsApp HTTP Client Configuration
+    WHATSAPP_POOL_SIZE = int(os.getenv('WHATSAPP_POOL_SIZE', '10'))
+    WHATSAPP_CONNECT_TIMEOUT = float(os.getenv('WHATSAPP_CONNECT_TIMEOUT', '3.05'))
+    WHATSAPP_READ_TIMEOUT = float(os.getenv('WHATSAPP_READ_TIMEOUT', '15'))
+    WHATSAPP_MAX_RETRIES = int(os.getenv('WHATSAPP_MAX_RETRIES', '3'))
+    WHATSAPP_RETRY_BACKOFF = float(os.getenv('WHATSAPP_RETRY_BACKOFF', '0.5'))
+    # Read receipts are held this long so a burst of messages is marked read with one call
+    READ_RECEIPT_DELAY = float(os.getenv('READ_RECEIPT_DELAY', '0.5'))
+    READ_RECEIPT_WORKERS = int(os.getenv('READ_RECEIPT_WORKERS', '4'))
+    
+    # Outbound Rate Limits (requests per second and burst size; a rate of 0 disables the limit)
+    RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '10'))
+    RATE_LIMIT_GRAPH_MESSAGES_RATE = float(os.getenv('RATE_LIMIT_GRAPH_MESSAGES_RATE', '50'))
+    RATE_LIMIT_GRAPH_MESSAGES_BURST = float(os.getenv('RATE_LIMIT_GRAPH_MESSAGES_BURST', '80'))
+    RATE_LIMIT_GRAPH_TEMPLATES_RATE = float(os.getenv('RATE_LIMIT_GRAPH_TEMPLATES_RATE', '30'))
+    RATE_LIMIT_GRAPH_TEMPLATES_BURST = float(os.getenv('RATE_LIMIT_GRAPH_TEMPLATES_BURST', '30'))
+    RATE_LIMIT_OPENAI_RUNS_RATE = float(os.getenv('RATE_LIMIT_OPENAI_RUNS_RATE', '5'))
+    RATE_LIMIT_OPENAI_RUNS_BURST = float(os.getenv('RATE_LIMIT_OPENAI_RUNS_BURST', '10'))
+    RATE_LIMIT_OPENAI_CHAT_RATE = float(os.getenv('RATE_LIMIT_OPENAI_CHAT_RATE', '10'))
+    RATE_LIMIT_OPENAI_CHAT_BURST = float(os.getenv('RATE_LIMIT_OPENAI_CHAT_BURST', '20'))
+    
+    # FAQ Answer Configuration: short questions about hours, address, contact, insurance and services
+    # are answered from the clinic details below without an Assistant run
+    FAQ_CACHE_ENABLED = os.getenv('FAQ_CACHE_ENABLED', 'True').lower() == 'true'
+    FAQ_MATCH_THRESHOLD = float(os.getenv('FAQ_MATCH_THRESHOLD', '0.8'))
+    FAQ_MAX_WORDS = int(os.getenv('FAQ_MAX_WORDS', '12'))
+    # Shorter messages are only answered when they are a question naming a topic that matches an FAQ exactly
+    FAQ_MIN_WORDS = int(os.getenv('FAQ_MIN_WORDS', '2'))
+    FAQ_CACHE_SIZE = int(os.getenv('FAQ_CACHE_SIZE', '2048'))
+    
+    # Appointment Lookup Cache Configuration (a TTL of 0 disables the cache)
+    APPOINTMENT_CACHE_TTL = float(os.getenv('APPOINTMENT_CACHE_TTL', '60'))
+    APPOINTMENT_CACHE_MAX_ENTRIES = int(os.getenv('APPOINTMENT_CACHE_MAX_ENTRIES', '5000'))
+    APPOINTMENT_CACHE_SHARED = os.getenv('APPOINTMENT_CACHE_SHARED', 'False').lower() == 'true'
+    
+    # Appointment Date/Time Parsing Configuration
+    # Timezone used to resolve "today", "tomorrow", weekdays etc. (empty = server local time)
+    CLINIC_TIMEZONE = os.getenv('CLINIC_TIMEZONE', '')
+    # How ambiguous numeric dates like 04/08/2025 are read: MDY or DMY
+    CLINIC_DATE_ORDER = os.getenv('CLINIC_DATE_ORDER', 'MDY')
+    DATETIME_PARSE_CACHE_SIZE = int(os.getenv('DATETIME_PARSE_CACHE_SIZE', '2048'))
+    
+    # Reminder Campaign Configuration
+    CAMPAIGN_TEMPLATE_NAME = os.getenv('CAMPAIGN_TEMPLATE_NAME', 'assanatest')
+    CAMPAIGN_RATE_PER_SECOND = float(os.getenv('CAMPAIGN_RATE_PER_SECOND', '30'))
+    # Send threads per campaign; capped at half of DB_POOL_MAX_SIZE since each records its outcome through the pool
+    CAMPAIGN_CONCURRENCY = int(os.getenv('CAMPAIGN_CONCURRENCY', '4'))
+    CAMPAIGN_MAX_ATTEMPTS = int(os.getenv('CAMPAIGN_MAX_ATTEMPTS', '3'))
+    # Bearer token required by the /campaigns endpoints (empty = endpoints disabled)
+    CAMPAIGN_API_TOKEN = os.getenv('CAMPAIGN_API_TOKEN', '')
     
     # Flask Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
     DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     
+    # Webhook Processing Configuration
+    WEBHOOK_ASYNC = os.getenv('WEBHOOK_ASYNC', 'True').lower() == 'true'
+    WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+    WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '200'))
+    WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv('WEBHOOK_ENQUEUE_TIMEOUT', '0.5'))
+    WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', '25'))
+    # Group a delivery's messages by sender into one job each, and prefetch appointments for
+    # deliveries with at least WEBHOOK_PREFETCH_MIN_SENDERS senders in one query
+    WEBHOOK_BATCH_MODE = os.getenv('WEBHOOK_BATCH_MODE', 'True').lower() == 'true'
+    WEBHOOK_PREFETCH_MIN_SENDERS = int(os.getenv('WEBHOOK_PREFETCH_MIN_SENDERS', '2'))
+    
+    # ASGI Entry Point Configuration (asgi.py)
+    ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv('ASYNC_HTTP_MAX_CONNECTIONS', '100'))
+    # Threads for the blocking work still done per message: database lookups, appointment tools, the chat engine
+    ASYNC_BLOCKING_WORKERS = int(os.getenv('ASYNC_BLOCKING_WORKERS', '32'))
+    
+    # Logging Configuration
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    # "json" writes one compact JSON object per line; "text" the classic level:logger:message lines
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    # Mask phone numbers, names and message text in log lines
+    LOG_REDACT_PII = os.getenv('LOG_REDACT_PII', 'True').lower() == 'true'
+    # Write log lines from a background thread fed through a bounded queue (full queue = dropped lines)
+    LOG_BACKGROUND = os.getenv('LOG_BACKGROUND', 'True').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    # Fraction of each structured event type that is logged, as "event=rate,..."; unlisted events are always logged
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'webhook.received=0.05,tool.call=0.25')
+    
+    # Metrics and Tracing Configuration (GET /metrics)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    # Replies slower than this log a per-stage timing breakdown
+    METRICS_SLOW_TRACE_SECONDS = float(os.getenv('METRICS_SLOW_TRACE_SECONDS', '10'))
+    # Bearer token required to scrape /metrics (empty = no authentication)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+    # Per-Conversation Ordering Configuration
+    # Seconds of quiet before a sender's turn starts, so a burst of messages is answered by one run
+    # (capped at CONVERSATION_MAX_WAIT); 0 turns coalescing off except for messages sent during a run
+    CONVERSATION_DEBOUNCE = float(os.getenv('CONVERSATION_DEBOUNCE', '1.0'))
+    CONVERSATION_MAX_WAIT = float(os.getenv('CONVERSATION_MAX_WAIT', '5'))
+    CONVERSATION_MAX_BATCH = int(os.getenv('CONVERSATION_MAX_BATCH', '10'))
+    
+    # Duplicate Delivery Detection Configuration
+    DEDUP_HORIZON = float(os.getenv('DEDUP_HORIZON', '86400'))
+    DEDUP_MAX_ENTRIES = int(os.getenv('DEDUP_MAX_ENTRIES', '50000'))
+    DEDUP_PERSISTENT = os.getenv('DEDUP_PERSISTENT', 'False').lower() == 'true'
+    
     # AI Script Configuration - Assana Clinic Specific
     BUSINESS_NAME = os.getenv('BUSINESS_NAME', 'Assana Clinic')
     BUSINESS_DESCRIPTION = os.getenv('BUSINESS_DESCRIPTION', 'Leading multi-specialty clinic providing comprehensive healthcare services with state-of-the-art facilities and expert medical professionals')
@@ -53,3 +187,30 @@ class Config:
     # Clinic Mission and Values
     CLINIC_MISSION = os.getenv('CLINIC_MISSION', 'To provide exceptional healthcare services with compassion, innovation, and excellence, ensuring the well-being of our community')
     CLINIC_VALUES = os.getenv('CLINIC_VALUES', 'Patient-Centered Care, Medical Excellence, Innovation, Compassion, Integrity, Community Service')
+
+# Database Configuration
+class DatabaseConfig:
+    # PostgreSQL Configuration
+    DB_HOST = os.getenv('DB_HOST', 'ep-broad-firefly-ad4k1jpt-pooler.c-2.us-east-1.aws.neon.tech')
+    DB_PORT = os.getenv('DB_PORT', '5432')
+    DB_NAME = os.getenv('DB_NAME', 'neondb')
+    DB_USER = os.getenv('DB_USER', 'neondb_owner')
+    DB_PASSWORD = os.getenv('DB_PASSWORD', 'npg_6bemGOwox1uR')
+    
+    # Connection Pool Configuration
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    DB_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_HEALTH_CHECK_INTERVAL', '30'))
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '10'))
+    
+    @classmethod
+    def get_connection_params(cls):
+        """Get connection parameters as dictionary"""
+        return {
+            'host': cls.DB_HOST,
+            'port': cls.DB_PORT,
+            'database': cls.DB_NAME,
+            'user': cls.DB_USER,
+            'password': cls.DB_PASSWORD
+        }
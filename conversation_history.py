@@ -0,0 +1,313 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from database import db_pool
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Turns are stored as (role code, text) pairs
+ROLE_CODES = {"user": "u", "assistant": "a"}
+ROLES = {code: role for role, code in ROLE_CODES.items()}
+
+def estimate_tokens(text):
+    """Approximate prompt tokens for a message: about four characters per token plus per-message overhead"""
+    return len(text or "") // 4 + 4
+
+class Conversation:
+    """Running summary and recent turns of one conversation"""
+
+    __slots__ = ("summary", "turns", "tokens", "last_used")
+
+    def __init__(self, summary=None, turns=None, last_used=None):
+        self.summary = summary
+        self.turns = list(turns or [])
+        self.tokens = sum(estimate_tokens(text) for _, text in self.turns)
+        self.last_used = last_used or time.time()
+
+class ConversationHistory:
+    """
+    Chat engine conversation history keyed by WhatsApp number.
+
+    window() returns the newest turns that fit in a token budget, preceded
+    by a running summary of everything older. Once the stored turns grow
+    past `summarize_tokens`, the oldest ones are folded into that summary
+    by `summarizer(summary, turns)` on a background thread and dropped, so
+    both memory and prompt size stay flat however long a conversation runs.
+    `max_messages` caps the stored turns even if summarizing fails.
+
+    With `persistent` set, each conversation is one row of the
+    conversation_history table (summary plus a compact JSON list of turns),
+    read on every window() so all gunicorn workers see the same history.
+    """
+
+    def __init__(self, pool=None, token_budget=None, summarize_tokens=None, max_messages=None,
+                 ttl=None, max_conversations=None, persistent=None, summarizer=None):
+        self.pool = pool or db_pool
+        self.token_budget = Config.CHAT_HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+        self.summarize_tokens = Config.CHAT_HISTORY_SUMMARIZE_TOKENS if summarize_tokens is None else summarize_tokens
+        self.max_messages = Config.CHAT_HISTORY_MAX_MESSAGES if max_messages is None else max_messages
+        self.ttl = Config.THREAD_CACHE_TTL if ttl is None else ttl
+        self.max_conversations = Config.THREAD_CACHE_MAX_ENTRIES if max_conversations is None else max_conversations
+        self.persistent = Config.CHAT_HISTORY_PERSISTENT if persistent is None else persistent
+        self.summarizer = summarizer
+
+        self._lock = threading.Lock()
+        self._conversations = OrderedDict()  # whatsapp_number -> Conversation
+        self._summarizing = set()  # numbers with a summary in flight
+        self._table_ready = False
+        self._executor = None
+        self._pid = None
+        self._stats = {
+            "windows": 0,
+            "window_tokens_total": 0,
+            "summarizations": 0,
+            "summary_errors": 0,
+            "truncated_turns": 0,
+            "db_errors": 0
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def window(self, whatsapp_number, token_budget=None):
+        """Get chat messages for a prompt: the running summary, then the newest turns that fit the budget"""
+        budget = self.token_budget if token_budget is None else token_budget
+        conversation = self._get(whatsapp_number)
+        if conversation is None:
+            return []
+
+        messages = []
+        used = 0
+        if conversation.summary:
+            summary = f"Summary of the earlier conversation with this patient:\n{conversation.summary}"
+            used = estimate_tokens(summary)
+            messages.append({"role": "system", "content": summary})
+
+        recent = []
+        for code, text in reversed(conversation.turns):
+            cost = estimate_tokens(text)
+            if used + cost > budget:
+                break
+            used += cost
+            recent.append({"role": ROLES[code], "content": text})
+        messages.extend(reversed(recent))
+
+        with self._lock:
+            self._stats["windows"] += 1
+            self._stats["window_tokens_total"] += used
+        return messages
+
+    def append_turn(self, whatsapp_number, user_text, assistant_text):
+        """Record a user message and the reply to it"""
+        conversation = self._get(whatsapp_number) or Conversation()
+        with self._lock:
+            for code, text in (("u", user_text), ("a", assistant_text)):
+                conversation.turns.append((code, text))
+                conversation.tokens += estimate_tokens(text)
+            overflow = len(conversation.turns) - self.max_messages
+            if overflow > 0:
+                for _, text in conversation.turns[:overflow]:
+                    conversation.tokens -= estimate_tokens(text)
+                del conversation.turns[:overflow]
+                self._stats["truncated_turns"] += overflow
+            conversation.last_used = time.time()
+            needs_summary = (
+                self.summarizer is not None
+                and conversation.tokens > self.summarize_tokens
+                and whatsapp_number not in self._summarizing
+            )
+            if needs_summary:
+                self._summarizing.add(whatsapp_number)
+        self._remember(whatsapp_number, conversation)
+
+        if self.persistent:
+            self._save(whatsapp_number, conversation)
+        if needs_summary:
+            self._get_executor().submit(self._summarize, whatsapp_number, conversation)
+
+    def forget(self, whatsapp_number):
+        """Drop a number's history"""
+        with self._lock:
+            self._conversations.pop(whatsapp_number, None)
+        if self.persistent:
+            try:
+                with self.pool.connection() as conn:
+                    self._ensure_table(conn)
+                    cursor = conn.cursor()
+                    cursor.execute("DELETE FROM conversation_history WHERE whatsapp_number = %s", (whatsapp_number,))
+                    conn.commit()
+                    cursor.close()
+            except Exception as e:
+                self._count("db_errors")
+                logger.error(f"Database error forgetting conversation history: {str(e)}")
+
+    def _get(self, whatsapp_number):
+        """Get a live conversation from the database (when persistent) or memory"""
+        if self.persistent:
+            loaded = self._load(whatsapp_number)
+            if loaded is not False:
+                if loaded is not None:
+                    self._remember(whatsapp_number, loaded)
+                return loaded
+
+        with self._lock:
+            conversation = self._conversations.get(whatsapp_number)
+            if conversation is None:
+                return None
+            if time.time() - conversation.last_used >= self.ttl:
+                del self._conversations[whatsapp_number]
+                return None
+            self._conversations.move_to_end(whatsapp_number)
+            return conversation
+
+    def _remember(self, whatsapp_number, conversation):
+        with self._lock:
+            self._conversations[whatsapp_number] = conversation
+            self._conversations.move_to_end(whatsapp_number)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+
+    def _get_executor(self):
+        """Single background thread for summaries, created lazily in each process"""
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _summarize(self, whatsapp_number, conversation):
+        """Fold the turns that no longer fit the window into the running summary"""
+        try:
+            with self._lock:
+                kept_tokens = 0
+                keep = 0
+                for _, text in reversed(conversation.turns):
+                    cost = estimate_tokens(text)
+                    if kept_tokens + cost > self.token_budget:
+                        break
+                    kept_tokens += cost
+                    keep += 1
+                # Summarize whole user/assistant pairs
+                old_turns = conversation.turns[:len(conversation.turns) - keep]
+                if len(old_turns) % 2:
+                    old_turns = old_turns[:-1]
+                summary = conversation.summary
+
+            if not old_turns:
+                return
+
+            new_summary = self.summarizer(summary, [(ROLES[code], text) for code, text in old_turns])
+            if not new_summary:
+                raise ValueError("summarizer returned no text")
+
+            if self.persistent:
+                # Another worker may have added turns since; fold into the latest copy
+                latest = self._load(whatsapp_number)
+                if latest:
+                    conversation = latest
+                    self._remember(whatsapp_number, conversation)
+
+            with self._lock:
+                # Turns are only appended, or truncated from the front, while summarizing
+                for turn in old_turns:
+                    if not conversation.turns or tuple(conversation.turns[0]) != tuple(turn):
+                        break
+                    conversation.tokens -= estimate_tokens(conversation.turns.pop(0)[1])
+                conversation.summary = new_summary
+                self._stats["summarizations"] += 1
+
+            if self.persistent:
+                self._save(whatsapp_number, conversation)
+            logger.info(f"Summarized older turns of the conversation with {whatsapp_number}")
+        except Exception as e:
+            self._count("summary_errors")
+            logger.error(f"Error summarizing conversation history: {str(e)}")
+        finally:
+            with self._lock:
+                self._summarizing.discard(whatsapp_number)
+
+    def _ensure_table(self, conn):
+        """Create the conversation_history table on first use"""
+        if self._table_ready:
+            return
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_history (
+                whatsapp_number TEXT PRIMARY KEY,
+                summary TEXT,
+                turns JSONB NOT NULL DEFAULT '[]',
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+        conn.commit()
+        cursor.close()
+        self._table_ready = True
+
+    def _load(self, whatsapp_number):
+        """Read a live conversation from the database; None if there is none, False on error"""
+        try:
+            with self.pool.connection() as conn:
+                self._ensure_table(conn)
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT summary, turns, EXTRACT(EPOCH FROM updated_at)
+                    FROM conversation_history
+                    WHERE whatsapp_number = %s
+                    AND updated_at > NOW() - make_interval(secs => %s)
+                """, (whatsapp_number, self.ttl))
+                row = cursor.fetchone()
+                cursor.close()
+        except Exception as e:
+            self._count("db_errors")
+            logger.error(f"Database error loading conversation history: {str(e)}")
+            return False
+
+        if row is None:
+            return None
+        turns = row[1] if isinstance(row[1], list) else json.loads(row[1])
+        return Conversation(row[0], [tuple(turn) for turn in turns], float(row[2]))
+
+    def _save(self, whatsapp_number, conversation):
+        """Upsert a conversation's summary and turns"""
+        with self._lock:
+            summary = conversation.summary
+            turns = json.dumps(conversation.turns, ensure_ascii=False, separators=(",", ":"))
+        try:
+            with self.pool.connection() as conn:
+                self._ensure_table(conn)
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO conversation_history (whatsapp_number, summary, turns, updated_at)
+                    VALUES (%s, %s, %s::jsonb, NOW())
+                    ON CONFLICT (whatsapp_number)
+                    DO UPDATE SET summary = EXCLUDED.summary, turns = EXCLUDED.turns, updated_at = EXCLUDED.updated_at
+                """, (whatsapp_number, summary, turns))
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            self._count("db_errors")
+            logger.error(f"Database error saving conversation history: {str(e)}")
+            return False
+
+    def stats(self):
+        """Get history sizes and window/summary counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["conversations"] = len(self._conversations)
+            stats["stored_turns"] = sum(len(c.turns) for c in self._conversations.values())
+            stats["stored_tokens"] = sum(c.tokens for c in self._conversations.values())
+            stats["summaries"] = sum(1 for c in self._conversations.values() if c.summary)
+        stats["avg_window_tokens"] = round(stats["window_tokens_total"] / stats["windows"], 1) if stats["windows"] else 0.0
+        stats["token_budget"] = self.token_budget
+        stats["persistent"] = self.persistent
+        return stats
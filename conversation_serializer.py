@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import threading
+import time
+from metrics import span
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class _Conversation:
+    """Messages waiting for one sender and the timing of the current burst"""
+
+    def __init__(self, now):
+        self.pending = []
+        self.first_arrival = now
+        self.last_arrival = now
+
+class ConversationSerializer:
+    """
+    Runs at most one handler call at a time per conversation key.
+
+    The first message for an idle conversation makes the calling thread the
+    conversation's leader. The leader waits until no new message has arrived
+    for the debounce window (capped at max_wait), so a burst of messages
+    becomes one turn, hands everything collected so far to the handler as
+    one batch, and repeats until nothing is pending. Messages submitted
+    while a leader is active are simply queued for it, so the submitting
+    thread returns immediately.
+
+    The leader waits on its own thread (a job queue worker), which is also
+    the thread that runs the turn, so the debounce adds to a worker's busy
+    time rather than taking one of its own.
+    """
+
+    def __init__(self, handler, debounce=1.0, max_wait=5.0, max_batch=10):
+        self.handler = handler
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.max_batch = max(1, max_batch)
+
+        self._lock = threading.Lock()
+        self._conversations = {}
+        self._stats = {
+            "messages": 0,
+            "turns": 0,
+            "coalesced": 0,
+            "largest_batch": 0,
+            "failed_turns": 0
+        }
+
+    def submit(self, key, item):
+        """
+        Add a message to a conversation.
+
+        Returns True if the calling thread processed the conversation itself,
+        False if the message was handed to an already active leader.
+        """
+        return self.submit_many(key, [item])
+
+    def submit_many(self, key, items):
+        """
+        Add messages that arrived together (e.g. in one webhook delivery) to
+        a conversation, so they can share a turn. Returns like submit().
+        """
+        conversation = self._enqueue(key, items)
+        if conversation is None:
+            return False
+        self._lead(key, conversation)
+        return True
+
+    def _enqueue(self, key, items):
+        """Queue items; returns the conversation if the caller must lead it, else None"""
+        now = time.monotonic()
+        with self._lock:
+            self._stats["messages"] += len(items)
+            conversation = self._conversations.get(key)
+            if conversation is not None:
+                conversation.pending.extend(items)
+                conversation.last_arrival = now
+                return None
+            conversation = _Conversation(now)
+            conversation.pending.extend(items)
+            self._conversations[key] = conversation
+        return conversation
+
+    def _quiet_remaining(self, conversation):
+        """Seconds until the burst has been quiet for the debounce window or max_wait has passed"""
+        with self._lock:
+            wake_at = min(
+                conversation.last_arrival + self.debounce,
+                conversation.first_arrival + self.max_wait
+            )
+        return wake_at - time.monotonic()
+
+    def _next_batch(self, conversation):
+        """Take the next turn's messages off the conversation"""
+        with self._lock:
+            batch = conversation.pending[:self.max_batch]
+            del conversation.pending[:self.max_batch]
+            self._stats["turns"] += 1
+            self._stats["coalesced"] += len(batch) - 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        return batch
+
+    def _turn_failed(self, error):
+        logger.error(f"Error handling conversation turn: {str(error)}")
+        with self._lock:
+            self._stats["failed_turns"] += 1
+
+    def _finish_turn(self, key, conversation):
+        """Returns True once nothing is pending and the conversation has been released"""
+        with self._lock:
+            if not conversation.pending:
+                del self._conversations[key]
+                return True
+            # Messages that arrived during the run form the next burst
+            conversation.first_arrival = time.monotonic()
+        return False
+
+    def _lead(self, key, conversation):
+        """Process batches for a conversation until nothing is pending"""
+        while True:
+            with span("conversation.debounce"):
+                remaining = self._quiet_remaining(conversation)
+                while remaining > 0:
+                    time.sleep(remaining)
+                    remaining = self._quiet_remaining(conversation)
+
+            try:
+                self.handler(key, self._next_batch(conversation))
+            except Exception as e:
+                self._turn_failed(e)
+
+            if self._finish_turn(key, conversation):
+                return
+
+    def stats(self):
+        """Get turn and coalescing counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active_conversations"] = len(self._conversations)
+            stats["pending_messages"] = sum(len(c.pending) for c in self._conversations.values())
+        return stats
+
+class AsyncConversationSerializer(ConversationSerializer):
+    """
+    ConversationSerializer for the asyncio entry point.
+
+    The same turn and batching rules, but the leader is a task on the
+    event loop and the handler is a coroutine function, so a waiting
+    conversation costs no thread. All calls must come from one event loop.
+    """
+
+    async def submit(self, key, item):
+        """
+        Add a message to a conversation.
+
+        Returns True if this call processed the conversation itself, False
+        if the message was handed to an already active leader.
+        """
+        return await self.submit_many(key, [item])
+
+    async def submit_many(self, key, items):
+        """Add messages that arrived together to a conversation; returns like submit()"""
+        conversation = self._enqueue(key, items)
+        if conversation is None:
+            return False
+        await self._lead(key, conversation)
+        return True
+
+    async def _lead(self, key, conversation):
+        """Process batches for a conversation until nothing is pending"""
+        while True:
+            with span("conversation.debounce"):
+                remaining = self._quiet_remaining(conversation)
+                while remaining > 0:
+                    await asyncio.sleep(remaining)
+                    remaining = self._quiet_remaining(conversation)
+
+            try:
+                await self.handler(key, self._next_batch(conversation))
+            except Exception as e:
+                self._turn_failed(e)
+
+            if self._finish_turn(key, conversation):
+                return
@@ -0,0 +1,224 @@
+import psycopg2
+import psycopg2.extensions
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from config import DatabaseConfig
+from metrics import observe, span
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PoolTimeoutError(Exception):
+    """Raised when no database connection becomes available in time"""
+    pass
+
+class DatabasePool:
+    """
+    Thread-safe PostgreSQL connection pool shared by all data-access functions.
+
+    Connections are health-checked on checkout when they have been idle for
+    longer than the health check interval, and connections broken by a
+    server-side disconnect are discarded and replaced transparently.
+    """
+
+    def __init__(self, min_size=None, max_size=None, timeout=None, health_check_interval=None):
+        self.min_size = DatabaseConfig.DB_POOL_MIN_SIZE if min_size is None else min_size
+        self.max_size = DatabaseConfig.DB_POOL_MAX_SIZE if max_size is None else max_size
+        self.timeout = DatabaseConfig.DB_POOL_TIMEOUT if timeout is None else timeout
+        self.health_check_interval = DatabaseConfig.DB_HEALTH_CHECK_INTERVAL if health_check_interval is None else health_check_interval
+
+        if self.max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.min_size = max(0, min(self.min_size, self.max_size))
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._idle = deque()  # (connection, last_used) pairs, most recently used last
+        self._open_count = 0
+        self._in_use = 0
+        self._warmed = False
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+            "reconnects": 0,
+            "wait_time_total": 0.0
+        }
+
+    def _connect(self):
+        """Open a new connection to the database"""
+        params = DatabaseConfig.get_connection_params()
+        with span("db.connect"):
+            conn = psycopg2.connect(connect_timeout=DatabaseConfig.DB_CONNECT_TIMEOUT, **params)
+        with self._lock:
+            self._open_count += 1
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _close(self, conn):
+        """Close a connection and drop it from the pool accounting"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open_count -= 1
+            self._stats["connections_closed"] += 1
+
+    def _is_healthy(self, conn, last_used):
+        """Check that an idle connection is still usable"""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Pooled database connection failed health check: {str(e)}")
+            return False
+
+    def _warm(self):
+        """Open the minimum number of connections on first use"""
+        with self._lock:
+            if self._warmed:
+                return
+            self._warmed = True
+            missing = self.min_size - self._open_count
+        for _ in range(missing):
+            try:
+                conn = self._connect()
+            except psycopg2.Error as e:
+                logger.warning(f"Could not pre-open database connection: {str(e)}")
+                return
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+
+    def _checkout(self):
+        """Take a healthy connection from the idle set or open a new one"""
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                return self._connect()
+            conn, last_used = item
+            if self._is_healthy(conn, last_used):
+                return conn
+            with self._lock:
+                self._stats["health_check_failures"] += 1
+                self._stats["reconnects"] += 1
+            self._close(conn)
+
+    def _checkin(self, conn, discard=False):
+        """Return a connection to the idle set, resetting any open transaction"""
+        if discard or conn.closed:
+            self._close(conn)
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._close(conn)
+            return
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a pooled connection for the duration of a with-block.
+
+        Callers commit their own writes; anything left uncommitted is rolled
+        back before the connection is handed to the next caller.
+        """
+        self._warm()
+
+        wait_start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            observe("db.pool_wait", time.monotonic() - wait_start, error=True)
+            raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+
+        conn = None
+        broken = False
+        try:
+            conn = self._checkout()
+            checked_out = time.monotonic()
+            with self._lock:
+                self._in_use += 1
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total"] += checked_out - wait_start
+            observe("db.pool_wait", checked_out - wait_start)
+            # Time the connection is held: the caller's queries and commit
+            with span("db.query"):
+                yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # The server dropped the connection; make sure it is replaced
+            broken = True
+            if conn is not None:
+                with self._lock:
+                    self._stats["reconnects"] += 1
+            raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._in_use -= 1
+                self._checkin(conn, discard=broken)
+            self._slots.release()
+
+    @contextmanager
+    def dedicated_connection(self):
+        """
+        Open a connection outside the pool for the duration of a with-block.
+
+        For sessions held for a long time, such as one owning an advisory
+        lock, so they do not take a slot from request handlers.
+        """
+        params = DatabaseConfig.get_connection_params()
+        with span("db.connect"):
+            conn = psycopg2.connect(connect_timeout=DatabaseConfig.DB_CONNECT_TIMEOUT, **params)
+        try:
+            yield conn
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """Get a snapshot of pool usage counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "open": self._open_count,
+                "in_use": self._in_use,
+                "idle": len(self._idle)
+            })
+        checkouts = stats["checkouts"]
+        stats["avg_wait_ms"] = round(stats["wait_time_total"] * 1000 / checkouts, 3) if checkouts else 0.0
+        stats["wait_time_total"] = round(stats["wait_time_total"], 6)
+        return stats
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._warmed = False
+        for conn, _ in idle:
+            self._close(conn)
+
+# Shared pool used by the Flask app and the Assistant tool functions
+db_pool = DatabasePool()
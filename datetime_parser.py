@@ -0,0 +1,322 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, time as dt_time
+from zoneinfo import ZoneInfo
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3,
+    "april": 4, "apr": 4, "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7,
+    "august": 8, "aug": 8, "september": 9, "sept": 9, "sep": 9,
+    "october": 10, "oct": 10, "november": 11, "nov": 11, "december": 12, "dec": 12
+}
+
+WEEKDAYS = {
+    "monday": 0, "mon": 0, "tuesday": 1, "tues": 1, "tue": 1,
+    "wednesday": 2, "wed": 2, "thursday": 3, "thurs": 3, "thur": 3, "thu": 3,
+    "friday": 4, "fri": 4, "saturday": 5, "sat": 5, "sunday": 6, "sun": 6
+}
+
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7}
+
+# Words that may surround a date and time without changing their meaning
+FILLER_WORDS = {"at", "on", "for", "the", "of", "around", "about", "by", "please", "o'clock"}
+
+def _alternation(words):
+    return "|".join(sorted(words, key=len, reverse=True))
+
+_MONTH = _alternation(MONTHS)
+_WEEKDAY = _alternation(WEEKDAYS)
+
+TIME_12H = re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*([ap])\.?\s?m\b\.?")
+TIME_24H = re.compile(r"\b(\d{1,2}):(\d{2})(?::(\d{2}))?\b")
+TIME_WORDS = re.compile(r"\b(noon|midday|midnight)\b")
+
+ISO_DATE = re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b")
+NUMERIC_DATE = re.compile(r"\b(\d{1,2})[-/.](\d{1,2})(?:[-/.](\d{4}|\d{2}))?\b")
+DAY_MONTH = re.compile(rf"\b(\d{{1,2}})\s+(?:of\s+)?({_MONTH})\.?(?:\s+(\d{{4}}))?\b")
+MONTH_DAY = re.compile(rf"\b({_MONTH})\.?\s+(\d{{1,2}})(?:\s+(\d{{4}}))?\b")
+DAY_AFTER_TOMORROW = re.compile(r"\bday after (?:tomorrow|tmrw|tmr)\b")
+RELATIVE_DAY = re.compile(r"\b(today|tonight|tomorrow|tmrw|tmr)\b")
+IN_DAYS = re.compile(rf"\bin\s+(\d{{1,2}}|{_alternation(NUMBER_WORDS)})\s+(days?|weeks?)\b")
+WEEKDAY = re.compile(rf"\b(?:(this|next|coming)\s+)?({_WEEKDAY})\b")
+
+# The answer expected from the LLM fallback
+LLM_DATETIME = re.compile(r"VALID_DATETIME:\s*(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+
+class DateTimeParser:
+    """
+    Parses the date/time phrases patients send ("tomorrow at 2pm",
+    "next Friday 10:30", "24/08/2025 14:00", "Aug 24 at 3 PM") into the
+    'YYYY-MM-DD HH:MM:SS' wall-clock time stored in booking_time.
+
+    Relative phrases are resolved against the current time in the clinic's
+    timezone. Numeric dates like 04/08 are read in CLINIC_DATE_ORDER unless
+    one of the numbers can only be a day. Phrases that are not fully
+    understood return None so the caller can fall back to the LLM.
+
+    Results are kept in an LRU keyed by the normalized text and the clinic's
+    current date, so relative phrases are re-resolved each day. resolve()
+    also asks `fallback` (a callable taking a prompt and returning the
+    model's reply, set by OpenAIService) about phrases parse() rejects.
+    """
+
+    def __init__(self, timezone=None, date_order=None, cache_size=None):
+        timezone = Config.CLINIC_TIMEZONE if timezone is None else timezone
+        self.tz = ZoneInfo(timezone) if timezone else None
+        self.date_order = (date_order or Config.CLINIC_DATE_ORDER).upper()
+        self.cache_size = Config.DATETIME_PARSE_CACHE_SIZE if cache_size is None else cache_size
+        self.fallback = None
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # (normalized text, clinic date) -> 'YYYY-MM-DD HH:MM:SS' or None
+        self._stats = {
+            "lookups": 0,
+            "cache_hits": 0,
+            "parsed": 0,
+            "unparsed": 0,
+            "fallback_results": 0
+        }
+
+    def now(self):
+        """Current wall-clock time at the clinic (naive, like booking_time)"""
+        if self.tz is None:
+            return datetime.now()
+        return datetime.now(self.tz).replace(tzinfo=None)
+
+    def parse(self, text, now=None):
+        """Parse a date/time phrase into 'YYYY-MM-DD HH:MM:SS', or None if it is not understood"""
+        if not text or not text.strip():
+            return None
+        now = now or self.now()
+        normalized = self._normalize(text)
+        key = (normalized, now.date())
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return self._cache[key]
+
+        result, time_sensitive = self._parse(normalized, now)
+
+        with self._lock:
+            self._stats["parsed" if result else "unparsed"] += 1
+        # Results that depended on the time of day (e.g. "at 3pm" after 3pm) are not reused
+        if not time_sensitive:
+            self._store(key, result)
+        return result
+
+    def resolve(self, text, now=None):
+        """
+        Parse a phrase, asking the LLM fallback only when the local parser
+        does not understand it. Returns (datetime_str, None), or
+        (None, error message or None) if neither could parse it.
+        """
+        now = now or self.now()
+        result = self.parse(text, now)
+        if result or self.fallback is None or not text or not text.strip():
+            return result, None
+
+        logger.info("Local date/time parsing failed, asking the LLM")
+        response = self.fallback(datetime_fallback_prompt(text, now)) or ""
+        match = LLM_DATETIME.search(response)
+        if not match:
+            error = response.split("INVALID_DATETIME:")[1].strip() if "INVALID_DATETIME:" in response else None
+            return None, error
+        # Not cached: phrases the parser cannot read are often relative to the
+        # time of day ("in 2 hours", "tonight at 8"), and the answer goes stale
+        with self._lock:
+            self._stats["fallback_results"] += 1
+        return match.group(1), None
+
+    def _store(self, key, result):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self):
+        """Get cache and parse counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cache_size"] = len(self._cache)
+        stats["cache_hit_rate"] = round(stats["cache_hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        return stats
+
+    @staticmethod
+    def _normalize(text):
+        text = text.strip().lower()
+        text = re.sub(r"(\d{4}-\d{1,2}-\d{1,2})t(?=\d)", r"\1 ", text)
+        text = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", text)
+        text = text.replace(",", " ")
+        return re.sub(r"\s+", " ", text).strip()
+
+    def _parse(self, text, now):
+        """Returns (result, time_sensitive)"""
+        parsed_time, text = self._extract_time(text)
+        if parsed_time is None:
+            return None, False
+
+        date_match = self._extract_date(text, now, parsed_time)
+        if date_match is None:
+            # A bare time means the next time the clock shows it
+            if text.strip() and not self._only_filler(text):
+                return None, False
+            candidate = datetime.combine(now.date(), parsed_time)
+            if candidate <= now:
+                candidate += timedelta(days=1)
+            return candidate.strftime("%Y-%m-%d %H:%M:%S"), True
+
+        parsed_date, text, time_sensitive = date_match
+        if parsed_date is None or not self._only_filler(text):
+            return None, False
+        return datetime.combine(parsed_date, parsed_time).strftime("%Y-%m-%d %H:%M:%S"), time_sensitive
+
+    @staticmethod
+    def _only_filler(text):
+        return all(word in FILLER_WORDS for word in text.split())
+
+    @staticmethod
+    def _remove(text, match):
+        return f"{text[:match.start()]} {text[match.end():]}"
+
+    def _extract_time(self, text):
+        """Find exactly one time of day; returns (time, remaining text)"""
+        found = []
+        for pattern in (TIME_12H, TIME_24H, TIME_WORDS):
+            for match in pattern.finditer(text):
+                found.append((pattern, match))
+            if found:
+                break
+        if len(found) != 1:
+            return None, text
+
+        pattern, match = found[0]
+        try:
+            if pattern is TIME_12H:
+                hour, minute = int(match.group(1)), int(match.group(2) or 0)
+                if not 1 <= hour <= 12:
+                    return None, text
+                hour = hour % 12 + (12 if match.group(3) == "p" else 0)
+                parsed = dt_time(hour, minute)
+            elif pattern is TIME_24H:
+                parsed = dt_time(int(match.group(1)), int(match.group(2)), int(match.group(3) or 0))
+            else:
+                parsed = dt_time(0, 0) if match.group(1) == "midnight" else dt_time(12, 0)
+        except ValueError:
+            return None, text
+        return parsed, self._remove(text, match)
+
+    def _extract_date(self, text, now, parsed_time):
+        """
+        Find a date expression; returns None if there is none, otherwise
+        (date or None if invalid, remaining text, time_sensitive).
+        """
+        today = now.date()
+
+        match = ISO_DATE.search(text)
+        if match:
+            return self._safe_date(int(match.group(1)), int(match.group(2)), int(match.group(3))), self._remove(text, match), False
+
+        match = NUMERIC_DATE.search(text)
+        if match:
+            first, second = int(match.group(1)), int(match.group(2))
+            if first > 12 or (second <= 12 and self.date_order == "DMY"):
+                day, month = first, second
+            else:
+                month, day = first, second
+            return self._with_year(match.group(3), month, day, today), self._remove(text, match), False
+
+        for pattern, day_group, month_group in ((DAY_MONTH, 1, 2), (MONTH_DAY, 2, 1)):
+            match = pattern.search(text)
+            if match:
+                month, day = MONTHS[match.group(month_group)], int(match.group(day_group))
+                return self._with_year(match.group(3), month, day, today), self._remove(text, match), False
+
+        match = DAY_AFTER_TOMORROW.search(text)
+        if match:
+            return today + timedelta(days=2), self._remove(text, match), False
+
+        match = RELATIVE_DAY.search(text)
+        if match:
+            offset = 1 if match.group(1) in ("tomorrow", "tmrw", "tmr") else 0
+            return today + timedelta(days=offset), self._remove(text, match), False
+
+        match = IN_DAYS.search(text)
+        if match:
+            count = match.group(1)
+            count = int(count) if count.isdigit() else NUMBER_WORDS[count]
+            days = count * 7 if match.group(2).startswith("week") else count
+            return today + timedelta(days=days), self._remove(text, match), False
+
+        match = WEEKDAY.search(text)
+        if match:
+            weekday = WEEKDAYS[match.group(2)]
+            days = (weekday - today.weekday()) % 7
+            time_sensitive = False
+            if match.group(1) == "next" and weekday > today.weekday():
+                # "next friday" said on a Monday is the Friday of next week; "this"/"coming" friday is this one
+                days += 7
+            if days == 0:
+                if match.group(1) == "next" or parsed_time <= now.time():
+                    days = 7
+                # Whether "monday" means today depends on the time it is asked
+                time_sensitive = match.group(1) != "next"
+            return today + timedelta(days=days), self._remove(text, match), time_sensitive
+
+        return None
+
+    @staticmethod
+    def _safe_date(year, month, day):
+        try:
+            return datetime(year, month, day).date()
+        except ValueError:
+            return None
+
+    def _with_year(self, year, month, day, today):
+        """Use the given year, or the next occurrence of month/day if none was given"""
+        if year:
+            year = int(year)
+            return self._safe_date(year + 2000 if year < 100 else year, month, day)
+        candidate = self._safe_date(today.year, month, day)
+        if candidate is not None and candidate < today:
+            candidate = self._safe_date(today.year + 1, month, day)
+        return candidate
+
+def datetime_fallback_prompt(new_datetime_str, now):
+    """Prompt asking the LLM to parse a phrase DateTimeParser could not handle"""
+    return f"""
+            You are a helpful medical appointment assistant at Assana Clinic. Parse this date/time string into a proper datetime format for appointment scheduling.
+
+            Current date and time at the clinic: {now:%A, %B %d, %Y %H:%M}
+            User input: "{new_datetime_str}"
+
+            Your task is to:
+            1. Extract the date and time from the input
+            2. Convert it to ISO format: YYYY-MM-DD HH:MM:SS
+            3. If you can parse it, respond with "VALID_DATETIME: YYYY-MM-DD HH:MM:SS"
+            4. If you cannot parse it, respond with "INVALID_DATETIME: Please provide date and time in format 'Month Day, Year at Hour:Minute AM/PM' for your Assana Clinic appointment"
+
+            Examples:
+            - "August 20, 2025 at 3:00 PM" → "VALID_DATETIME: 2025-08-20 15:00:00"
+            - "August 24, 2025 at 2:00 PM" → "VALID_DATETIME: 2025-08-24 14:00:00"
+            - "tomorrow at 2pm" → "VALID_DATETIME: [calculated date] 14:00:00"
+
+            IMPORTANT: Respond with EXACTLY "VALID_DATETIME: [iso_format]" or "INVALID_DATETIME: [message]" - no other text.
+
+            Respond with either "VALID_DATETIME: [iso_format]" or "INVALID_DATETIME: [message]"
+            """
+
+# Shared parser used by the appointment update functions
+datetime_parser = DateTimeParser()
@@ -0,0 +1,255 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Words that carry no intent in a short question ("hi, what are your hours please?")
+STOP_WORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "do", "does", "can", "could", "would", "will",
+    "i", "we", "you", "your", "yours", "u", "ur", "me", "us", "it", "there", "this", "that",
+    "what", "whats", "which", "tell", "know", "let", "please", "pls", "plz", "kindly",
+    "hi", "hello", "hey", "thanks", "thank", "ok", "okay", "sir", "madam", "dear",
+    "to", "of", "for", "in", "on", "at", "about", "and", "or", "with", "any", "some", "have", "has",
+    "clinic", "hospital", Config.BUSINESS_NAME.split()[0].lower()
+}
+
+# Spellings and synonyms folded onto one word before matching. Everyday words
+# like "time", "call", "number" and "pay" are left alone: folded, they turn
+# "what time is my appointment" or "can you call me" into an FAQ match
+SYNONYMS = {
+    "timing": "hours", "timings": "hours", "hour": "hours",
+    "schedule": "hours", "opening": "open", "opens": "open", "close": "open", "closing": "open", "closes": "open",
+    "located": "location", "locate": "location", "where": "location", "directions": "location",
+    "adress": "address", "addr": "address", "map": "location",
+    "insurances": "insurance", "insurer": "insurance", "cashless": "insurance", "tpa": "insurance",
+    "payments": "payment",
+    "department": "departments", "dept": "departments", "depts": "departments",
+    "specialities": "specialties", "speciality": "specialties", "specialty": "specialties",
+    "service": "services", "treatments": "services", "treatment": "services",
+    "phone": "contact", "email": "contact", "mail": "contact",
+    "24x7": "24/7", "24hrs": "24/7", "emergencies": "emergency", "casualty": "emergency", "er": "emergency"
+}
+
+# Questions about the patient's own booking always go to the assistant
+PERSONAL_WORDS = {
+    "my", "mine", "appointment", "appointments", "booking", "book", "booked", "reschedule",
+    "cancel", "change", "update", "move", "doctor", "dr", "report", "reports", "result", "results"
+}
+
+# Emergencies and symptoms always go to the assistant, never to a canned reply
+URGENT_WORDS = {
+    "emergency", "urgent", "ambulance", "accident", "injury", "injured", "hurt", "hurts", "pain", "painful",
+    "bleeding", "bleed", "blood", "chest", "heart", "breathing", "breathe", "breath", "fever", "vomiting",
+    "dizzy", "fainted", "unconscious", "seizure", "stroke", "fracture", "burn", "burns", "poison", "poisoning",
+    "swelling", "sick"
+}
+
+# Openers that make a message a question even without a question mark
+QUESTION_WORDS = {
+    "what", "whats", "when", "where", "which", "who", "how", "do", "does", "is", "are", "can", "could", "will"
+}
+
+def _intents():
+    """FAQ intents: example questions and the reply built from the current Config"""
+    return {
+        "opd_hours": (
+            ["opd hours", "when open", "open hours", "hours", "open today", "open sunday", "open saturday", "hours open", "hours open sunday", "open 24/7"],
+            f"Our OPD hours are:\n{Config.OPD_HOURS}\n\nEmergency: {Config.EMERGENCY_HOURS}"
+        ),
+        "address": (
+            ["address", "location", "how reach", "how get there", "location address"],
+            f"{Config.BUSINESS_NAME} is at {Config.CLINIC_ADDRESS}.\nPhone: {Config.CLINIC_PHONE}"
+        ),
+        "contact": (
+            ["contact", "contact details", "how contact", "website", "contact website"],
+            f"You can reach {Config.BUSINESS_NAME} at:\nPhone: {Config.CLINIC_PHONE}\nEmail: {Config.CLINIC_EMAIL}\nWebsite: {Config.CLINIC_WEBSITE}"
+        ),
+        "insurance": (
+            ["insurance", "accept insurance", "insurance accepted", "payment options", "insurance payment", "take insurance"],
+            Config.INSURANCE_INFO
+        ),
+        "services": (
+            ["services", "departments", "specialties", "services offer", "departments available", "services available", "offer"],
+            f"{Config.BUSINESS_NAME} offers: {Config.KEY_SERVICES}.\n\nFacilities: {Config.SPECIAL_FEATURES}"
+        )
+    }
+
+def _config_fingerprint():
+    """The Config values the answers are built from"""
+    return (
+        Config.BUSINESS_NAME, Config.OPD_HOURS, Config.EMERGENCY_HOURS, Config.CLINIC_ADDRESS,
+        Config.CLINIC_PHONE, Config.CLINIC_EMAIL, Config.CLINIC_WEBSITE, Config.INSURANCE_INFO,
+        Config.KEY_SERVICES, Config.SPECIAL_FEATURES
+    )
+
+def normalize(text):
+    """Lowercase, drop punctuation and stop words, and fold synonyms; returns a tuple of words"""
+    text = re.sub(r"[^\w/\s]", " ", text.lower())
+    words = []
+    for word in text.split():
+        word = SYNONYMS.get(word, word)
+        if word not in STOP_WORDS:
+            words.append(word)
+    return tuple(words)
+
+def is_question(message):
+    """True if the message ends with a question mark or opens with a question word"""
+    text = message.strip().lower()
+    if text.endswith("?"):
+        return True
+    first = re.sub(r"[^\w]", "", text.split()[0]) if text.split() else ""
+    return first in QUESTION_WORDS
+
+def topic_words(message):
+    """Words of a message that name what it is about: neither stop words nor question openers"""
+    text = re.sub(r"[^\w/\s]", " ", message.lower())
+    return [word for word in text.split() if word not in STOP_WORDS and word not in QUESTION_WORDS]
+
+def similarity(words, example):
+    """Score two normalized questions: the better of word-set overlap and character similarity"""
+    if not words or not example:
+        return 0.0
+    a, b = set(words), set(example)
+    jaccard = len(a & b) / len(a | b)
+    ratio = SequenceMatcher(None, " ".join(words), " ".join(example)).ratio()
+    return max(jaccard, ratio)
+
+class FaqCache:
+    """
+    Answers common clinic questions (hours, address, contact, insurance,
+    services) from Config without an Assistant run.
+
+    A message is normalized (case, punctuation, stop words, synonyms) and
+    scored against each intent's example questions; only short messages
+    scoring at least `threshold`, and not about the patient's own booking
+    or an emergency or symptom, are answered. A message with fewer than
+    `min_words` content words must be a question naming its topic and
+    match an example exactly, so "hours?" is answered but a bare "where"
+    or "address" sent mid-conversation goes to the assistant. Normalized
+    messages are remembered in an LRU so repeats skip the scoring. Replies are rebuilt, and the LRU cleared, whenever
+    the Config values they quote change.
+    """
+
+    def __init__(self, enabled=None, threshold=None, max_words=None, min_words=None, cache_size=None):
+        self.enabled = Config.FAQ_CACHE_ENABLED if enabled is None else enabled
+        self.threshold = Config.FAQ_MATCH_THRESHOLD if threshold is None else threshold
+        self.max_words = Config.FAQ_MAX_WORDS if max_words is None else max_words
+        self.min_words = Config.FAQ_MIN_WORDS if min_words is None else min_words
+        self.cache_size = Config.FAQ_CACHE_SIZE if cache_size is None else cache_size
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # normalized words -> intent name, or None for no match
+        self._fingerprint = None
+        self._intents = {}
+        self._examples = []  # (intent name, normalized example)
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "skipped": 0,
+            "cache_hits": 0,
+            "invalidations": 0,
+            "saved_seconds": 0.0
+        }
+        self._intent_hits = {}
+        self._response_seconds = 0.0
+        self._responses = 0
+
+    def _refresh(self):
+        """Rebuild replies and drop remembered matches if the clinic details changed"""
+        fingerprint = _config_fingerprint()
+        if fingerprint == self._fingerprint:
+            return
+        intents = _intents()
+        examples = [(name, normalize(example)) for name, (phrases, _) in intents.items() for example in phrases]
+        with self._lock:
+            if self._fingerprint is not None:
+                self._stats["invalidations"] += 1
+                logger.info("Clinic details changed; FAQ answers rebuilt")
+            self._intents = {name: reply for name, (_, reply) in intents.items()}
+            self._examples = examples
+            self._cache.clear()
+            self._fingerprint = fingerprint
+
+    def match(self, message):
+        """Get (intent name, score) for a message, or (None, best score) below the threshold"""
+        words = normalize(message)
+        if not words or len(message.split()) > self.max_words:
+            return None, 0.0
+        if PERSONAL_WORDS.intersection(words) or URGENT_WORDS.intersection(words):
+            return None, 0.0
+        # One content word leaves no room for a near miss
+        threshold = self.threshold if len(words) >= self.min_words else 1.0
+        best_intent, best_score = None, 0.0
+        for name, example in self._examples:
+            score = similarity(words, example)
+            if score > best_score:
+                best_intent, best_score = name, score
+        if best_score < threshold:
+            return None, best_score
+        return best_intent, best_score
+
+    def answer(self, message):
+        """Get a ready reply for an FAQ message, or None if it should go to the assistant"""
+        if not self.enabled or not message:
+            return None
+        self._refresh()
+
+        short = len(normalize(message)) < self.min_words
+        if len(message.split()) > self.max_words or (short and not (is_question(message) and topic_words(message))):
+            with self._lock:
+                self._stats["lookups"] += 1
+                self._stats["skipped"] += 1
+            return None
+
+        key = normalize(message)
+        with self._lock:
+            self._stats["lookups"] += 1
+            cached = key in self._cache
+            if cached:
+                intent = self._cache[key]
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+
+        if not cached:
+            intent, _ = self.match(message)
+            with self._lock:
+                self._cache[key] = intent
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            if intent is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._intent_hits[intent] = self._intent_hits.get(intent, 0) + 1
+            if self._responses:
+                self._stats["saved_seconds"] += self._response_seconds / self._responses
+            return self._intents[intent]
+
+    def observe_response(self, seconds):
+        """Record how long a generated (non-FAQ) reply took, to estimate the time hits save"""
+        with self._lock:
+            self._response_seconds += seconds
+            self._responses += 1
+
+    def stats(self):
+        """Get hit/miss counters, per-intent hits and estimated latency saved"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["intent_hits"] = dict(self._intent_hits)
+            stats["cache_size"] = len(self._cache)
+            stats["avg_response_seconds"] = round(self._response_seconds / self._responses, 3) if self._responses else None
+        stats["saved_seconds"] = round(stats["saved_seconds"], 2)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats["enabled"] = self.enabled
+        return stats
+
+faq_cache = FaqCache()
@@ -0,0 +1,170 @@
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from metrics import observe
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """
+    Bounded in-process job queue drained by a pool of worker threads.
+
+    Workers are started lazily on the first submit so that each gunicorn
+    worker process gets its own threads after forking.
+    """
+
+    def __init__(self, handler, workers=4, max_size=100, enqueue_timeout=0.5, name="jobs"):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.handler = handler
+        self.workers = workers
+        self.max_size = max_size
+        self.enqueue_timeout = enqueue_timeout
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._accepting = True
+        self._busy = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "high_water_mark": 0,
+            "queue_wait_total": 0.0,
+            "processing_time_total": 0.0
+        }
+
+    def _ensure_started(self):
+        """Start the worker threads in the current process if needed"""
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    name=f"{self.name}-worker-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Started {self.workers} '{self.name}' workers")
+
+    def _worker(self):
+        """Take jobs off the queue until a stop sentinel is received"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            job, enqueued_at, context = item
+            started_at = time.monotonic()
+            with self._lock:
+                self._busy += 1
+                self._stats["queue_wait_total"] += started_at - enqueued_at
+
+            try:
+                # The submitter's context carries its trace into the worker
+                context.run(observe, f"{self.name}.queue_wait", started_at - enqueued_at)
+                context.run(self.handler, job)
+                outcome = "completed"
+            except Exception as e:
+                logger.error(f"Error in '{self.name}' job: {str(e)}")
+                outcome = "failed"
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._stats[outcome] += 1
+                    self._stats["processing_time_total"] += time.monotonic() - started_at
+                self._queue.task_done()
+
+    def submit(self, job):
+        """
+        Queue a job for the worker pool.
+
+        Returns False when the queue stays full for longer than the enqueue
+        timeout (or the queue is shutting down) so the caller can apply its
+        own backpressure policy.
+        """
+        if not self._accepting:
+            with self._lock:
+                self._stats["rejected"] += 1
+            return False
+
+        self._ensure_started()
+
+        try:
+            self._queue.put((job, time.monotonic(), contextvars.copy_context()), timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.warning(f"'{self.name}' queue is full ({self.max_size} jobs)")
+            return False
+
+        with self._lock:
+            self._stats["submitted"] += 1
+            depth = self._queue.qsize()
+            if depth > self._stats["high_water_mark"]:
+                self._stats["high_water_mark"] = depth
+        return True
+
+    def stats(self):
+        """Get a snapshot of queue depth and throughput counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "workers": self.workers,
+                "busy_workers": self._busy,
+                "depth": self._queue.qsize(),
+                "max_size": self.max_size,
+                "accepting": self._accepting
+            })
+        finished = stats["completed"] + stats["failed"]
+        stats["avg_queue_wait_ms"] = round(stats.pop("queue_wait_total") * 1000 / finished, 3) if finished else 0.0
+        stats["avg_processing_ms"] = round(stats.pop("processing_time_total") * 1000 / finished, 3) if finished else 0.0
+        return stats
+
+    def shutdown(self, timeout=30):
+        """
+        Stop accepting jobs and wait for queued jobs to finish.
+
+        Returns True if the queue drained within the timeout.
+        """
+        self._accepting = False
+        with self._lock:
+            threads = list(self._threads) if self._pid == os.getpid() else []
+        if not threads:
+            return True
+
+        deadline = time.monotonic() + timeout
+        for _ in threads:
+            # Sentinels queue up behind outstanding jobs, so workers exit once drained
+            try:
+                self._queue.put(None, timeout=max(0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+        drained = not any(thread.is_alive() for thread in threads)
+        if drained:
+            logger.info(f"'{self.name}' queue drained")
+        else:
+            logger.warning(f"'{self.name}' queue did not drain within {timeout}s; {self._queue.qsize()} job(s) abandoned")
+        return drained
+
+    def register_shutdown(self, timeout=30):
+        """Drain the queue when the process exits"""
+        atexit.register(self.shutdown, timeout)
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from database import db_pool
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class MessageDeduplicator:
+    """
+    Remembers which WhatsApp message IDs have already been handled.
+
+    Meta redelivers a webhook when it does not get a timely 200, so the same
+    message ID can arrive more than once. IDs are kept in a bounded in-memory
+    LRU and, when persistence is enabled, in the processed_messages table so
+    that every gunicorn worker sees the same history. Entries older than the
+    horizon are forgotten.
+    """
+
+    # Delete expired rows from the table after this many claims
+    CLEANUP_EVERY = 500
+
+    def __init__(self, pool=None, horizon=None, max_entries=None, persistent=None):
+        self.pool = pool or db_pool
+        self.horizon = Config.DEDUP_HORIZON if horizon is None else horizon
+        self.max_entries = Config.DEDUP_MAX_ENTRIES if max_entries is None else max_entries
+        self.persistent = Config.DEDUP_PERSISTENT if persistent is None else persistent
+
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()  # message_id -> first seen timestamp
+        self._table_ready = False
+        self._claims_since_cleanup = 0
+        self._stats = {
+            "checked": 0,
+            "duplicates_dropped": 0,
+            "expired": 0,
+            "evictions": 0,
+            "db_errors": 0
+        }
+
+    def is_duplicate(self, message_id):
+        """
+        Claim a message ID.
+
+        Returns True if the ID was already claimed within the horizon, in
+        which case the message should be dropped.
+        """
+        if not message_id:
+            return False
+
+        now = time.time()
+        with self._lock:
+            self._stats["checked"] += 1
+            seen_at = self._seen.get(message_id)
+            if seen_at is not None:
+                if now - seen_at < self.horizon:
+                    self._stats["duplicates_dropped"] += 1
+                    return True
+                del self._seen[message_id]
+                self._stats["expired"] += 1
+
+            self._seen[message_id] = now
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+                self._stats["evictions"] += 1
+
+        if self.persistent and not self._claim_in_database(message_id):
+            with self._lock:
+                self._stats["duplicates_dropped"] += 1
+            return True
+        return False
+
+    def _ensure_table(self, conn):
+        """Create the processed_messages table and its expiry index on first use"""
+        if self._table_ready:
+            return
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS processed_messages (
+                message_id TEXT PRIMARY KEY,
+                received_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_processed_messages_received_at
+            ON processed_messages (received_at)
+        """)
+        conn.commit()
+        cursor.close()
+        self._table_ready = True
+
+    def _claim_in_database(self, message_id):
+        """
+        Insert the message ID, or take over an expired row.
+
+        Returns False if another worker already claimed the ID. Database
+        errors fail open so messages are never lost to an outage.
+        """
+        try:
+            with self.pool.connection() as conn:
+                self._ensure_table(conn)
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO processed_messages (message_id, received_at)
+                    VALUES (%s, NOW())
+                    ON CONFLICT (message_id) DO UPDATE SET received_at = EXCLUDED.received_at
+                    WHERE processed_messages.received_at < NOW() - make_interval(secs => %s)
+                    RETURNING message_id
+                """, (message_id, self.horizon))
+                claimed = cursor.fetchone() is not None
+
+                self._claims_since_cleanup += 1
+                if self._claims_since_cleanup >= self.CLEANUP_EVERY:
+                    self._claims_since_cleanup = 0
+                    cursor.execute("""
+                        DELETE FROM processed_messages
+                        WHERE received_at < NOW() - make_interval(secs => %s)
+                    """, (self.horizon,))
+
+                conn.commit()
+                cursor.close()
+            return claimed
+        except Exception as e:
+            with self._lock:
+                self._stats["db_errors"] += 1
+            logger.error(f"Database error checking message ID: {str(e)}")
+            return True
+
+    def stats(self):
+        """Get dedup counters and the in-memory size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._seen)
+            stats["max_entries"] = self.max_entries
+            stats["persistent"] = self.persistent
+        return stats
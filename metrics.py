@@ -0,0 +1,286 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets; Assistant runs can take tens of seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+class LatencyHistogram:
+    """Thread-safe cumulative latency histogram with fixed buckets"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, seconds):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+
+    def snapshot(self):
+        """Get count, sum and cumulative per-bucket counts (Prometheus style)"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = running + counts[-1]
+        return {"count": cumulative["+Inf"], "sum": round(total, 6), "buckets": cumulative}
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in values]
+
+class Histogram:
+    """Latency histogram per combination of label values"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def observe(self, seconds, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, LatencyHistogram(self.buckets))
+        child.observe(seconds)
+
+    def render(self):
+        with self._lock:
+            children = sorted(self._children.items())
+        lines = []
+        for key, child in children:
+            snapshot = child.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {snapshot['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {snapshot['count']}")
+        return lines
+
+class Gauge:
+    """
+    Value read from a callback at scrape time; the callback may return a
+    number or {label value: number}. Counters kept by a component itself
+    are exposed the same way with metric_type="counter".
+    """
+
+    def __init__(self, name, documentation, callback, label=None, metric_type="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.label = label
+        self.type = metric_type
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.warning(f"Could not read gauge {self.name}: {str(e)}")
+            return []
+        if self.label is None:
+            return [f"{self.name} {value}"]
+        return [f"{self.name}{_format_labels((self.label,), (key,))} {item}" for key, item in sorted(value.items())]
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, callback, label=None, metric_type="gauge"):
+        with self._lock:
+            self._metrics[name] = Gauge(name, documentation, callback, label, metric_type)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Metrics shared by every module of this process
+registry = MetricsRegistry()
+
+stage_duration = registry.histogram(
+    "assana_stage_duration_seconds",
+    "Time spent in each processing stage and outbound call",
+    labels=("stage",)
+)
+stage_errors = registry.counter(
+    "assana_stage_errors_total",
+    "Stages that raised an exception",
+    labels=("stage",)
+)
+graph_responses = registry.counter(
+    "assana_graph_responses_total",
+    "Graph API responses by operation and HTTP status",
+    labels=("operation", "status")
+)
+webhook_messages = registry.counter(
+    "assana_webhook_messages_total",
+    "Messages received on the webhook by WhatsApp message type",
+    labels=("type",)
+)
+replies = registry.counter(
+    "assana_replies_total",
+    "AI replies by outcome",
+    labels=("outcome",)
+)
+
+class Trace:
+    """Stages timed on behalf of one webhook delivery, across every thread and task it reaches"""
+
+    def __init__(self, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stages = []
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._stages.append((stage, seconds))
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def breakdown(self):
+        """Total seconds per stage, in the order stages first finished"""
+        totals = {}
+        with self._lock:
+            for stage, seconds in self._stages:
+                totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+def start_trace(trace_id=None):
+    """
+    Make a new trace current for this thread or task and everything it
+    hands work to with the context copied (job queue, tool and read
+    receipt workers, asyncio tasks, asyncio.to_thread).
+    """
+    trace = Trace(trace_id)
+    _current_trace.set(trace)
+    return trace
+
+def current_trace():
+    return _current_trace.get()
+
+def current_trace_id():
+    trace = _current_trace.get()
+    return trace.id if trace else None
+
+def observe(stage, seconds, error=False):
+    """Record a stage timed by the caller"""
+    if not Config.METRICS_ENABLED:
+        return
+    stage_duration.observe(seconds, stage=stage)
+    if error:
+        stage_errors.inc(stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+@contextmanager
+def span(stage):
+    """Time a block (or, as a decorator, a function) as a named stage of the current trace"""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started, error)
+
+def finish_reply(outcome):
+    """
+    Record the outcome and end-to-end latency of a reply, logging a
+    per-stage breakdown when it took longer than METRICS_SLOW_TRACE_SECONDS.
+    """
+    if not Config.METRICS_ENABLED:
+        return
+    replies.inc(outcome=outcome)
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    elapsed = trace.elapsed()
+    observe("reply.total", elapsed)
+    if elapsed >= Config.METRICS_SLOW_TRACE_SECONDS:
+        stages = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in trace.breakdown().items())
+        logger.warning(f"Slow reply ({elapsed:.2f}s): {stages}")
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current trace ID (or '-') to every log record as %(trace_id)s"""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id() or "-"
+        return True
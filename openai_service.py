@@ -1,75 +1,105 @@
 import openai
+import time
 from config import Config
-import json
+from run_waiter import RunWaiter
+from rate_limiter import rate_limiter
+from appointment_tools import appointment_tools
+from warm_threads import WarmThreadPool
+from chat_engine import ChatEngine
+from conversation_history import ConversationHistory
+from faq_cache import faq_cache
+from datetime_parser import datetime_parser
+from metrics import span
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sent when an Assistant run does not finish within OPENAI_RUN_TIMEOUT
+RUN_TIMEOUT_MESSAGE = "I'm sorry, this is taking longer than expected. Please try again in a moment."
+
+# Sent when a response could not be generated
+ERROR_MESSAGE = "I apologize, but I'm having trouble processing your request right now."
+
 class OpenAIService:
-    def __init__(self):
+    def __init__(self, warm_threads=True, engine=None):
         if not Config.OPENAI_API_KEY or Config.OPENAI_API_KEY == 'your_openai_api_key_here':
             logger.warning("OpenAI API key not configured. OpenAI features will be disabled.")
             self.client = None
         else:
             self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
         self.assistant_id = Config.OPENAI_ASSISTANT_ID
+        # "assistants" runs conversations on OpenAI threads; "chat" uses Chat Completions with local history
+        self.engine = (engine or Config.OPENAI_ENGINE).lower()
+        self.run_waiter = RunWaiter(self.client) if self.client else None
+        
+        # Tool schemas and handlers; the serialized list is built once here and reused for every run
+        self.tools = appointment_tools
+        self.tools.definitions()
+        
+        # Empty threads created ahead of time for first-time senders
+        self.warm_threads = WarmThreadPool(self.client) if self.client and warm_threads and self.engine == "assistants" else None
+        if self.warm_threads:
+            self.warm_threads.start()
         
-        # Define available functions for the Assistant
-        self.available_functions = {
-            "get_appointment_details": {
-                "name": "get_appointment_details",
-                "description": "Get appointment details for the current user",
-                "parameters": {
-                    "type": "object",
-                    "properties": {},
-                    "required": []
-                }
-            },
-            "update_appointment_name": {
-                "name": "update_appointment_name",
-                "description": "Update patient name for appointments",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "new_name": {
-                            "type": "string",
-                            "description": "The new patient name"
-                        }
-                    },
-                    "required": ["new_name"]
-                }
-            },
-            "update_appointment_datetime_db": {
-                "name": "update_appointment_datetime_db",
-                "description": "Update appointment date and time",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "new_datetime_str": {
-                            "type": "string",
-                            "description": "The new date and time in format 'Month Day, Year at Hour:Minute AM/PM'"
-                        }
-                    },
-                    "required": ["new_datetime_str"]
-                }
-            },
-            "update_appointment_clinic": {
-                "name": "update_appointment_clinic",
-                "description": "Update clinic name for appointments",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "new_clinic": {
-                            "type": "string",
-                            "description": "The new clinic name"
-                        }
-                    },
-                    "required": ["new_clinic"]
-                }
-            }
-        }
+        # Chat Completions engine with the conversation kept locally
+        self.conversation_history = ConversationHistory()
+        self.chat_engine = ChatEngine(self.client, self.tools, self.conversation_history) if self.client else None
+        if self.chat_engine:
+            self.conversation_history.summarizer = self.chat_engine.summarize
+        
+        # Common clinic questions answered from Config without a model call
+        self.faq = faq_cache
+        
+        # Date/time phrases the local parser cannot read are sent to the model
+        if self.client:
+            datetime_parser.fallback = self.create_chat_completion
+        
+    def create_response(self, message, whatsapp_number, thread_id=None):
+        """
+        Respond to a WhatsApp message with the configured engine.
+        Returns (response_text, thread_id); thread_id is unchanged in chat mode
+        and for questions answered from the FAQ cache.
+        """
+        with span("faq.answer"):
+            faq_answer = self.faq.answer(message)
+        if faq_answer:
+            logger.info(f"Answered FAQ from {whatsapp_number} without a model call")
+            if self.engine == "chat" and self.chat_engine:
+                self.conversation_history.append_turn(whatsapp_number, message, faq_answer)
+            elif thread_id:
+                self._record_faq_turn(thread_id, message, faq_answer)
+            return faq_answer, thread_id
+        
+        started = time.perf_counter()
+        response_text, thread_id = self._generate_response(message, whatsapp_number, thread_id)
+        self.faq.observe_response(time.perf_counter() - started)
+        return response_text, thread_id
+        
+    def _record_faq_turn(self, thread_id, message, answer):
+        """Add an FAQ question and its answer to the thread so later runs see them"""
+        if not self.client:
+            return
+        try:
+            with span("openai.messages.create"):
+                self.client.beta.threads.messages.create(thread_id=thread_id, role="user", content=message)
+                self.client.beta.threads.messages.create(thread_id=thread_id, role="assistant", content=answer)
+        except Exception as e:
+            logger.warning(f"Could not add FAQ answer to thread {thread_id}: {str(e)}")
+        
+    def _generate_response(self, message, whatsapp_number, thread_id):
+        """Respond with the configured engine"""
+        if self.engine != "chat" or not self.chat_engine:
+            return self.create_assistant_response_with_functions(message, whatsapp_number, thread_id)
+        
+        try:
+            with span("openai.chat"):
+                response_text = self.chat_engine.respond(message, whatsapp_number)
+            return response_text or ERROR_MESSAGE, thread_id
+        except Exception as e:
+            logger.error(f"Error in OpenAI chat engine: {str(e)}")
+            return ERROR_MESSAGE, thread_id
         
     def create_chat_completion(self, message, conversation_history=None):
         """
@@ -101,12 +131,14 @@ class OpenAIService:
             })
             
             # Make the API call
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=1000,
-                temperature=0.7
-            )
+            rate_limiter.acquire("openai_chat")
+            with span("openai.chat_completion"):
+                response = self.client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    max_tokens=1000,
+                    temperature=0.7
+                )
             
             # Extract the response
             ai_response = response.choices[0].message.content
@@ -130,170 +162,76 @@ class OpenAIService:
         try:
             # Create a new thread if none exists
             if not thread_id:
-                thread = self.client.beta.threads.create()
-                thread_id = thread.id
+                thread_id = self._new_thread_id()
             
             # Simple message - let OpenAI Assistant use its web-configured instructions
             enhanced_message = f"User message: {message}\nWhatsApp number: {whatsapp_number}"
             
             # Add the enhanced message to the thread
-            self.client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content=enhanced_message
-            )
-            
-            # Create a run with tools (functions)
-            tools = []
-            for func_name, func_def in self.available_functions.items():
-                tools.append({
-                    "type": "function",
-                    "function": func_def
-                })
-            
-            # Run the assistant with tools
-            run = self.client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=self.assistant_id,
-                tools=tools
-            )
+            try:
+                with span("openai.messages.create"):
+                    self.client.beta.threads.messages.create(
+                        thread_id=thread_id,
+                        role="user",
+                        content=enhanced_message
+                    )
+            except openai.NotFoundError:
+                # A cached thread was deleted on OpenAI's side; start a fresh one
+                logger.warning(f"Thread {thread_id} no longer exists, creating a new one")
+                thread_id = self._new_thread_id()
+                with span("openai.messages.create"):
+                    self.client.beta.threads.messages.create(
+                        thread_id=thread_id,
+                        role="user",
+                        content=enhanced_message
+                    )
             
-            # Wait for the run to complete
-            import time
-            while run.status in ["queued", "in_progress"]:
-                time.sleep(1)
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run.id
+            # Run the assistant, answering every tool-call round until the run settles.
+            # Calls within a round run concurrently; the WhatsApp number always comes from the incoming message
+            rate_limiter.acquire("openai_runs")
+            with span("openai.run"):
+                result = self.run_waiter.run_to_completion(
+                    thread_id,
+                    lambda tool_calls: self.tools.dispatch(tool_calls, whatsapp_number),
+                    assistant_id=self.assistant_id,
+                    tools=self.tools.definitions()
                 )
+            if result.tool_rounds:
+                logger.info(f"Assistant run finished after {result.tool_rounds} tool round(s) in {result.elapsed:.2f}s")
             
-            # Handle function calls if needed
-            if run.status == "requires_action" and run.required_action:
-                # Get the function calls
-                tool_calls = run.required_action.submit_tool_outputs.tool_calls
-                tool_outputs = []
-                
-                for tool_call in tool_calls:
-                    function_name = tool_call.function.name
-                    function_args = json.loads(tool_call.function.arguments)
-                    
-                    # Always use the WhatsApp number from the incoming message
-                    # Override any WhatsApp number in the function arguments
-                    if "whatsapp_number" in function_args:
-                        function_args["whatsapp_number"] = whatsapp_number
-                    
-                    # Call the appropriate function
-                    logger.info(f"Calling function: {function_name} with args: {function_args}")
-                    
-                    if function_name == "get_appointment_details":
-                        from app import get_appointment_details
-                        result = get_appointment_details(whatsapp_number)
-                        logger.info(f"get_appointment_details result: {result}")
-                    elif function_name == "update_appointment_name":
-                        from app import update_appointment_name
-                        new_name = function_args.get("new_name")
-                        logger.info(f"Updating name to: {new_name} for number: {whatsapp_number}")
-                        result = update_appointment_name(whatsapp_number, new_name)
-                        logger.info(f"update_appointment_name result: {result}")
-                    elif function_name == "update_appointment_datetime_db":
-                        from app import update_appointment_datetime_db
-                        new_datetime = function_args.get("new_datetime_str")
-                        logger.info(f"Updating datetime to: {new_datetime} for number: {whatsapp_number}")
-                        result = update_appointment_datetime_db(whatsapp_number, new_datetime)
-                        logger.info(f"update_appointment_datetime_db result: {result}")
-                    elif function_name == "update_appointment_clinic":
-                        from app import update_appointment_clinic
-                        new_clinic = function_args.get("new_clinic")
-                        logger.info(f"Updating clinic to: {new_clinic} for number: {whatsapp_number}")
-                        result = update_appointment_clinic(whatsapp_number, new_clinic)
-                        logger.info(f"update_appointment_clinic result: {result}")
-                    else:
-                        result = {"success": False, "message": "Unknown function"}
-                        logger.warning(f"Unknown function called: {function_name}")
-                    
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": json.dumps(result)
-                    })
-                
-                # Submit tool outputs
-                run = self.client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=thread_id,
-                    run_id=run.id,
-                    tool_outputs=tool_outputs
-                )
-                
-                # Wait for the run to complete again
-                while run.status in ["queued", "in_progress"]:
-                    time.sleep(1)
-                    run = self.client.beta.threads.runs.retrieve(
-                        thread_id=thread_id,
-                        run_id=run.id
-                    )
+            if result.timed_out:
+                logger.warning(f"Assistant run timed out after {result.elapsed:.1f}s for {whatsapp_number}")
+                return RUN_TIMEOUT_MESSAGE, thread_id
             
-            if run.status == "completed":
-                # Get the response
-                messages = self.client.beta.threads.messages.list(thread_id=thread_id)
-                latest_message = messages.data[0]
-                
-                if latest_message.content:
-                    response_text = latest_message.content[0].text.value
+            if result.completed:
+                response_text = result.message_text or self._latest_message_text(thread_id)
+                if response_text:
                     return response_text, thread_id
             
-            return "I apologize, but I'm having trouble processing your request right now.", thread_id
+            return ERROR_MESSAGE, thread_id
             
         except Exception as e:
             logger.error(f"Error in OpenAI Assistant API call: {str(e)}")
-            return "I apologize, but I'm having trouble processing your request right now.", thread_id
+            return ERROR_MESSAGE, thread_id
     
-    def create_assistant_response(self, message, thread_id=None):
+    def _new_thread_id(self):
         """
-        Create a response using OpenAI Assistant API (if assistant_id is configured)
+        Get an empty thread, from the warm pool when one is available
         """
-        # No local greeting handling - using OpenAI web interface instructions only
-            
-        if not self.assistant_id:
-            return self.create_chat_completion(message)
-            
-        try:
-            # Create a new thread if none exists
-            if not thread_id:
-                thread = self.client.beta.threads.create()
-                thread_id = thread.id
-            
-            # Add the message to the thread
-            self.client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content=message
-            )
-            
-            # Run the assistant
-            run = self.client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=self.assistant_id
-            )
-            
-            # Wait for the run to complete
-            import time
-            while run.status in ["queued", "in_progress"]:
-                time.sleep(1)
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run.id
-                )
-            
-            if run.status == "completed":
-                # Get the response
-                messages = self.client.beta.threads.messages.list(thread_id=thread_id)
-                latest_message = messages.data[0]
-                
-                if latest_message.content:
-                    response_text = latest_message.content[0].text.value
-                    return response_text, thread_id
-            
-            return "I apologize, but I'm having trouble processing your request right now.", thread_id
-            
-        except Exception as e:
-            logger.error(f"Error in OpenAI Assistant API call: {str(e)}")
-            return "I apologize, but I'm having trouble processing your request right now.", thread_id
+        thread_id = self.warm_threads.claim() if self.warm_threads else None
+        if thread_id:
+            return thread_id
+        with span("openai.threads.create"):
+            return self.client.beta.threads.create().id
+    
+    def _latest_message_text(self, thread_id):
+        """
+        Get the text of the newest message on a thread
+        """
+        with span("openai.messages.list"):
+            messages = self.client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+        latest_message = messages.data[0]
+        
+        if latest_message.content:
+            return latest_message.content[0].text.value
+        return None
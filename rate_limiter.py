@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+import time
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How a caller behaves when a bucket is empty
+WAIT = "wait"            # wait up to max_wait, then fail
+QUEUE = "queue"          # wait as long as it takes, in arrival order
+FAIL_FAST = "fail_fast"  # fail immediately
+
+class RateLimitExceeded(Exception):
+    """Raised when a token cannot be obtained under the caller's policy"""
+    pass
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second up to `burst`.
+
+    Waiting callers reserve their token up front (the balance may go
+    negative), so waiters are served in arrival order and never spin.
+    """
+
+    def __init__(self, name, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, float(burst if burst is not None else rate))
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._stats = {
+            "acquired": 0,
+            "waited": 0,
+            "rejected": 0,
+            "wait_time_total": 0.0
+        }
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self, tokens, mode, max_wait):
+        """Take tokens, returning how long the caller must wait before using them"""
+        if max_wait is None:
+            max_wait = Config.RATE_LIMIT_MAX_WAIT
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            deficit = tokens - self._tokens
+            delay = deficit / self.rate if deficit > 0 else 0.0
+
+            if delay > 0 and (mode == FAIL_FAST or (mode == WAIT and delay > max_wait)):
+                self._stats["rejected"] += 1
+                raise RateLimitExceeded(f"Rate limit '{self.name}' exceeded (next token in {delay:.2f}s)")
+
+            self._tokens -= tokens
+            self._stats["acquired"] += 1
+            if delay > 0:
+                self._stats["waited"] += 1
+                self._stats["wait_time_total"] += delay
+        return delay
+
+    def acquire(self, tokens=1, mode=WAIT, max_wait=None):
+        """
+        Take tokens from the bucket, blocking according to `mode`.
+
+        Raises RateLimitExceeded if the tokens are not available immediately
+        (FAIL_FAST) or within max_wait seconds (WAIT).
+        """
+        delay = self._reserve(tokens, mode, max_wait)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, tokens=1, mode=WAIT, max_wait=None):
+        """Like acquire(), but waits with asyncio.sleep so the event loop keeps running"""
+        delay = self._reserve(tokens, mode, max_wait)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def stats(self):
+        """Get the bucket's configuration, current balance and counters"""
+        with self._lock:
+            self._refill(time.monotonic())
+            stats = dict(self._stats)
+            stats.update({
+                "rate": self.rate,
+                "burst": self.burst,
+                "available": round(self._tokens, 3)
+            })
+        stats["wait_time_total"] = round(stats["wait_time_total"], 6)
+        return stats
+
+class RateLimiter:
+    """Named token buckets, one per upstream API"""
+
+    def __init__(self, buckets=None):
+        self._buckets = {}
+        for name, (rate, burst) in (buckets or {}).items():
+            self._buckets[name] = TokenBucket(name, rate, burst)
+
+    def bucket(self, name):
+        return self._buckets.get(name)
+
+    def acquire(self, name, tokens=1, mode=WAIT, max_wait=None):
+        """Take tokens from a named bucket; unknown or disabled buckets never limit"""
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            return 0.0
+        delay = bucket.acquire(tokens, mode, max_wait)
+        if delay > 0:
+            logger.info(f"Rate limit '{name}' delayed call by {delay:.2f}s")
+        return delay
+
+    async def acquire_async(self, name, tokens=1, mode=WAIT, max_wait=None):
+        """Async acquire(), for the asyncio services"""
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            return 0.0
+        delay = await bucket.acquire_async(tokens, mode, max_wait)
+        if delay > 0:
+            logger.info(f"Rate limit '{name}' delayed call by {delay:.2f}s")
+        return delay
+
+    def stats(self):
+        return {name: bucket.stats() for name, bucket in self._buckets.items()}
+
+    @classmethod
+    def from_config(cls):
+        """Build the shared limiter from Config; a rate of 0 disables a bucket"""
+        buckets = {
+            "graph_messages": (Config.RATE_LIMIT_GRAPH_MESSAGES_RATE, Config.RATE_LIMIT_GRAPH_MESSAGES_BURST),
+            "graph_templates": (Config.RATE_LIMIT_GRAPH_TEMPLATES_RATE, Config.RATE_LIMIT_GRAPH_TEMPLATES_BURST),
+            "openai_runs": (Config.RATE_LIMIT_OPENAI_RUNS_RATE, Config.RATE_LIMIT_OPENAI_RUNS_BURST),
+            "openai_chat": (Config.RATE_LIMIT_OPENAI_CHAT_RATE, Config.RATE_LIMIT_OPENAI_CHAT_BURST)
+        }
+        return cls({name: limits for name, limits in buckets.items() if limits[0] > 0})
+
+# Shared limiter for outbound Graph API and OpenAI calls
+rate_limiter = RateLimiter.from_config()
@@ -0,0 +1,176 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class _Pending:
+    """Newest unsent read status for one sender, and the context (trace) it was requested in"""
+
+    __slots__ = ("message_id", "typing", "due", "context")
+
+    def __init__(self, message_id, typing, due):
+        self.message_id = message_id
+        self.typing = typing
+        self.due = due
+        self.context = contextvars.copy_context()
+
+class ReadReceipts:
+    """
+    Sends read receipts and typing indicators off the request path.
+
+    mark_read() only records the message; after `delay` seconds one status
+    call marks the sender's newest message read, which WhatsApp applies to
+    everything before it too, so a burst of messages costs one call.
+    typing() cancels the sender's pending receipt and sends the typing
+    indicator for their newest message right away instead; the indicator
+    carries the read status too, so a message answered within `delay`
+    costs one status call, made alongside the OpenAI call.
+
+    Calls are made by a small worker pool started lazily in each process.
+    Call before_reply() ahead of sending a reply, so a late typing
+    indicator cannot reappear after the answer.
+    """
+
+    def __init__(self, whatsapp_service, delay=None, workers=None, max_senders=10000):
+        self.whatsapp_service = whatsapp_service
+        self.delay = Config.READ_RECEIPT_DELAY if delay is None else delay
+        self.workers = Config.READ_RECEIPT_WORKERS if workers is None else workers
+        self.max_senders = max_senders
+
+        self._lock = threading.Condition()
+        self._pending = {}  # to_number -> _Pending
+        self._in_flight = {}  # to_number -> Event set when its status call returns
+        self._latest = OrderedDict()  # to_number -> newest message ID seen
+        self._executor = None
+        self._pid = None
+        self._stats = {
+            "requested": 0,
+            "coalesced": 0,
+            "receipts_sent": 0,
+            "typing_sent": 0,
+            "typing_dropped": 0,
+            "receipts_cancelled": 0,
+            "errors": 0
+        }
+
+    def mark_read(self, to_number, message_id):
+        """Queue a read receipt for a message; returns immediately"""
+        if not message_id:
+            return
+        self._start()
+        with self._lock:
+            self._stats["requested"] += 1
+            self._remember(to_number, message_id)
+            pending = self._pending.get(to_number)
+            if pending is not None:
+                pending.message_id = message_id
+                pending.context = contextvars.copy_context()
+                self._stats["coalesced"] += 1
+            else:
+                self._pending[to_number] = _Pending(message_id, False, time.monotonic() + self.delay)
+            self._lock.notify()
+
+    def typing(self, to_number):
+        """Show the typing indicator (and read status) for a sender's newest message; returns immediately"""
+        self._start()
+        with self._lock:
+            message_id = self._latest.get(to_number)
+            if not message_id:
+                return
+            # The typing indicator marks the message read as well, so the separate receipt is not needed
+            pending = self._pending.pop(to_number, None)
+            if pending is not None and not pending.typing:
+                self._stats["receipts_cancelled"] += 1
+            self._pending[to_number] = _Pending(message_id, True, 0)
+            self._lock.notify()
+
+    def before_reply(self, to_number, timeout=1.0):
+        """
+        Drop a typing indicator not yet sent for a sender (its read receipt
+        still goes out) and wait briefly for one already in flight.
+        """
+        with self._lock:
+            pending = self._pending.get(to_number)
+            if pending is not None and pending.typing:
+                pending.typing = False
+                self._stats["typing_dropped"] += 1
+            in_flight = self._in_flight.get(to_number)
+        if in_flight is not None:
+            in_flight.wait(timeout)
+
+    def _remember(self, to_number, message_id):
+        self._latest[to_number] = message_id
+        self._latest.move_to_end(to_number)
+        while len(self._latest) > self.max_senders:
+            self._latest.popitem(last=False)
+
+    def _start(self):
+        """Start the dispatcher and worker pool in the current process if needed"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Statuses queued by a parent process are its to send
+            self._pending.clear()
+            self._in_flight.clear()
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="read-receipt")
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._dispatch_loop, name="read-receipts", daemon=True)
+        thread.start()
+
+    def _dispatch_loop(self):
+        """Hand due statuses to the worker pool, one sender at a time"""
+        pid = os.getpid()
+        while self._pid == pid:
+            with self._lock:
+                now = time.monotonic()
+                due = [
+                    number for number, pending in self._pending.items()
+                    if pending.due <= now and number not in self._in_flight
+                ]
+                if not due:
+                    waiting = [p.due for n, p in self._pending.items() if n not in self._in_flight]
+                    self._lock.wait(timeout=max(0.01, min(waiting) - now) if waiting else None)
+                    continue
+                jobs = []
+                for number in due:
+                    pending = self._pending.pop(number)
+                    self._in_flight[number] = threading.Event()
+                    jobs.append((pending.context, number, pending.message_id, pending.typing))
+            for context, *job in jobs:
+                self._executor.submit(context.run, self._send, *job)
+
+    def _send(self, to_number, message_id, typing):
+        try:
+            if typing:
+                ok = self.whatsapp_service.send_typing_indicator(message_id)
+            else:
+                ok = self.whatsapp_service.mark_message_as_read(message_id)
+            with self._lock:
+                self._stats[("typing_sent" if typing else "receipts_sent") if ok else "errors"] += 1
+        except Exception as e:
+            logger.error(f"Error sending read status: {str(e)}")
+            with self._lock:
+                self._stats["errors"] += 1
+        finally:
+            with self._lock:
+                self._in_flight.pop(to_number).set()
+                # A status queued meanwhile for this sender may now be due
+                self._lock.notify()
+
+    def stats(self):
+        """Get read receipt and typing indicator counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+            stats["in_flight"] = len(self._in_flight)
+        return stats
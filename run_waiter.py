@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import time
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Run statuses that mean the run is still being worked on
+PENDING_STATUSES = ("queued", "in_progress", "cancelling")
+
+class RunWaitResult:
+    """Outcome of waiting for an Assistant run to leave the pending states"""
+
+    def __init__(self, run, status, elapsed, polls=0, timed_out=False, message_text=None, tool_rounds=0):
+        self.run = run
+        self.status = status
+        self.elapsed = elapsed
+        self.polls = polls
+        self.timed_out = timed_out
+        # requires_action rounds answered before this result
+        self.tool_rounds = tool_rounds
+        # Final assistant message, when it was delivered on the event stream
+        self.message_text = message_text
+
+    @property
+    def completed(self):
+        return self.status == "completed"
+
+    @property
+    def requires_action(self):
+        return self.status == "requires_action" and self.run is not None and self.run.required_action is not None
+
+    def __repr__(self):
+        return (f"RunWaitResult(status={self.status!r}, elapsed={self.elapsed:.3f}, polls={self.polls}, "
+                f"timed_out={self.timed_out}, tool_rounds={self.tool_rounds})")
+
+# Steps the shared run logic asks its driver to perform (see RunWaiter._drive)
+CALL = "call"      # (CALL, function, kwargs): call an SDK method and send back its result
+SLEEP = "sleep"    # (SLEEP, seconds)
+TOOLS = "tools"    # (TOOLS, handle_tool_calls, tool_calls): send back the tool outputs
+ITER = "iter"      # (ITER, stream): send back an iterator over its events
+NEXT = "next"      # (NEXT, iterator, seconds left): send back the next event, or END
+CLOSE = "close"    # (CLOSE, stream)
+
+# Sent back for NEXT when the stream has no more events (or, async, none arrived in time)
+END = object()
+
+class RunWaiter:
+    """
+    Waits for Assistant runs to finish.
+
+    Uses the Assistants streaming events when available and otherwise polls
+    runs.retrieve with exponential backoff. Every wait is bounded by an
+    overall deadline; running out of time yields a result with
+    timed_out=True rather than an exception, so callers can tell a slow run
+    apart from a failed one.
+
+    The waiting logic is written once, as generators that yield the I/O
+    they need (SDK calls, sleeps, stream reads) and receive its result.
+    _drive() performs those steps with blocking calls here and with awaits
+    in AsyncRunWaiter, so both follow exactly the same rules.
+    """
+
+    def __init__(self, client, initial_interval=None, max_interval=None, backoff=None, timeout=None, use_streaming=None, max_tool_rounds=None):
+        self.client = client
+        self.initial_interval = Config.OPENAI_POLL_INITIAL_INTERVAL if initial_interval is None else initial_interval
+        self.max_interval = Config.OPENAI_POLL_MAX_INTERVAL if max_interval is None else max_interval
+        self.backoff = Config.OPENAI_POLL_BACKOFF if backoff is None else backoff
+        self.timeout = Config.OPENAI_RUN_TIMEOUT if timeout is None else timeout
+        self.use_streaming = Config.OPENAI_RUN_STREAMING if use_streaming is None else use_streaming
+        self.max_tool_rounds = Config.OPENAI_MAX_TOOL_ROUNDS if max_tool_rounds is None else max_tool_rounds
+
+    def run_to_completion(self, thread_id, handle_tool_calls, **run_params):
+        """
+        Create a run and answer every requires_action round until it settles.
+
+        handle_tool_calls(tool_calls) must return the tool_outputs for one
+        round; they are submitted together. The whole exchange shares one
+        deadline, and a run that keeps asking for tools after max_tool_rounds
+        is cancelled with status "max_tool_rounds".
+        """
+        return self._drive(self._run_to_completion(thread_id, handle_tool_calls, run_params))
+
+    def start_run(self, thread_id, deadline=None, **run_params):
+        """Create a run on the thread and wait for it"""
+        return self._drive(self._start_run(thread_id, deadline or time.monotonic() + self.timeout, run_params))
+
+    def submit_tool_outputs(self, thread_id, run_id, tool_outputs, deadline=None):
+        """Submit tool outputs for a run and wait for it again"""
+        return self._drive(self._submit_tool_outputs(thread_id, run_id, tool_outputs, deadline or time.monotonic() + self.timeout))
+
+    def _drive(self, steps):
+        """Run the shared logic, performing each step it yields with a blocking call"""
+        value, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = self._perform(step), None
+            except BaseException as e:
+                # Thrown back in so the logic can clean up (close the stream) before it propagates
+                value, error = None, e
+
+    def _perform(self, step):
+        kind = step[0]
+        if kind == CALL:
+            return step[1](**step[2])
+        if kind == SLEEP:
+            time.sleep(step[1])
+        elif kind == TOOLS:
+            return step[1](step[2])
+        elif kind == ITER:
+            return iter(step[1])
+        elif kind == NEXT:
+            # The stream was opened with the time left as its request timeout, which bounds this read
+            return next(step[1], END)
+        elif kind == CLOSE:
+            close = getattr(step[1], "close", None)
+            if close:
+                close()
+        return None
+
+    def _run_to_completion(self, thread_id, handle_tool_calls, run_params):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        result = yield from self._start_run(thread_id, deadline, run_params)
+        rounds = 0
+
+        while result.requires_action:
+            if rounds >= self.max_tool_rounds:
+                logger.warning(f"Run {result.run.id} still requires action after {rounds} tool round(s); cancelling")
+                yield from self._cancel(thread_id, result.run)
+                result = RunWaitResult(result.run, "max_tool_rounds", 0.0)
+                break
+
+            tool_calls = result.run.required_action.submit_tool_outputs.tool_calls
+            tool_outputs = yield (TOOLS, handle_tool_calls, tool_calls)
+            rounds += 1
+            if time.monotonic() >= deadline:
+                result = yield from self._timed_out(thread_id, result.run, started, 0)
+                break
+            result = yield from self._submit_tool_outputs(thread_id, result.run.id, tool_outputs, deadline)
+
+        result.tool_rounds = rounds
+        result.elapsed = time.monotonic() - started
+        return result
+
+    def _start_run(self, thread_id, deadline, run_params):
+        runs = self.client.beta.threads.runs
+        if self.use_streaming:
+            result = yield from self._stream(runs.create, dict(thread_id=thread_id, **run_params), thread_id, deadline)
+            if result is not None:
+                return result
+            # The stream request may have created the run before failing; wait on it rather than start a second
+            run = yield from self._active_run(thread_id)
+            if run is not None:
+                return (yield from self._poll(thread_id, run, deadline))
+
+        run = yield (CALL, runs.create, dict(thread_id=thread_id, **run_params))
+        return (yield from self._poll(thread_id, run, deadline))
+
+    def _submit_tool_outputs(self, thread_id, run_id, tool_outputs, deadline):
+        runs = self.client.beta.threads.runs
+        request = dict(thread_id=thread_id, run_id=run_id, tool_outputs=tool_outputs)
+        if self.use_streaming:
+            result = yield from self._stream(runs.submit_tool_outputs, request, thread_id, deadline)
+            if result is not None:
+                return result
+            # The outputs may have been accepted before the stream failed
+            run = yield (CALL, runs.retrieve, dict(thread_id=thread_id, run_id=run_id))
+            if run.status != "requires_action":
+                return (yield from self._poll(thread_id, run, deadline))
+
+        run = yield (CALL, runs.submit_tool_outputs, request)
+        return (yield from self._poll(thread_id, run, deadline))
+
+    def _poll(self, thread_id, run, deadline):
+        """Poll runs.retrieve with exponential backoff until the run settles or the deadline passes"""
+        started = time.monotonic()
+        interval = self.initial_interval
+        polls = 0
+
+        while run.status in PENDING_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return (yield from self._timed_out(thread_id, run, started, polls))
+            yield (SLEEP, min(interval, remaining))
+            interval = min(interval * self.backoff, self.max_interval)
+            run = yield (CALL, self.client.beta.threads.runs.retrieve, dict(thread_id=thread_id, run_id=run.id))
+            polls += 1
+
+        return RunWaitResult(run, run.status, time.monotonic() - started, polls=polls)
+
+    def _stream(self, open_stream, request, thread_id, deadline):
+        """
+        Follow a run over the event stream.
+
+        Returns None if streaming could not be started, so the caller can
+        fall back to the non-streaming request. The stream is opened with the
+        time left as its request timeout, so a stalled stream cannot hold
+        the run past its deadline for longer than that.
+        """
+        started = time.monotonic()
+        try:
+            stream = yield (CALL, open_stream, dict(request, stream=True, timeout=max(0.1, deadline - started)))
+        except TypeError as e:
+            # The installed SDK does not accept stream=True; stop trying
+            logger.warning(f"Run streaming unavailable, falling back to polling: {str(e)}")
+            self.use_streaming = False
+            return None
+        except Exception as e:
+            logger.warning(f"Could not open run event stream, falling back to polling: {str(e)}")
+            return None
+
+        run = None
+        message_text = None
+        try:
+            events = yield (ITER, stream)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                event = yield (NEXT, events, remaining)
+                if event is END:
+                    break
+                event_name = getattr(event, "event", "")
+                if event_name.startswith("thread.run.") and not event_name.startswith("thread.run.step"):
+                    run = event.data
+                    if run.status not in PENDING_STATUSES:
+                        break
+                elif event_name == "thread.message.completed":
+                    message_text = self._message_text(event.data) or message_text
+                elif event_name == "error":
+                    raise RuntimeError(f"Run stream error: {event.data}")
+        except RuntimeError:
+            raise
+        except Exception as e:
+            if run is None and time.monotonic() < deadline:
+                # The caller looks for a run the request may have created before retrying without a stream
+                logger.warning(f"Run event stream failed before reporting the run: {str(e)}")
+                return None
+            if run is not None:
+                logger.warning(f"Run event stream interrupted, polling run {run.id}: {str(e)}")
+        finally:
+            yield (CLOSE, stream)
+
+        if run is None:
+            if time.monotonic() < deadline:
+                raise RuntimeError("Run event stream ended before the run was created")
+            # Out of time before the stream reported the run; it may still have been created
+            run = yield from self._active_run(thread_id)
+            if run is None:
+                return RunWaitResult(None, "timeout", time.monotonic() - started, timed_out=True)
+        if run.status in PENDING_STATUSES:
+            # Stream ended or the deadline passed while the run was still going
+            if time.monotonic() >= deadline:
+                return (yield from self._timed_out(thread_id, run, started, 0))
+            result = yield from self._poll(thread_id, run, deadline)
+            result.elapsed = time.monotonic() - started
+            return result
+
+        return RunWaitResult(run, run.status, time.monotonic() - started, message_text=message_text)
+
+    def _active_run(self, thread_id):
+        """The thread's newest run if it is still going or waiting for tool outputs, else None"""
+        try:
+            runs = yield (CALL, self.client.beta.threads.runs.list, dict(thread_id=thread_id, limit=1))
+        except Exception as e:
+            logger.warning(f"Could not list runs on thread {thread_id}: {str(e)}")
+            return None
+        run = runs.data[0] if runs.data else None
+        if run is not None and (run.status in PENDING_STATUSES or run.status == "requires_action"):
+            return run
+        return None
+
+    def _timed_out(self, thread_id, run, started, polls):
+        """Cancel a run that overran its deadline and report the timeout"""
+        logger.warning(f"Run {run.id} still '{run.status}' after {self.timeout}s; cancelling")
+        yield from self._cancel(thread_id, run)
+        return RunWaitResult(run, "timeout", time.monotonic() - started, polls=polls, timed_out=True)
+
+    def _cancel(self, thread_id, run):
+        try:
+            yield (CALL, self.client.beta.threads.runs.cancel, dict(thread_id=thread_id, run_id=run.id))
+        except Exception as e:
+            logger.warning(f"Failed to cancel run {run.id}: {str(e)}")
+
+    @staticmethod
+    def _message_text(message):
+        """Extract the text of an assistant message object"""
+        if getattr(message, "role", None) != "assistant" or not message.content:
+            return None
+        text = getattr(message.content[0], "text", None)
+        return text.value if text else None
+
+class AsyncRunWaiter(RunWaiter):
+    """
+    RunWaiter for an openai.AsyncOpenAI client.
+
+    Same streaming-then-polling logic, deadlines and tool-round limit, but
+    every step is awaited, so one event loop can follow many runs: the
+    public methods return coroutines, and handle_tool_calls must be a
+    coroutine function.
+    """
+
+    async def _drive(self, steps):
+        """Run the shared logic, awaiting each step it yields"""
+        value, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = await self._perform(step), None
+            except BaseException as e:
+                # Thrown back in so the logic can clean up (close the stream) before it propagates
+                value, error = None, e
+
+    async def _perform(self, step):
+        kind = step[0]
+        if kind == CALL:
+            return await step[1](**step[2])
+        if kind == SLEEP:
+            await asyncio.sleep(step[1])
+        elif kind == TOOLS:
+            return await step[1](step[2])
+        elif kind == ITER:
+            return step[1].__aiter__()
+        elif kind == NEXT:
+            try:
+                return await asyncio.wait_for(step[1].__anext__(), step[2])
+            except (StopAsyncIteration, asyncio.TimeoutError):
+                return END
+        elif kind == CLOSE:
+            close = getattr(step[1], "close", None)
+            if close:
+                await close()
+        return None
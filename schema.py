@@ -0,0 +1,254 @@
+import argparse
+import json
+import logging
+import sys
+from appointment_repository import APPOINTMENT_COLUMNS
+from database import db_pool
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Versioned schema changes, applied in order and recorded in schema_migrations.
+# Statements marked concurrent run outside a transaction (CREATE INDEX CONCURRENTLY
+# does not lock writes, but cannot run inside one); the indexes they build are
+# listed so an invalid one left by a failed build can be found and rebuilt.
+#
+# Migrations only cover book_an_appointment, which this app does not create.
+# Tables the app owns (processed_messages, conversation_threads,
+# conversation_history, reminder_campaigns) are created with their indexes on
+# first use by the module that owns them. Version 3 used to create
+# processed_messages and has been folded into MessageDeduplicator.
+MIGRATIONS = [
+    {
+        "version": 1,
+        "description": "Index appointment lookups by WhatsApp number, newest first",
+        "concurrent": True,
+        "indexes": ["idx_book_an_appointment_number_created"],
+        "statements": [
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_book_an_appointment_number_created
+            ON book_an_appointment (whatsapp_number, created_at DESC)
+            """
+        ]
+    },
+    {
+        "version": 2,
+        "description": "Index appointments by booking time for reminder campaigns",
+        "concurrent": True,
+        "indexes": ["idx_book_an_appointment_booking_time"],
+        "statements": [
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_book_an_appointment_booking_time
+            ON book_an_appointment (booking_time)
+            """
+        ]
+    }
+]
+
+# Queries run on every Assistant tool call, checked by the audit command
+AUDITED_QUERIES = {
+    "find_by_number": f"""
+        SELECT {APPOINTMENT_COLUMNS}
+        FROM book_an_appointment
+        WHERE whatsapp_number = %s
+        ORDER BY created_at DESC
+    """,
+    # The webhook's batch prefetch, audited with a single number
+    "find_by_numbers": f"""
+        SELECT whatsapp_number, {APPOINTMENT_COLUMNS}
+        FROM book_an_appointment
+        WHERE whatsapp_number = ANY(ARRAY[%s])
+        ORDER BY created_at DESC
+    """,
+    "update_fields": f"""
+        UPDATE book_an_appointment
+        SET patient_name = patient_name
+        WHERE whatsapp_number = %s
+        RETURNING {APPOINTMENT_COLUMNS}
+    """
+}
+
+# Key used with pg_advisory_lock so only one process migrates at a time
+MIGRATION_LOCK_KEY = 7302
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+
+def _index_validity(cursor, index_name):
+    """True if the index is usable, False if a failed build left it invalid, None if it does not exist"""
+    cursor.execute("""
+        SELECT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND pg_catalog.pg_table_is_visible(c.oid)
+    """, (index_name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _drop_invalid_indexes(cursor, index_names):
+    """Drop indexes left INVALID by an interrupted CREATE INDEX CONCURRENTLY, which IF NOT EXISTS would skip"""
+    for index_name in index_names:
+        if _index_validity(cursor, index_name) is False:
+            logger.warning(f"Dropping invalid index {index_name} so it can be rebuilt")
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+
+def _apply_concurrent(cursor, migration):
+    """Build a migration's indexes outside a transaction, only recording it once they are all valid"""
+    indexes = migration.get("indexes", [])
+    _drop_invalid_indexes(cursor, indexes)
+    try:
+        for statement in migration["statements"]:
+            cursor.execute(statement)
+    except Exception:
+        _drop_invalid_indexes(cursor, indexes)
+        raise
+    invalid = [name for name in indexes if not _index_validity(cursor, name)]
+    if invalid:
+        raise RuntimeError(f"Migration {migration['version']} left invalid or missing indexes: {', '.join(invalid)}")
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+        (migration["version"], migration["description"])
+    )
+
+def applied_versions():
+    """Get the set of migration versions already applied"""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        _ensure_migrations_table(cursor)
+        cursor.execute("SELECT version FROM schema_migrations")
+        versions = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+        cursor.close()
+    return versions
+
+def migrate():
+    """Apply every pending migration; returns the versions applied"""
+    applied = []
+    with db_pool.connection() as conn:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            _ensure_migrations_table(cursor)
+            cursor.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cursor.fetchall()}
+
+            for migration in MIGRATIONS:
+                if migration["version"] in done:
+                    continue
+                logger.info(f"Applying migration {migration['version']}: {migration['description']}")
+
+                if migration["concurrent"]:
+                    _apply_concurrent(cursor, migration)
+                else:
+                    cursor.execute("BEGIN")
+                    try:
+                        for statement in migration["statements"]:
+                            cursor.execute(statement)
+                        cursor.execute(
+                            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                            (migration["version"], migration["description"])
+                        )
+                        cursor.execute("COMMIT")
+                    except Exception:
+                        cursor.execute("ROLLBACK")
+                        raise
+                applied.append(migration["version"])
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+            cursor.close()
+            conn.autocommit = False
+
+    if applied:
+        logger.info(f"Applied migrations: {applied}")
+    else:
+        logger.info("Schema is up to date")
+    return applied
+
+def _find_seq_scans(plan, found=None):
+    """Collect the relations read by sequential scans anywhere in a plan tree"""
+    if found is None:
+        found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        _find_seq_scans(child, found)
+    return found
+
+def audit(whatsapp_number=None, min_rows=10000):
+    """
+    EXPLAIN ANALYZE the tool-call queries and flag sequential scans on
+    book_an_appointment.
+
+    The planner legitimately prefers sequential scans on small tables, so a
+    scan is only flagged once the table holds at least min_rows rows. Runs
+    inside a transaction that is always rolled back, so the audited UPDATE
+    does not change any data. Returns a list of per-query reports.
+    """
+    reports = []
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if whatsapp_number is None:
+                cursor.execute("SELECT whatsapp_number FROM book_an_appointment LIMIT 1")
+                row = cursor.fetchone()
+                whatsapp_number = row[0] if row else ""
+
+            cursor.execute("SELECT reltuples::BIGINT FROM pg_class WHERE relname = 'book_an_appointment'")
+            row = cursor.fetchone()
+            estimated_rows = row[0] if row else None
+
+            for name, query in AUDITED_QUERIES.items():
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", (whatsapp_number,))
+                result = cursor.fetchone()[0]
+                explained = result[0] if isinstance(result, list) else json.loads(result)[0]
+                seq_scans = [rel for rel in _find_seq_scans(explained["Plan"]) if rel == "book_an_appointment"]
+                reports.append({
+                    "query": name,
+                    "execution_ms": explained.get("Execution Time"),
+                    "planning_ms": explained.get("Planning Time"),
+                    "top_node": explained["Plan"].get("Node Type"),
+                    "seq_scan": bool(seq_scans),
+                    "flagged": bool(seq_scans) and (estimated_rows or 0) >= min_rows,
+                    "table_rows_estimate": estimated_rows
+                })
+        finally:
+            conn.rollback()
+            cursor.close()
+    return reports
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage the appointment database schema")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("migrate", help="Apply pending migrations")
+    subcommands.add_parser("status", help="List migrations and whether they are applied")
+    audit_parser = subcommands.add_parser("audit", help="EXPLAIN ANALYZE the tool-call queries and flag sequential scans")
+    audit_parser.add_argument("--number", help="WhatsApp number to use in the audited queries (default: any existing one)")
+    audit_parser.add_argument("--min-rows", type=int, default=10000, help="Only flag sequential scans once the table has this many rows (default: 10000)")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate()
+    elif args.command == "status":
+        done = applied_versions()
+        for migration in MIGRATIONS:
+            state = "applied" if migration["version"] in done else "pending"
+            print(f"{migration['version']:>3}  {state:<8} {migration['description']}")
+    elif args.command == "audit":
+        flagged = False
+        for report in audit(args.number, args.min_rows):
+            status = "SEQ SCAN" if report["flagged"] else "ok"
+            print(f"{report['query']:<16} {status:<9} {report['top_node']:<20} "
+                  f"exec={report['execution_ms']}ms plan={report['planning_ms']}ms "
+                  f"rows~{report['table_rows_estimate']}")
+            flagged = flagged or report["flagged"]
+        if flagged:
+            print("Sequential scans found on book_an_appointment; run 'python schema.py migrate'.")
+        sys.exit(1 if flagged else 0)
@@ -0,0 +1,243 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from config import Config
+from metrics import TraceIdFilter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Text format, used when LOG_FORMAT is "text"
+TEXT_LOG_FORMAT = "%(levelname)s:%(name)s:[%(trace_id)s] %(message)s"
+
+# Field names whose values identify a patient; matched case-insensitively at any depth
+PII_FIELDS = frozenset([
+    "from", "to", "wa_id", "whatsapp_number", "to_number", "from_number", "phone", "phone_number",
+    "name", "patient_name", "new_name", "profile", "body", "text", "caption", "email", "address"
+])
+
+# Phone numbers inside free-text log messages; anchored so longer digit runs (IDs, timestamps) are left alone
+PHONE_PATTERN = re.compile(r"(?<![\w+])\+?\d{8,15}\b")
+
+def mask_phone(match):
+    """Keep the last four digits so lines about the same sender can still be matched up"""
+    digits = match.group(0)
+    return "***" + digits[-4:]
+
+def redact(value, key=None):
+    """Copy of a logged value with patient-identifying fields masked"""
+    if key is not None and key.lower() in PII_FIELDS:
+        if isinstance(value, (str, int)) and PHONE_PATTERN.fullmatch(str(value)):
+            return mask_phone(PHONE_PATTERN.fullmatch(str(value)))
+        return "[redacted]"
+    if isinstance(value, dict):
+        return {k: redact(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+def parse_sample_rates(spec):
+    """Parse "event=rate,event=rate" into a dict of rates between 0 and 1"""
+    rates = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        event, rate = item.split("=", 1)
+        try:
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            logger.warning(f"Ignoring invalid log sample rate: {item.strip()}")
+    return rates
+
+class EventSampler:
+    """Per-event-type sampling; events without a configured rate are always logged"""
+
+    def __init__(self, rates=None):
+        self.rates = parse_sample_rates(Config.LOG_SAMPLE_RATES) if rates is None else rates
+        self._lock = threading.Lock()
+        self._stats = {"emitted": 0, "sampled_out": 0}
+
+    def keep(self, event):
+        rate = self.rates.get(event, 1.0)
+        keep = rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+        with self._lock:
+            self._stats["emitted" if keep else "sampled_out"] += 1
+        return keep
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["rates"] = dict(self.rates)
+        return stats
+
+sampler = EventSampler()
+
+def log_event(event_logger, event, level=logging.INFO, **fields):
+    """
+    Log a structured event: `event` names its type, and `fields` are added
+    to the record as JSON keys.
+
+    Nothing is built unless the level is enabled and the event passes its
+    sample rate. Fields are redacted and serialized on the log thread, so
+    pass values that will not be mutated afterwards.
+    """
+    if not event_logger.isEnabledFor(level) or not sampler.keep(event):
+        return
+    event_logger.log(level, event, extra={"event": event, "fields": fields})
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per line"""
+
+    def __init__(self, redact_pii=True):
+        super().__init__()
+        self.redact_pii = redact_pii
+
+    def format(self, record):
+        message = record.getMessage()
+        fields = getattr(record, "fields", None) or {}
+        if self.redact_pii:
+            message = PHONE_PATTERN.sub(mask_phone, message)
+            fields = redact(fields)
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", None),
+            "msg": message
+        }
+        if getattr(record, "event", None):
+            entry["event"] = record.event
+        entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+class TextFormatter(logging.Formatter):
+    """The classic level:logger:message line, with event fields appended as compact JSON"""
+
+    def __init__(self, redact_pii=True):
+        super().__init__(TEXT_LOG_FORMAT)
+        self.redact_pii = redact_pii
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + json.dumps(redact(fields) if self.redact_pii else fields, separators=(",", ":"), default=str)
+        return PHONE_PATTERN.sub(mask_phone, line) if self.redact_pii else line
+
+class BackgroundLogHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a listener thread that formats and writes them, so the
+    logging thread only pays for building the record.
+
+    The queue is bounded: when the writer falls behind, records are dropped
+    and counted instead of blocking a request. The listener starts lazily in
+    each process, so gunicorn workers get their own after forking.
+    """
+
+    def __init__(self, target, max_size=10000):
+        super().__init__(None)
+        self.target = target
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._listener = None
+        self._pid = None
+        self._dropped = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A queue inherited from a parent process has no listener behind it
+            self.queue = queue.Queue(maxsize=self.max_size)
+            self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Merge the message arguments now (they may change later) but leave
+        # fields and formatting to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def stop(self):
+        """Write out queued records (used on shutdown)"""
+        with self._lock:
+            listener = self._listener if self._pid == os.getpid() else None
+            self._listener = None
+            self._pid = None
+        if listener is not None:
+            listener.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self.queue.qsize() if self.queue is not None else 0,
+                "max_size": self.max_size,
+                "dropped": self._dropped
+            }
+
+_background_handler = None
+
+def configure_logging(background=None):
+    """
+    Replace the root handlers with one that writes LOG_FORMAT lines to
+    stderr, tagged with the current trace ID. With background logging the
+    lines are written by a listener thread fed through a bounded queue.
+    """
+    global _background_handler
+    background = Config.LOG_BACKGROUND if background is None else background
+    if Config.LOG_FORMAT.lower() == "json":
+        formatter = JsonFormatter(Config.LOG_REDACT_PII)
+    else:
+        formatter = TextFormatter(Config.LOG_REDACT_PII)
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+    handler = output
+    if background:
+        handler = _background_handler = BackgroundLogHandler(output, Config.LOG_QUEUE_SIZE)
+        atexit.register(_background_handler.stop)
+    # Filters run on the calling thread, where the trace is current
+    handler.addFilter(TraceIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(Config.LOG_LEVEL.upper())
+
+def stats():
+    """Get sampling counters and background queue usage"""
+    result = {"sampling": sampler.stats()}
+    if _background_handler is not None:
+        result["queue"] = _background_handler.stats()
+    return result
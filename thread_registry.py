@@ -0,0 +1,169 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from database import db_pool
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ThreadRegistry:
+    """
+    Maps WhatsApp numbers to the OpenAI thread holding their conversation.
+
+    Lookups go to an in-memory LRU first and fall back to the
+    conversation_threads table, so threads are shared between gunicorn
+    workers and survive restarts. Entries expire after the TTL without use.
+    """
+
+    def __init__(self, pool=None, ttl=None, max_entries=None, persistent=None):
+        self.pool = pool or db_pool
+        self.ttl = Config.THREAD_CACHE_TTL if ttl is None else ttl
+        self.max_entries = Config.THREAD_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.persistent = Config.THREAD_CACHE_PERSISTENT if persistent is None else persistent
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # whatsapp_number -> [thread_id, last_used, persisted_at]
+        self._table_ready = False
+        self._stats = {
+            "hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "db_errors": 0
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _ensure_table(self, conn):
+        """Create the conversation_threads table on first use"""
+        if self._table_ready:
+            return
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_threads (
+                whatsapp_number TEXT PRIMARY KEY,
+                thread_id TEXT NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+        conn.commit()
+        cursor.close()
+        self._table_ready = True
+
+    def get(self, whatsapp_number):
+        """Get the thread ID for a WhatsApp number, or None if there is no live thread"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(whatsapp_number)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    entry[1] = now
+                    self._entries.move_to_end(whatsapp_number)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                del self._entries[whatsapp_number]
+                self._stats["expirations"] += 1
+
+        if self.persistent:
+            thread_id, updated_at = self._load(whatsapp_number)
+            if thread_id:
+                self._count("db_hits")
+                # The row's own timestamp, so set() refreshes it before it expires for other workers
+                self._remember(whatsapp_number, thread_id, now, persisted_at=updated_at)
+                return thread_id
+
+        self._count("misses")
+        return None
+
+    def set(self, whatsapp_number, thread_id):
+        """Record the thread used for a WhatsApp number and refresh its expiry"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(whatsapp_number)
+            # Only write through when the thread changed or the stored timestamp is getting old
+            needs_persist = entry is None or entry[0] != thread_id or now - entry[2] > self.ttl / 4
+            persisted_at = entry[2] if entry is not None and entry[0] == thread_id else 0
+
+        if self.persistent and needs_persist and self._save(whatsapp_number, thread_id):
+            persisted_at = now
+        self._remember(whatsapp_number, thread_id, now, persisted_at)
+
+    def forget(self, whatsapp_number):
+        """Drop the thread for a WhatsApp number so the next message starts a new one"""
+        with self._lock:
+            self._entries.pop(whatsapp_number, None)
+        if self.persistent:
+            try:
+                with self.pool.connection() as conn:
+                    self._ensure_table(conn)
+                    cursor = conn.cursor()
+                    cursor.execute("DELETE FROM conversation_threads WHERE whatsapp_number = %s", (whatsapp_number,))
+                    conn.commit()
+                    cursor.close()
+            except Exception as e:
+                self._count("db_errors")
+                logger.error(f"Database error forgetting conversation thread: {str(e)}")
+
+    def _remember(self, whatsapp_number, thread_id, last_used, persisted_at):
+        """Store an entry in the in-memory tier, evicting the least recently used"""
+        with self._lock:
+            self._entries[whatsapp_number] = [thread_id, last_used, persisted_at]
+            self._entries.move_to_end(whatsapp_number)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _load(self, whatsapp_number):
+        """Read a non-expired (thread ID, updated_at as a Unix time) from the database, or (None, 0)"""
+        try:
+            with self.pool.connection() as conn:
+                self._ensure_table(conn)
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT thread_id, EXTRACT(EPOCH FROM updated_at) FROM conversation_threads
+                    WHERE whatsapp_number = %s
+                    AND updated_at > NOW() - make_interval(secs => %s)
+                """, (whatsapp_number, self.ttl))
+                row = cursor.fetchone()
+                cursor.close()
+            return (row[0], float(row[1])) if row else (None, 0)
+        except Exception as e:
+            self._count("db_errors")
+            logger.error(f"Database error loading conversation thread: {str(e)}")
+            return None, 0
+
+    def _save(self, whatsapp_number, thread_id):
+        """Upsert the thread ID for a WhatsApp number"""
+        try:
+            with self.pool.connection() as conn:
+                self._ensure_table(conn)
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO conversation_threads (whatsapp_number, thread_id, updated_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (whatsapp_number)
+                    DO UPDATE SET thread_id = EXCLUDED.thread_id, updated_at = EXCLUDED.updated_at
+                """, (whatsapp_number, thread_id))
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            self._count("db_errors")
+            logger.error(f"Database error saving conversation thread: {str(e)}")
+            return False
+
+    def stats(self):
+        """Get cache counters and the in-memory size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+        lookups = stats["hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,217 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config import Config
+from metrics import LatencyHistogram, span
+from structured_logging import log_event
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the tool latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Tool:
+    """A function the Assistant can call: its JSON schema and the handler that implements it"""
+
+    def __init__(self, name, handler, description, parameters=None, timeout=None, writes=False):
+        self.name = name
+        self.handler = handler
+        self.description = description
+        self.parameters = parameters or {"type": "object", "properties": {}, "required": []}
+        self.timeout = timeout
+        # Tools that change data run one at a time, after the step's reads
+        self.writes = writes
+        self.histogram = LatencyHistogram(LATENCY_BUCKETS)
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "errors": 0, "timeouts": 0}
+
+    def count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["latency"] = self.histogram.snapshot()
+        return stats
+
+    def definition(self):
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters
+            }
+        }
+
+class ToolRegistry:
+    """
+    Assistant tools declared once, next to their implementation.
+
+    Handlers are called as handler(whatsapp_number, **arguments), where the
+    arguments are limited to the properties in the tool's schema, so the
+    WhatsApp number always comes from the incoming message rather than the
+    model. Read-only tool calls from one requires_action step run
+    concurrently on a shared thread pool, each bounded by its own timeout;
+    tools registered with writes=True then run one after another, so a read
+    never races an update of the same rows.
+    """
+
+    def __init__(self, workers=None, timeout=None):
+        self.workers = Config.TOOL_WORKERS if workers is None else workers
+        self.timeout = Config.TOOL_TIMEOUT if timeout is None else timeout
+
+        self._tools = {}
+        self._definitions = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def register(self, name, handler, description, parameters=None, timeout=None, writes=False):
+        with self._lock:
+            self._tools[name] = Tool(name, handler, description, parameters, timeout, writes)
+            self._definitions = None
+        return handler
+
+    def tool(self, description, parameters=None, name=None, timeout=None, writes=False):
+        """Decorator registering a function as a tool, named after the function by default"""
+        def decorator(handler):
+            return self.register(name or handler.__name__, handler, description, parameters, timeout, writes)
+        return decorator
+
+    def definitions(self):
+        """The `tools` list sent with each run, built once and reused"""
+        definitions = self._definitions
+        if definitions is None:
+            with self._lock:
+                if self._definitions is None:
+                    self._definitions = [tool.definition() for tool in self._tools.values()]
+                definitions = self._definitions
+        return definitions
+
+    def names(self):
+        return list(self._tools)
+
+    def _get_executor(self):
+        """Create the worker pool lazily, and again after a fork"""
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="tool")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, tool, whatsapp_number, arguments):
+        """Call a handler, recording its latency and turning exceptions into tool output"""
+        started = time.perf_counter()
+        try:
+            with span(f"tool.{tool.name}"):
+                return tool.handler(whatsapp_number, **arguments)
+        except Exception as e:
+            tool.count("errors")
+            logger.error(f"Tool {tool.name} failed: {str(e)}")
+            return {"success": False, "message": f"Error running {tool.name}: {str(e)}"}
+        finally:
+            elapsed = time.perf_counter() - started
+            tool.histogram.observe(elapsed)
+            logger.info(f"Tool {tool.name} finished in {elapsed * 1000:.1f}ms")
+
+    def _prepare(self, tool_call):
+        """Resolve a tool call to (tool, arguments), or (None, error output)"""
+        name = tool_call.function.name
+        tool = self._tools.get(name)
+        if tool is None:
+            logger.warning(f"Unknown function called: {name}")
+            return None, {"success": False, "message": "Unknown function"}
+
+        try:
+            arguments = json.loads(tool_call.function.arguments or "{}")
+        except ValueError:
+            tool.count("errors")
+            return None, {"success": False, "message": f"Invalid arguments for {name}"}
+
+        allowed = tool.parameters.get("properties", {})
+        arguments = {key: value for key, value in arguments.items() if key in allowed}
+        return tool, arguments
+
+    def _submit(self, executor, tool, whatsapp_number, arguments):
+        """Start a call; returns (future, deadline)"""
+        tool.count("calls")
+        log_event(logger, "tool.call", tool=tool.name, arguments=arguments)
+        deadline = time.monotonic() + (tool.timeout or self.timeout)
+        # Run in a copy of the caller's context so the call is timed under its trace
+        future = executor.submit(contextvars.copy_context().run, self._run, tool, whatsapp_number, arguments)
+        return future, deadline
+
+    def _result(self, tool, future, deadline):
+        """Wait for a call; returns (output, timed_out)"""
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic())), False
+        except FutureTimeoutError:
+            tool.count("timeouts")
+            logger.warning(f"Tool {tool.name} timed out after {tool.timeout or self.timeout}s")
+            if not tool.writes:
+                return {"success": False, "message": f"{tool.name} timed out, please try again"}, True
+            # The handler is still running and may yet commit the change
+            return {
+                "success": None,
+                "status": "unknown",
+                "message": f"{tool.name} is still running, so it is not known whether the change was saved. "
+                           "Check the appointment details before telling the patient whether it worked."
+            }, True
+
+    def dispatch(self, tool_calls, whatsapp_number):
+        """
+        Run the tool calls of a requires_action step.
+
+        Read-only calls run concurrently; calls to tools that write run one
+        after another once the reads have finished. Returns the tool_outputs
+        list for submit_tool_outputs, in the order of tool_calls. A read that
+        exceeds its timeout gets an error output. A write that exceeds it is
+        reported as unknown rather than failed, since its handler keeps
+        running, and the writes after it are not started.
+        """
+        executor = self._get_executor()
+        outputs = {}
+        reads, writes = [], []
+        for tool_call in tool_calls:
+            tool, arguments = self._prepare(tool_call)
+            if tool is None:
+                # arguments holds the error output
+                outputs[tool_call.id] = arguments
+            elif tool.writes:
+                writes.append((tool_call, tool, arguments))
+            else:
+                reads.append((tool_call, tool, self._submit(executor, tool, whatsapp_number, arguments)))
+
+        for tool_call, tool, (future, deadline) in reads:
+            outputs[tool_call.id], _ = self._result(tool, future, deadline)
+
+        blocked = None
+        for tool_call, tool, arguments in writes:
+            if blocked is not None:
+                outputs[tool_call.id] = {
+                    "success": False,
+                    "message": f"Not run because {blocked} is still in progress; try again once it has finished"
+                }
+                continue
+            future, deadline = self._submit(executor, tool, whatsapp_number, arguments)
+            outputs[tool_call.id], timed_out = self._result(tool, future, deadline)
+            if timed_out:
+                blocked = tool.name
+
+        return [
+            {"tool_call_id": tool_call.id, "output": json.dumps(outputs[tool_call.id])}
+            for tool_call in tool_calls
+        ]
+
+    def stats(self):
+        """Get per-tool call, error and timeout counts and latency histograms"""
+        return {name: tool.stats() for name, tool in self._tools.items()}
@@ -0,0 +1,149 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class WarmThreadPool:
+    """
+    Keeps a few empty Assistant threads created ahead of time, so a first
+    message from a new sender can skip the threads.create round trip.
+
+    A background thread tops the pool up at no more than `refill_rate`
+    creates per second. Threads left unclaimed for `max_age` seconds, and
+    whatever is still pooled when the process exits, are deleted. The refill
+    thread starts lazily in each process; a forked child discards the
+    thread IDs it inherited, since the parent may hand them out too.
+    """
+
+    def __init__(self, client, size=None, refill_rate=None, max_age=None):
+        self.client = client
+        self.size = Config.WARM_THREAD_POOL_SIZE if size is None else size
+        self.refill_rate = Config.WARM_THREAD_REFILL_RATE if refill_rate is None else refill_rate
+        self.max_age = Config.WARM_THREAD_MAX_AGE if max_age is None else max_age
+
+        self._lock = threading.Lock()
+        self._threads = deque()  # (thread_id, created_at), oldest first
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._stopping = False
+        self._stats = {
+            "claims": 0,
+            "fallbacks": 0,
+            "created": 0,
+            "expired": 0,
+            "create_errors": 0
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def start(self):
+        """Start refilling in the current process if needed"""
+        if self.size <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Inherited from the parent process, which may claim the same threads
+                self._threads.clear()
+            else:
+                atexit.register(self.shutdown)
+            self._pid = os.getpid()
+            self._stopping = False
+        thread = threading.Thread(target=self._refill_loop, name="warm-threads", daemon=True)
+        thread.start()
+        logger.info(f"Warm thread pool started (size={self.size})")
+
+    def claim(self):
+        """
+        Take a pre-created thread ID, or None if the pool is empty.
+
+        Each None is counted as a fallback, since the caller will create a
+        thread on the request path instead.
+        """
+        if self.size <= 0:
+            return None
+        self.start()
+
+        thread_id = None
+        with self._lock:
+            # Newest first; if the newest has expired, so has every other one
+            if self._threads and time.monotonic() - self._threads[-1][1] < self.max_age:
+                thread_id = self._threads.pop()[0]
+            self._stats["claims" if thread_id else "fallbacks"] += 1
+        self._wakeup.set()
+        return thread_id
+
+    def _refill_loop(self):
+        """Delete expired threads and keep the pool at its target size"""
+        pid = os.getpid()
+        while not self._stopping and self._pid == pid:
+            self._expire()
+            with self._lock:
+                missing = self.size - len(self._threads)
+
+            if missing <= 0:
+                self._wakeup.wait(timeout=max(1.0, min(60.0, self.max_age / 4)))
+                self._wakeup.clear()
+                continue
+
+            try:
+                thread = self.client.beta.threads.create()
+                with self._lock:
+                    self._threads.append((thread.id, time.monotonic()))
+                    self._stats["created"] += 1
+                delay = 1.0 / self.refill_rate if self.refill_rate > 0 else 0.0
+            except Exception as e:
+                self._count("create_errors")
+                logger.warning(f"Failed to pre-create an Assistant thread: {str(e)}")
+                delay = 5.0
+            if delay:
+                time.sleep(delay)
+
+    def _expire(self):
+        """Delete pooled threads older than max_age"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._threads and now - self._threads[0][1] >= self.max_age:
+                expired.append(self._threads.popleft()[0])
+            self._stats["expired"] += len(expired)
+        for thread_id in expired:
+            self._delete(thread_id)
+
+    def _delete(self, thread_id):
+        try:
+            self.client.beta.threads.delete(thread_id)
+        except Exception as e:
+            logger.warning(f"Failed to delete unused thread {thread_id}: {str(e)}")
+
+    def shutdown(self):
+        """Stop refilling and delete the threads nobody claimed"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            unused = [thread_id for thread_id, _ in self._threads]
+            self._threads.clear()
+        for thread_id in unused:
+            self._delete(thread_id)
+
+    def stats(self):
+        """Get pool size and claim/fallback counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["available"] = len(self._threads)
+        stats["size"] = self.size
+        requests = stats["claims"] + stats["fallbacks"]
+        stats["claim_rate"] = round(stats["claims"] / requests, 4) if requests else 0.0
+        return stats
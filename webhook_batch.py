@@ -0,0 +1,35 @@
+from collections import OrderedDict
+
+class WebhookBatch:
+    """
+    Messages from one webhook delivery, parsed up front and grouped by
+    sender.
+
+    Meta may put many messages, across several entry/changes items, into a
+    single POST. Grouping them lets each sender's messages be handled in
+    order by one worker while different senders are handled in parallel,
+    and lets lookups for all senders be made at once.
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.by_sender = OrderedDict()
+        for message in messages:
+            self.by_sender.setdefault(message.get('from'), []).append(message)
+
+    @classmethod
+    def from_payload(cls, data):
+        """Collect every message from a whatsapp_business_account payload, in delivery order"""
+        messages = []
+        if data and data.get('object') == 'whatsapp_business_account':
+            for entry in data.get('entry', []):
+                for change in entry.get('changes', []):
+                    messages.extend(change.get('value', {}).get('messages') or [])
+        return cls(messages)
+
+    @property
+    def senders(self):
+        return [number for number in self.by_sender if number]
+
+    def __len__(self):
+        return len(self.messages)
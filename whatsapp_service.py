@@ -1,17 +1,72 @@
 import requests
 import json
 import logging
+import random
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import Config
+from rate_limiter import rate_limiter, FAIL_FAST
+from metrics import span, graph_responses
+from structured_logging import log_event
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Responses retried with jittered backoff. A 5xx on a POST may come after the
+# message was accepted, so POSTs are only retried on 429 (rejected before sending)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POST_RETRY_STATUSES = (429,)
+
+class JitteredRetry(Retry):
+    """Retry policy that randomizes each backoff delay (full jitter) and never replays a POST after a 5xx"""
+    
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+    
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() == "POST" and status_code not in POST_RETRY_STATUSES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+def create_graph_session(pool_size, max_retries, backoff_factor):
+    """
+    Create a pooled HTTP session for the Graph API that retries 429 and
+    (for GETs) 5xx responses with jittered exponential backoff, honoring
+    Retry-After
+    """
+    retry = JitteredRetry(
+        total=max_retries,
+        connect=max_retries,
+        # A read timeout may mean the message was already sent, so never replay it
+        read=0,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 class WhatsAppService:
     def __init__(self):
         self.access_token = Config.ACCESS_TOKEN
         self.phone_number_id = Config.PHONE_NUMBER_ID
         self.api_url = Config.WHATSAPP_API_URL
+        self.timeout = (Config.WHATSAPP_CONNECT_TIMEOUT, Config.WHATSAPP_READ_TIMEOUT)
+        
+        # Keep-alive connections reused by every Graph API call
+        self.session = create_graph_session(
+            Config.WHATSAPP_POOL_SIZE,
+            Config.WHATSAPP_MAX_RETRIES,
+            Config.WHATSAPP_RETRY_BACKOFF
+        )
         
         # Check if WhatsApp credentials are configured
         if not self.access_token or self.access_token == 'your_whatsapp_access_token_here':
@@ -23,6 +78,13 @@ class WhatsAppService:
                 'Content-Type': 'application/json'
             }
     
+    def _request(self, operation, method, url, **kwargs):
+        """Send a Graph API request on the pooled session, timed and counted per operation"""
+        with span(f"whatsapp.{operation}"):
+            response = self.session.request(method, url, headers=self.headers, timeout=self.timeout, **kwargs)
+        graph_responses.inc(operation=operation, status=response.status_code)
+        return response
+    
     def send_message(self, to_number, message):
         """
         Send a text message via WhatsApp Business API
@@ -43,7 +105,9 @@ class WhatsAppService:
                 }
             }
             
-            response = requests.post(url, headers=self.headers, json=payload)
+            rate_limiter.acquire("graph_messages")
+            
+            response = self._request("send_message", "POST", url, json=payload)
             
             if response.status_code == 200:
                 logger.info(f"Message sent successfully to {to_number}")
@@ -56,53 +120,20 @@ class WhatsAppService:
             logger.error(f"Error sending WhatsApp message: {str(e)}")
             return False, str(e)
     
-    def send_typing_indicator(self, to_number, typing=True):
+    def send_typing_indicator(self, message_id):
         """
-        Send typing indicator to show the bot is typing
+        Show the typing indicator in reply to a message (also marks it as read).
+        WhatsApp hides it when the reply is sent, or after 25 seconds.
         """
-        try:
-            url = f"{self.api_url}/{self.phone_number_id}/messages"
-            
-            payload = {
-                "messaging_product": "whatsapp",
-                "to": to_number,
-                "type": "reaction",
-                "reaction": {
-                    "messaging_product": "whatsapp",
-                    "recipient_type": "individual"
-                }
-            }
-            
-            if typing:
-                payload = {
-                    "messaging_product": "whatsapp",
-                    "to": to_number,
-                    "type": "interactive",
-                    "interactive": {
-                        "type": "button",
-                        "body": {
-                            "text": "AI is thinking..."
-                        }
-                    }
-                }
-            
-            response = requests.post(url, headers=self.headers, json=payload)
-            
-            if response.status_code == 200:
-                logger.info(f"Typing indicator sent to {to_number}")
-                return True
-            else:
-                logger.error(f"Failed to send typing indicator: {response.status_code}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error sending typing indicator: {str(e)}")
-            return False
+        return self.mark_message_as_read(message_id, typing=True)
     
-    def mark_message_as_read(self, message_id):
+    def mark_message_as_read(self, message_id, typing=False):
         """
-        Mark a message as read
+        Mark a message (and the ones before it) as read, optionally with the typing indicator
         """
+        if not self.headers:
+            return False
+            
         try:
             url = f"{self.api_url}/{self.phone_number_id}/messages"
             
@@ -111,11 +142,16 @@ class WhatsAppService:
                 "status": "read",
                 "message_id": message_id
             }
+            if typing:
+                payload["typing_indicator"] = {"type": "text"}
             
-            response = requests.post(url, headers=self.headers, json=payload)
+            # Best-effort call: skip it rather than delay the reply when over the limit
+            rate_limiter.acquire("graph_messages", mode=FAIL_FAST)
+            
+            response = self._request("typing_indicator" if typing else "mark_read", "POST", url, json=payload)
             
             if response.status_code == 200:
-                logger.info(f"Message {message_id} marked as read")
+                logger.info(f"Message {message_id} marked as read{' with typing indicator' if typing else ''}")
                 return True
             else:
                 logger.error(f"Failed to mark message as read: {response.status_code}")
@@ -163,7 +199,9 @@ class WhatsAppService:
             if components:
                 payload["template"]["components"] = components
             
-            response = requests.post(url, headers=self.headers, json=payload)
+            rate_limiter.acquire("graph_templates")
+            
+            response = self._request("send_template", "POST", url, json=payload)
             
             if response.status_code == 200:
                 logger.info(f"Template message '{template_name}' sent successfully to {to_number}")
@@ -187,11 +225,11 @@ class WhatsAppService:
         try:
             url = f"{self.api_url}/{self.phone_number_id}/message_templates"
             
-            response = requests.get(url, headers=self.headers)
+            response = self._request("get_templates", "GET", url)
             
             if response.status_code == 200:
                 templates = response.json()
-                logger.info(f"Available templates: {templates}")
+                log_event(logger, "whatsapp.templates", templates=[t.get("name") for t in templates.get("data", [])])
                 return True, templates
             else:
                 logger.error(f"Failed to get templates: {response.status_code} - {response.text}")